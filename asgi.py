@@ -0,0 +1,9 @@
+import os
+import sys
+
+# backend/ modules import each other by name, as when running from inside backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from async_app import app  # noqa: E402
+
+# Serve with any ASGI server, e.g.: uvicorn asgi:app
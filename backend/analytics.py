@@ -0,0 +1,200 @@
+import bisect
+import logging
+import math
+import operator
+import os
+import threading
+from cache import ResponseCache, category_version, table_version
+from compact import CompactSheet, NumericColumn
+from db import NUMERIC_TYPES, get_low_stock, get_stock_summary, get_table_columns
+from inventory import sanitize_category
+from store import parse_stock, resolve_columns
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python path gives the same results
+    np = None
+
+logger = logging.getLogger(__name__)
+
+REORDER_THRESHOLD = int(os.environ.get('INVENTORY_REORDER_THRESHOLD', 10))
+PRICE_HEADERS = ('price', 'rate', 'cost', 'mrp')
+NAME_HEADERS = ('name', 'item', 'description', 'particular', 'equipment')
+
+# Per-category and per-table summaries, each valid for the data version it was computed from,
+# so only the categories/tables that changed since the last report are recomputed.
+_summaries = ResponseCache(max_entries=int(os.environ.get('INVENTORY_REPORT_CACHE_SIZE', 1024)))
+
+def find_column(headers, keywords, skip=()):
+    for col_idx, header in enumerate(headers):
+        if col_idx not in skip and any(keyword in str(header).lower() for keyword in keywords):
+            return col_idx
+    return None
+
+def _parse_price(value):
+    if isinstance(value, bool):
+        return 0.0
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return price if math.isfinite(price) else 0.0
+
+def _stock_column(grid, stock_idx, rows):
+    column = grid.columns[stock_idx] if isinstance(grid, CompactSheet) else None
+    if isinstance(column, NumericColumn) and column.typecode == 'q':
+        # Typed array: no per-cell parsing (blanks are stored as 0, negatives count as 0 like parse_stock)
+        if np is not None:
+            return np.maximum(np.frombuffer(column.values, dtype=np.int64)[rows], 0)
+        values = column.values
+        return [max(values[row], 0) for row in rows]
+    stock = [parse_stock(grid[row + 1][stock_idx]) for row in rows]
+    return np.asarray(stock, dtype=np.int64) if np is not None else stock
+
+def summarize_grid(original, grid):
+    """Stock totals for one sheet plus its items ordered by stock, for the low-stock report.
+
+    Only numbered rows (a digit in the S.No. column) count as items; headings,
+    notes and signatures in the sheet are skipped.
+    """
+    summary = {'source': 'excel', 'category': sanitize_category(original), 'name': original,
+               'items': 0, 'units': 0, 'value': None, 'stock_column': None, 'price_column': None}
+    if not grid:
+        return summary, [], []
+    headers = grid[0]
+    s_no_idx, stock_idx = resolve_columns(headers)
+    if s_no_idx is None or stock_idx is None:
+        return summary, [], []
+    price_idx = find_column(headers, PRICE_HEADERS, skip=(s_no_idx, stock_idx))
+    name_idx = find_column(headers, NAME_HEADERS, skip=(s_no_idx, stock_idx))
+    rows = [row_idx for row_idx in range(len(grid) - 1) if str(grid[row_idx + 1][s_no_idx]).strip().isdigit()]
+    stock = _stock_column(grid, stock_idx, rows)
+    prices = [_parse_price(grid[row + 1][price_idx]) for row in rows] if price_idx is not None else None
+
+    if np is not None:
+        units = int(stock.sum())
+        value = float(np.dot(stock, np.asarray(prices, dtype=np.float64))) if prices is not None else None
+        order = np.argsort(stock, kind='stable').tolist()
+        stock = stock.tolist()
+    else:
+        units = sum(stock)
+        value = math.fsum(map(operator.mul, stock, prices)) if prices is not None else None
+        order = sorted(range(len(rows)), key=stock.__getitem__)
+
+    summary.update(items=len(rows), units=units, value=value, stock_column=str(headers[stock_idx]),
+                   price_column=str(headers[price_idx]) if price_idx is not None else None)
+    # Ascending stock keys (for bisect) and the matching (item_id, name, stock) entries
+    keys = [stock[pos] for pos in order]
+    entries = [(grid[rows[pos] + 1][s_no_idx], grid[rows[pos] + 1][name_idx] if name_idx is not None else '', stock[pos]) for pos in order]
+    return summary, keys, entries
+
+def category_summary(inventory_store, sanitized_category):
+    original = inventory_store.original_category(sanitized_category)
+    return _summaries.get_or_build(
+        f"excel:{original}", category_version(original),
+        lambda: summarize_grid(original, inventory_store.get_inventory(sanitized_category)))
+
+def table_columns(table_name):
+    """Resolve ``(stock, price, name)`` column names of a MySQL table; stock/price must be numeric."""
+    column_types = dict(get_table_columns(table_name))
+    names = list(column_types)
+    numeric = {name for name, column_type in column_types.items() if any(kind in str(column_type).lower() for kind in NUMERIC_TYPES)}
+    stock_idx = resolve_columns(names)[1]
+    stock = names[stock_idx] if stock_idx is not None and names[stock_idx] in numeric else None
+    skip = {names.index(name) for name in (stock, 'id') if name in names}
+    price_idx = find_column(names, PRICE_HEADERS, skip=skip)
+    price = names[price_idx] if price_idx is not None and names[price_idx] in numeric else None
+    name_idx = find_column(names, NAME_HEADERS, skip=skip)
+    return stock, price, names[name_idx] if name_idx is not None else None
+
+def table_summary(table_name):
+    def build():
+        stock, price, _ = table_columns(table_name)
+        summary = {'source': 'table', 'category': table_name, 'name': table_name, 'items': 0, 'units': 0,
+                   'value': None, 'stock_column': stock, 'price_column': price}
+        if stock:
+            summary['items'], summary['units'], summary['value'] = get_stock_summary(table_name, stock, price)
+        return summary
+    return _summaries.get_or_build(f"table:{table_name}", table_version(table_name), build)
+
+def stock_value_report(inventory_store, tables=()):
+    """Items, units and (where a price/rate column exists) stock value per category and table."""
+    categories = []
+    if inventory_store is not None:
+        categories = [category_summary(inventory_store, sanitized)[0] for sanitized, _ in inventory_store.categories()]
+    categories += [table_summary(table) for table in tables]
+    valued = [summary['value'] for summary in categories if summary['value'] is not None]
+    totals = {'items': sum(summary['items'] for summary in categories),
+              'units': sum(summary['units'] for summary in categories),
+              'value': math.fsum(valued) if valued else None}
+    return {'categories': categories, 'totals': totals}
+
+def low_stock_report(inventory_store, tables=(), threshold=REORDER_THRESHOLD, limit=100):
+    """Items with stock below ``threshold`` across all categories and tables, lowest first."""
+    items = []
+    if inventory_store is not None:
+        for sanitized, _ in inventory_store.categories():
+            _, keys, entries = category_summary(inventory_store, sanitized)
+            for item_id, name, stock in entries[:min(bisect.bisect_left(keys, threshold), limit)]:
+                items.append({'source': 'excel', 'category': sanitized, 'item_id': item_id, 'name': name, 'stock': stock})
+    for table in tables:
+        stock_column, _, name_column = table_columns(table)
+        if not stock_column:
+            continue
+        rows = _summaries.get_or_build(f"low:{table}:{threshold}:{limit}", table_version(table),
+                                       lambda: get_low_stock(table, stock_column, threshold, limit, name_column))
+        items.extend({'source': 'table', 'category': table, 'item_id': row_id, 'name': name, 'stock': stock}
+                     for row_id, name, stock in rows)
+    items.sort(key=lambda item: item['stock'])
+    return {'threshold': threshold, 'items': items[:limit]}
+
+class MovementTracker:
+    """Running sale/restock totals per item, folded in incrementally from a ``StockJournal``.
+
+    Only journal entries newer than the last one seen are read on each update,
+    so totals survive ``StockJournal.truncate``. A new journal (e.g. after a
+    store rebuild) starts the counts over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._totals = {}  # (category, item_id) -> [sold, restocked]
+
+    def update(self, journal):
+        with self._lock:
+            if journal is not self._journal:
+                self._journal, self._seq, self._totals = journal, 0, {}
+            if journal is None:
+                return
+            for entry in journal.entries(self._seq):
+                totals = self._totals.setdefault((entry['category'], entry['item_id']), [0, 0])
+                if entry['delta'] < 0:
+                    totals[0] -= entry['delta']
+                else:
+                    totals[1] += entry['delta']
+                self._seq = entry['seq']
+
+    def top(self, limit=10, by='sold'):
+        position = 0 if by == 'sold' else 1
+        with self._lock:
+            ranked = sorted(self._totals.items(), key=lambda item: (-item[1][position], item[0]))
+        return [(category, item_id, sold, restocked) for (category, item_id), (sold, restocked) in ranked[:limit]
+                if (sold, restocked)[position]]
+
+movements = MovementTracker()
+
+def top_movers_report(inventory_store, limit=10, by='sold'):
+    """Items with the most units sold (or restocked) according to the stock journal."""
+    if inventory_store is None:
+        return {'by': by, 'items': []}
+    movements.update(inventory_store.journal)
+    items = []
+    for original, item_id, sold, restocked in movements.top(limit, by):
+        sanitized = sanitize_category(original)
+        row = inventory_store.find_item(sanitized, item_id)
+        name_idx = find_column(inventory_store.get_inventory(sanitized)[0], NAME_HEADERS, skip=inventory_store.columns(sanitized)) if row is not None else None
+        items.append({'category': sanitized, 'item_id': item_id, 'name': row[name_idx] if name_idx is not None else '',
+                      'sold': sold, 'restocked': restocked, 'net': restocked - sold})
+    return {'by': by, 'items': items}
@@ -1,10 +1,22 @@
 import os
-from flask import Flask, render_template, request, jsonify
-from excel_handler import load_excel_data
-from inventory import get_categories, get_inventory, update_inventory
-from sales import process_sale
-from restock import process_restock
-from db import get_tables, get_table_data, add_table_entry, update_table_entry, delete_table_entry, delete_all_entries
+import tempfile
+import time
+from flask.json.provider import DefaultJSONProvider
+from flask import Flask, Response, before_render_template, g, render_template, request, jsonify, template_rendered
+from analytics import REORDER_THRESHOLD, low_stock_report, stock_value_report, top_movers_report
+from compact import CompactSheet, RowView
+from inventory import get_inventory_page
+from store import resolve_columns, InventoryLoader, InventoryStore, StockJournal, JOURNAL_FILE
+from db import get_tables, get_table_data, get_table_page, iter_table_rows, get_column_names, table_exists, add_table_entry, update_table_entry, delete_table_entry, delete_all_entries, apply_batch, adjust_stock, get_pool_stats
+from cache import category_key, category_version, get_version, make_etag, response_cache, table_key, table_version
+from changes import FEED_ID, change_response
+from export import EXPORT_FORMATS, stream_rows
+from importer import import_sheet
+from search import MAX_RESULTS, search
+from query import MAX_PAGE_SIZE, QueryError, wants_page, parse_page_args, page_response
+from logging_config import configure_logging, summarize
+from metrics import REQUEST_SECONDS, TEMPLATE_RENDER_SECONDS, render_prometheus
+from persister import FLUSH_INTERVAL, WorkbookPersister
 import logging
 
 # Set up the Flask app with correct template and static folder paths
@@ -12,13 +24,105 @@ app = Flask(__name__,
             template_folder=os.path.join(os.path.dirname(__file__), '../templates'),
             static_folder=os.path.join(os.path.dirname(__file__), '../static'))
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+class InventoryJSONProvider(DefaultJSONProvider):
+    """Serializes compact sheets (INVENTORY_COMPACT_SHEETS) like the list grids they replace."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, CompactSheet):
+            return o.to_lists()
+        if isinstance(o, RowView):
+            return o.to_list()
+        return DefaultJSONProvider.default(o)
+
+app.json = InventoryJSONProvider(app)
+
+# Configure logging (INVENTORY_LOG_LEVEL, INVENTORY_LOG_QUEUE; see logging_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Load inventory data from Excel (for Product Table and Sales Reform)
-inventory_data = load_excel_data()
-logger.debug("Inventory data loaded from Excel: %s", inventory_data)
+# Load inventory data from Excel (for Product Table and Sales Reform) off the import path.
+# Sales are applied in place and journaled; the workbook is only re-read when it changes on disk.
+# INVENTORY_LOAD_MODE: 'background' starts loading at import, 'lazy' on the first request,
+# 'eager' blocks the import until the data is loaded.
+INVENTORY_LOAD_MODE = os.environ.get('INVENTORY_LOAD_MODE', 'background')
+INVENTORY_LOAD_WAIT = float(os.environ.get('INVENTORY_LOAD_WAIT', 2))  # seconds a request waits for the data
+LOADING_MESSAGE = "Inventory is still loading, please retry in a moment"
+
+# INVENTORY_WRITE_BEHIND_INTERVAL > 0 also writes journaled sales/restocks back into the workbook
+# from a background thread every that many seconds (and once more at shutdown).
+persister = None
+
+def _build_store():
+    global persister
+    inventory_store = InventoryStore.from_excel(journal=StockJournal(JOURNAL_FILE))
+    if FLUSH_INTERVAL > 0:
+        persister = WorkbookPersister(inventory_store, FLUSH_INTERVAL).start()
+    return inventory_store
+
+inventory_loader = InventoryLoader(_build_store)
+if INVENTORY_LOAD_MODE == 'eager':
+    inventory_loader.wait()
+elif INVENTORY_LOAD_MODE != 'lazy':
+    inventory_loader.start()
+
+def get_inventory_store(timeout=None):
+    inventory_store = inventory_loader.wait(INVENTORY_LOAD_WAIT if timeout is None else timeout)
+    if inventory_store is not None:
+        inventory_store.refresh_if_changed()
+    return inventory_store
+
+def warm_up(timeout=None):
+    """Load the inventory before serving, e.g. from a process manager's post-fork hook."""
+    return inventory_loader.wait(timeout) is not None
+
+@app.cli.command('warm-up')
+def warm_up_command():
+    ok = warm_up()
+    print(f"Inventory {inventory_loader.status()} ({inventory_loader.load_seconds or 0:.2f}s)")
+    raise SystemExit(0 if ok else 1)
+
+@app.route('/ready')
+def ready():
+    status = inventory_loader.status()
+    return jsonify({'status': status, 'load_seconds': inventory_loader.load_seconds}), 200 if status == 'ready' else 503
+
+# Request and template timing for /metrics
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unmatched',
+                                method=request.method, status=response.status_code)
+    return response
+
+def _start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+def _record_template_time(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        TEMPLATE_RENDER_SECONDS.observe(time.perf_counter() - started, template=template.name)
+
+before_render_template.connect(_start_template_timer, app)
+template_rendered.connect(_record_template_time, app)
+
+@app.route('/metrics')
+def metrics():
+    pool = get_pool_stats()
+    gauges = [(f"inventory_db_pool_{name}", f"Connection pool {name.replace('_', ' ')}.", value) for name, value in sorted(pool.items())]
+    gauges += [
+        ('inventory_response_cache_hits', 'Responses served from the response cache.', response_cache.hits),
+        ('inventory_response_cache_misses', 'Responses that had to be rebuilt.', response_cache.misses),
+        ('inventory_loaded', 'Whether the Excel inventory has finished loading.', int(inventory_loader.status() == 'ready')),
+    ]
+    if persister is not None:
+        gauges.append(('inventory_write_behind_pending', 'Journaled stock changes not yet written to the workbook.', persister.pending()))
+    return Response(render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -29,18 +133,32 @@ def index():
 def product_table():
     logger.debug("Accessing product_table route, method: %s", request.method)
     try:
-        categories = get_categories(inventory_data)
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            return render_template('product_table.html', categories=[], selected_category=None, grid_data=[], error=LOADING_MESSAGE), 503
+        categories = inventory_store.categories()
         if not categories:
             logger.warning("No categories available")
             return render_template('product_table.html', categories=[], selected_category=None, grid_data=[], error="No categories available")
         selected_sanitized_category = request.form.get('category', categories[0][0])
         selected_original_category = next((orig for sanitized, orig in categories if sanitized == selected_sanitized_category), None)
-        grid_data = get_inventory(inventory_data, selected_sanitized_category)
+        grid_data = inventory_store.get_inventory(selected_sanitized_category)
         if not grid_data:
             logger.warning("No data found for category: %s", selected_sanitized_category)
             return render_template('product_table.html', categories=categories, selected_category=selected_sanitized_category, grid_data=[], error="No data available for this category")
         logger.debug("Rendering product_table with categories: %s, selected: %s", categories, selected_sanitized_category)
-        return render_template('product_table.html', categories=categories, selected_category=selected_sanitized_category, grid_data=grid_data, error=None)
+        # The rendered page only changes when the category's data version does
+        version = category_version(selected_original_category)
+        etag = make_etag('product_table', selected_sanitized_category, version)
+        if request.method == 'GET' and request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(response_cache.get_or_build(
+                f"product_table:{selected_sanitized_category}", version,
+                lambda: render_template('product_table.html', categories=categories, selected_category=selected_sanitized_category, grid_data=grid_data, error=None)))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.error("Error in product_table route: %s", str(e))
         return render_template('product_table.html', categories=[], selected_category=None, grid_data=[], error="Failed to load product table")
@@ -55,26 +173,24 @@ def stock_counter():
             action = request.form.get('action', 'add_entry')
             logger.debug("Action received: %s", action)
             
-            tables = get_tables()
-            if not tables:
-                logger.warning("No tables available in stock_counter")
-                return jsonify({'success': False, 'message': "No tables available in the database"}), 400
-            
             selected_table = request.form.get('table')
             if not selected_table:
                 logger.error("No table provided in form data")
                 return jsonify({'success': False, 'message': "Table is required"}), 400
             
-            if selected_table not in tables:
+            # Validate against the cached schema instead of SHOW TABLES + SELECT * per request
+            if not table_exists(selected_table):
+                if not get_tables():
+                    logger.warning("No tables available in stock_counter")
+                    return jsonify({'success': False, 'message': "No tables available in the database"}), 400
                 logger.error("Invalid table: %s", selected_table)
                 return jsonify({'success': False, 'message': "Invalid table"}), 400
             
-            grid_data = get_table_data(selected_table)
-            if not grid_data:
-                logger.warning("No data found for table: %s", selected_table)
+            headers = get_column_names(selected_table)
+            if not headers:
+                logger.warning("No columns found for table: %s", selected_table)
                 return jsonify({'success': False, 'message': "No data available for this table"}), 400
             
-            headers = grid_data[0] if grid_data else []
             valid_headers = [header for header in headers if header != 'id']  # Exclude 'id' from form fields
             logger.debug("Valid headers for table %s: %s", selected_table, valid_headers)
             
@@ -145,6 +261,27 @@ def stock_counter():
                     message = f"Failed to delete all items: {message}"
                 return jsonify({'success': success, 'message': message})
             
+            elif action in ('sale', 'restock'):
+                logger.debug("Received POST request for stock_counter (%s)", action)
+                row_id = request.form.get('row_id')
+                if not row_id:
+                    return jsonify({'success': False, 'message': f"Row ID is required for {action}"}), 400
+                try:
+                    quantity = int(request.form.get('quantity', ''))
+                except ValueError:
+                    return jsonify({'success': False, 'message': "Quantity must be an integer"}), 400
+                if quantity <= 0:
+                    return jsonify({'success': False, 'message': "Quantity must be positive"}), 400
+                column = request.form.get('column')
+                if not column:
+                    stock_idx = resolve_columns(headers)[1]
+                    column = headers[stock_idx] if stock_idx is not None else None
+                if not column:
+                    return jsonify({'success': False, 'message': "No stock column found in the table"}), 400
+                
+                success, message = adjust_stock(selected_table, row_id, column, -quantity if action == 'sale' else quantity)
+                return jsonify({'success': success, 'message': message})
+            
             else:
                 logger.error("Invalid action: %s", action)
                 return jsonify({'success': False, 'message': "Invalid action"}), 400
@@ -158,45 +295,121 @@ def stock_counter():
         tables = get_tables()
         if not tables:
             logger.warning("No tables available in stock_counter")
-            return render_template('stock_counter.html', tables=tables, selected_table=None, grid_data=[], headers=[], error="No tables available in the database. Please check if the database is set up correctly.")
+            return render_template('stock_counter.html', tables=tables, selected_table=None, grid_data=[], headers=[], pagination=None, error="No tables available in the database. Please check if the database is set up correctly.")
         
         selected_table = request.args.get('table', tables[0])  # Use query parameter instead of form data
         if selected_table not in tables:
             selected_table = tables[0]
         
-        grid_data = get_table_data(selected_table)
-        headers = grid_data[0] if grid_data else []
+        page_args = parse_page_args(request.args)
+        headers, rows, total, _ = get_table_page(selected_table, **page_args)
+        grid_data = [headers] + rows
         valid_headers = [header for header in headers if header != 'id']
+        page = page_args['offset'] // page_args['limit'] + 1
+        pagination = {'page': page, 'limit': page_args['limit'], 'total': total,
+                      'pages': max((total + page_args['limit'] - 1) // page_args['limit'], 1)}
         
-        if not grid_data:
+        if not rows:
             logger.warning("No data found for table: %s", selected_table)
-            return render_template('stock_counter.html', tables=tables, selected_table=selected_table, grid_data=[], headers=valid_headers, error="No data available for this table")
+            return render_template('stock_counter.html', tables=tables, selected_table=selected_table, grid_data=[], headers=valid_headers, pagination=pagination, error="No data available for this table")
         
-        return render_template('stock_counter.html', tables=tables, selected_table=selected_table, grid_data=grid_data, headers=valid_headers, error=None)
+        return render_template('stock_counter.html', tables=tables, selected_table=selected_table, grid_data=grid_data, headers=valid_headers, pagination=pagination, error=None)
     except Exception as e:
         logger.error("Error in stock_counter GET route: %s", str(e))
-        return render_template('stock_counter.html', tables=[], selected_table=None, grid_data=[], headers=[], error=f"Failed to load stock counter page: {str(e)}")
+        return render_template('stock_counter.html', tables=[], selected_table=None, grid_data=[], headers=[], pagination=None, error=f"Failed to load stock counter page: {str(e)}")
+
+MAX_BATCH_OPERATIONS = 5000
+
+@app.route('/stock_counter/batch', methods=['POST'])
+def stock_counter_batch():
+    """Apply a JSON array of add/edit/delete operations to one table in a single transaction.
+
+    Body: ``{"table": ..., "operations": [{"action": "add_entry"|"edit_entry"|"delete_entry",
+    "row_id": ..., "values": {field_name: value}}, ...]}`` where field names follow the
+    stock form (header with spaces/dots replaced by underscores, lower-cased).
+    """
+    logger.debug("Accessing stock_counter_batch route")
+    try:
+        payload = request.get_json(silent=True) or {}
+        selected_table = payload.get('table')
+        operations = payload.get('operations')
+        if not selected_table:
+            return jsonify({'success': False, 'message': "Table is required"}), 400
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'success': False, 'message': "operations must be a non-empty list"}), 400
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({'success': False, 'message': f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+        if not table_exists(selected_table):
+            logger.error("Invalid table: %s", selected_table)
+            return jsonify({'success': False, 'message': "Invalid table"}), 400
+        
+        valid_headers = get_column_names(selected_table, include_id=False)
+        field_names = [header.replace(' ', '_').replace('.', '_').lower() for header in valid_headers]
+        batch = []
+        for operation in operations:
+            operation = operation if isinstance(operation, dict) else {}
+            values = operation.get('values') or {}
+            batch.append({
+                'action': operation.get('action'),
+                'row_id': operation.get('row_id'),
+                'data': [values.get(field_name, '') for field_name in field_names] if isinstance(values, dict) else None,
+            })
+        success, message, results = apply_batch(selected_table, batch)
+        logger.debug("Batch result for table %s: success=%s, message=%s", selected_table, success, message)
+        return jsonify({'success': success, 'message': message, 'results': results})
+    except Exception as e:
+        logger.error("Error in stock_counter_batch route: %s", str(e))
+        return jsonify({'success': False, 'message': f"Failed to process batch: {str(e)}"}), 500
+
+@app.route('/stock_counter/import', methods=['POST'])
+def stock_counter_import():
+    """Bulk-load one sheet of an uploaded workbook into a table (multipart: file, sheet, table)."""
+    logger.debug("Accessing stock_counter_import route")
+    upload = request.files.get('file')
+    selected_table = request.form.get('table')
+    sheet_name = request.form.get('sheet')
+    if not upload or not selected_table or not sheet_name:
+        return jsonify({'success': False, 'message': "file, sheet and table are required"}), 400
+    if not table_exists(selected_table):
+        return jsonify({'success': False, 'message': "Invalid table"}), 400
+    try:
+        header_row = int(request.form.get('header_row', 0))
+        chunk_size = int(request.form.get('chunk_size', 1000))
+    except ValueError:
+        return jsonify({'success': False, 'message': "header_row and chunk_size must be integers"}), 400
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as workbook_file:
+        upload.save(workbook_file)
+        workbook_file.flush()
+        try:
+            stats = import_sheet(workbook_file.name, sheet_name, selected_table, chunk_size=max(chunk_size, 1), header_row=header_row)
+        except (KeyError, ValueError) as e:
+            logger.error("Import into %s rejected: %s", selected_table, str(e))
+            return jsonify({'success': False, 'message': str(e)}), 400
+        except Exception as e:
+            logger.error("Error in stock_counter_import route: %s", str(e))
+            return jsonify({'success': False, 'message': f"Failed to import workbook: {str(e)}"}), 500
+    return jsonify(stats)
 
 @app.route('/sales_reform', methods=['GET', 'POST'])
 def sales_reform():
-    global inventory_data
     logger.debug("Accessing sales_reform route, method: %s", request.method)
     try:
-        categories = get_categories(inventory_data)
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            if request.method == 'POST':
+                return jsonify({'success': False, 'message': LOADING_MESSAGE}), 503
+            return render_template('sales_reform.html', categories=[], selected_category=None, grid_data=[], error=LOADING_MESSAGE), 503
+        categories = inventory_store.categories()
         if not categories:
             logger.warning("No categories available in sales_reform")
             return render_template('sales_reform.html', categories=[], selected_category=None, grid_data=[], error="No categories available")
         selected_sanitized_category = request.form.get('category', categories[0][0])
-        grid_data = get_inventory(inventory_data, selected_sanitized_category)
+        grid_data = inventory_store.get_inventory(selected_sanitized_category)
         if request.method == 'POST' and 'sale' in request.form:
             logger.debug("Received POST request for sales_reform")
             item_id = request.form['item_id']
             quantity = int(request.form['quantity'])
-            success, message = process_sale(inventory_data, selected_sanitized_category, item_id, quantity, grid_data[0] if grid_data else [])
-            if success:
-                inventory_data.clear()
-                inventory_data.update(load_excel_data())
-                grid_data = get_inventory(inventory_data, selected_sanitized_category)
+            success, message = inventory_store.process_sale(selected_sanitized_category, item_id, quantity)
             return jsonify({'success': success, 'message': message})
         if not grid_data:
             logger.warning("No data found for category: %s", selected_sanitized_category)
@@ -206,21 +419,212 @@ def sales_reform():
         logger.error("Error in sales_reform route: %s", str(e))
         return render_template('sales_reform.html', categories=[], selected_category=None, grid_data=[], error="Failed to load sales reform")
 
+def _versioned_json(cache_key, version, build):
+    """Serve ``build()`` as JSON tagged with an ETag for ``version``.
+
+    Clients presenting a matching If-None-Match get a 304; otherwise the
+    serialized body is reused until the version changes. Empty results (which
+    is also what the db helpers return on errors) are never cached or tagged.
+    """
+    etag = make_etag(cache_key, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    body = response_cache.get(cache_key, version)
+    if body is None:
+        data = build()
+        body = app.json.dumps(data)
+        if not data:
+            return Response(body, mimetype='application/json')
+        response_cache.put(cache_key, version, body)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/inventory/<table>', methods=['GET'])
 def api_inventory(table):
     logger.debug("Accessing api_inventory route for table: %s", table)
     try:
         # Check if the request is for a MySQL table (Stock Counter) or Excel category (Product Table/Sales Reform)
-        tables = get_tables()
-        if table in tables:
-            grid_data = get_table_data(table)
-        else:
-            grid_data = get_inventory(inventory_data, table)
-        logger.debug("Data for %s: %s", table, grid_data)
-        return jsonify(grid_data)
+        is_table = table in get_tables()
+        if not is_table:
+            inventory_store = get_inventory_store()
+            if inventory_store is None:
+                return jsonify({'error': LOADING_MESSAGE}), 503
+        version = table_version(table) if is_table else category_version(inventory_store.original_category(table))
+        # Read before the data so a change landing meanwhile is re-sent by /api/changes rather than lost
+        change_version = get_version(table_key(table) if is_table else category_key(inventory_store.original_category(table)))
+        cache_key = f"api_inventory:{'table' if is_table else 'category'}:{table}?{request.query_string.decode('utf-8')}"
+        
+        def build():
+            if wants_page(request.args):
+                page_args = parse_page_args(request.args)
+                if is_table:
+                    headers, rows, total, next_cursor = get_table_page(table, **page_args)
+                else:
+                    headers, rows, total, next_cursor = get_inventory_page(inventory_store.data, table, **page_args)
+                return page_response(headers, rows, total, page_args['limit'], page_args['offset'], next_cursor)
+            if is_table:
+                grid_data = get_table_data(table)
+            else:
+                grid_data = inventory_store.get_inventory(table)
+            logger.debug("Data for %s: %s", table, summarize(grid_data))
+            return grid_data
+        
+        response = _versioned_json(cache_key, version, build)
+        response.headers['X-Change-Version'] = str(change_version)
+        response.headers['X-Change-Feed'] = FEED_ID
+        return response
+    except QueryError as e:
+        logger.warning("Invalid api_inventory query for %s: %s", table, str(e))
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error("Error in api_inventory route: %s", str(e))
         return jsonify({'error': 'Failed to load data'}), 500
 
+@app.route('/api/changes/<table>', methods=['GET'])
+def api_changes(table):
+    """Rows of a table or category changed since ``?since=<version>`` (the X-Change-Version of /api/inventory).
+
+    ``reset`` means the client is too far behind (or talked to another process)
+    and must refetch ``/api/inventory/<table>``.
+    """
+    logger.debug("Accessing api_changes route for table: %s", table)
+    try:
+        since = int(request.args.get('since', -1))
+    except ValueError:
+        return jsonify({'error': "since must be an integer"}), 400
+    if table in get_tables():
+        key = table_key(table)
+    else:
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            return jsonify({'error': LOADING_MESSAGE}), 503
+        original = inventory_store.original_category(table)
+        if original is None:
+            return jsonify({'error': f"Unknown table: {table}"}), 404
+        key = category_key(original)
+    response = jsonify(change_response(table, key, since))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _report_version(inventory_store, tables):
+    # Changes whenever any category or table the report covers changes
+    parts = [category_version(original) for _, original in inventory_store.categories()]
+    return make_etag(*parts, *(table_version(table) for table in tables))
+
+@app.route('/api/reports/stock_value', methods=['GET'])
+def report_stock_value():
+    logger.debug("Accessing report_stock_value route")
+    try:
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            return jsonify({'error': LOADING_MESSAGE}), 503
+        tables = get_tables()
+        return _versioned_json('report:stock_value', _report_version(inventory_store, tables),
+                               lambda: stock_value_report(inventory_store, tables))
+    except Exception as e:
+        logger.error("Error in report_stock_value route: %s", str(e))
+        return jsonify({'error': 'Failed to build report'}), 500
+
+@app.route('/api/reports/low_stock', methods=['GET'])
+def report_low_stock():
+    logger.debug("Accessing report_low_stock route")
+    try:
+        threshold = int(request.args.get('threshold', REORDER_THRESHOLD))
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'threshold and limit must be integers'}), 400
+    try:
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            return jsonify({'error': LOADING_MESSAGE}), 503
+        tables = get_tables()
+        return _versioned_json(f"report:low_stock:{threshold}:{limit}", _report_version(inventory_store, tables),
+                               lambda: low_stock_report(inventory_store, tables, threshold, limit))
+    except Exception as e:
+        logger.error("Error in report_low_stock route: %s", str(e))
+        return jsonify({'error': 'Failed to build report'}), 500
+
+@app.route('/api/reports/top_movers', methods=['GET'])
+def report_top_movers():
+    logger.debug("Accessing report_top_movers route")
+    by = request.args.get('by', 'sold')
+    if by not in ('sold', 'restocked'):
+        return jsonify({'error': "by must be 'sold' or 'restocked'"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        inventory_store = get_inventory_store()
+        if inventory_store is None:
+            return jsonify({'error': LOADING_MESSAGE}), 503
+        return _versioned_json(f"report:top_movers:{by}:{limit}", _report_version(inventory_store, []),
+                               lambda: top_movers_report(inventory_store, limit, by))
+    except Exception as e:
+        logger.error("Error in report_top_movers route: %s", str(e))
+        return jsonify({'error': 'Failed to build report'}), 500
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """Typeahead search over item names and ids in every category and table: ``?q=...&limit=20``."""
+    query_text = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not query_text:
+        return jsonify({'query': query_text, 'results': []})
+    try:
+        inventory_store = get_inventory_store()
+        return jsonify({'query': query_text, 'results': search(inventory_store, get_tables(), query_text, limit),
+                        'loading': inventory_store is None})
+    except Exception as e:
+        logger.error("Error in api_search route: %s", str(e))
+        return jsonify({'error': 'Search failed'}), 500
+
+def _prepend(first, rest):
+    # Unlike itertools.chain this forwards close(), so an aborted download releases the DB connection
+    try:
+        yield first
+        yield from rest
+    finally:
+        if hasattr(rest, 'close'):
+            rest.close()
+
+@app.route('/api/inventory/<table>/export', methods=['GET'])
+def export_inventory(table):
+    logger.debug("Accessing export_inventory route for table: %s", table)
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{export_format}'; use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        batch_size = max(int(request.args.get('batch_size', 1000)), 1)
+    except ValueError:
+        return jsonify({'error': 'batch_size must be an integer'}), 400
+    try:
+        if table in get_tables():
+            rows = iter_table_rows(table, batch_size)
+        else:
+            inventory_store = get_inventory_store()
+            if inventory_store is None:
+                return jsonify({'error': LOADING_MESSAGE}), 503
+            grid = inventory_store.get_inventory(table)
+            if not grid:
+                return jsonify({'error': 'Table or category not found'}), 404
+            rows = map(list, grid)  # plain lists, also for compact sheets
+        # Pull the header row now so connection/query errors still produce a proper status code
+        headers = next(rows)
+    except QueryError as e:
+        logger.error("Error starting export for %s: %s", table, str(e))
+        return jsonify({'error': 'Failed to export data'}), 500
+    response = Response(stream_rows(_prepend(headers, rows), export_format), mimetype=EXPORT_FORMATS[export_format])
+    if export_format == 'csv':
+        response.headers['Content-Disposition'] = f'attachment; filename="{table}.csv"'
+    return response
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
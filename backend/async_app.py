@@ -0,0 +1,262 @@
+import asyncio
+import io
+import logging
+import re
+import sys
+import time
+from urllib.parse import unquote
+from werkzeug.wrappers import Request, Response
+import async_db
+from app import MAX_BATCH_OPERATIONS, app as flask_app
+from cache import get_version, make_etag, response_cache, table_key, table_version
+from changes import FEED_ID
+from metrics import REQUEST_SECONDS
+from query import QueryError, wants_page, parse_page_args, page_response
+from store import resolve_columns
+
+logger = logging.getLogger(__name__)
+
+# ASGI application for serving many stock-counter clients from one process (entry point: asgi.py).
+# The stock counter's MySQL routes run as coroutines on async_db, so a request waiting on the
+# database holds no thread. Every other route (pages, Excel categories, reports, export, import)
+# is handed to the Flask app in a worker thread and behaves exactly as under WSGI.
+
+def _json(data, status=200):
+    return Response(flask_app.json.dumps(data), status=status, mimetype='application/json')
+
+def _field_values(form, headers):
+    # Same field naming as the stock form: spaces/dots become underscores, lower-cased
+    return [form.get(header.replace(' ', '_').replace('.', '_').lower(), '') for header in headers]
+
+async def api_inventory(request, table):
+    """``GET /api/inventory/<table>`` for MySQL tables, with the same paging, caching and ETags as app.py."""
+    version = table_version(table)
+    change_version = get_version(table_key(table))
+    cache_key = f"api_inventory:table:{table}?{request.query_string.decode('utf-8')}"
+    etag = make_etag(cache_key, version)
+    change_headers = {'X-Change-Version': str(change_version), 'X-Change-Feed': FEED_ID}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=change_headers)
+        response.set_etag(etag)
+        return response
+    body = response_cache.get(cache_key, version)
+    if body is None:
+        if wants_page(request.args):
+            page_args = parse_page_args(request.args)
+            headers, rows, total, next_cursor = await async_db.get_table_page(table, **page_args)
+            data = page_response(headers, rows, total, page_args['limit'], page_args['offset'], next_cursor)
+        else:
+            data = await async_db.get_table_data(table)
+        body = flask_app.json.dumps(data)
+        if not data:
+            return Response(body, mimetype='application/json', headers=change_headers)
+        response_cache.put(cache_key, version, body)
+    response = Response(body, mimetype='application/json', headers=change_headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+async def stock_counter(request):
+    """``POST /stock_counter``: add/edit/delete/delete_all/sale/restock, same form fields and replies as app.py."""
+    form = request.form
+    action = form.get('action', 'add_entry')
+    selected_table = form.get('table')
+    if not selected_table:
+        return _json({'success': False, 'message': "Table is required"}, 400)
+    if not await async_db.table_exists(selected_table):
+        if not await async_db.get_tables():
+            return _json({'success': False, 'message': "No tables available in the database"}, 400)
+        return _json({'success': False, 'message': "Invalid table"}, 400)
+    headers = await async_db.get_column_names(selected_table)
+    valid_headers = [header for header in headers if header != 'id']
+    if not headers:
+        return _json({'success': False, 'message': "No data available for this table"}, 400)
+    if not valid_headers:
+        return _json({'success': False, 'message': "No valid columns found in the table"}, 400)
+
+    row_id = form.get('row_id')
+    if action == 'add_entry':
+        success, message = await async_db.add_table_entry(selected_table, _field_values(form, valid_headers))
+        message = "Item successfully added to the database." if success else f"Failed to add item: {message}"
+    elif action == 'edit_entry':
+        if not row_id:
+            return _json({'success': False, 'message': "Row ID is required for editing"}, 400)
+        success, message = await async_db.update_table_entry(selected_table, row_id, _field_values(form, valid_headers))
+        message = "Item successfully updated in the database." if success else f"Failed to update item: {message}"
+    elif action == 'delete_entry':
+        if not row_id:
+            return _json({'success': False, 'message': "Row ID is required for deletion"}, 400)
+        success, message = await async_db.delete_table_entry(selected_table, row_id)
+        message = "Item successfully deleted from the database." if success else f"Failed to delete item: {message}"
+    elif action == 'delete_all':
+        success, message = await async_db.delete_all_entries(selected_table)
+        message = f"All items in table '{selected_table}' deleted successfully." if success else f"Failed to delete all items: {message}"
+    elif action in ('sale', 'restock'):
+        if not row_id:
+            return _json({'success': False, 'message': f"Row ID is required for {action}"}, 400)
+        try:
+            quantity = int(form.get('quantity', ''))
+        except ValueError:
+            return _json({'success': False, 'message': "Quantity must be an integer"}, 400)
+        if quantity <= 0:
+            return _json({'success': False, 'message': "Quantity must be positive"}, 400)
+        column = form.get('column')
+        if not column:
+            stock_idx = resolve_columns(headers)[1]
+            column = headers[stock_idx] if stock_idx is not None else None
+        if not column:
+            return _json({'success': False, 'message': "No stock column found in the table"}, 400)
+        success, message = await async_db.adjust_stock(selected_table, row_id, column, -quantity if action == 'sale' else quantity)
+    else:
+        return _json({'success': False, 'message': "Invalid action"}, 400)
+    return _json({'success': success, 'message': message})
+
+async def stock_counter_batch(request):
+    """``POST /stock_counter/batch``: the JSON batch format of app.py, in one transaction."""
+    payload = request.get_json(silent=True) or {}
+    selected_table = payload.get('table')
+    operations = payload.get('operations')
+    if not selected_table:
+        return _json({'success': False, 'message': "Table is required"}, 400)
+    if not isinstance(operations, list) or not operations:
+        return _json({'success': False, 'message': "operations must be a non-empty list"}, 400)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return _json({'success': False, 'message': f"At most {MAX_BATCH_OPERATIONS} operations per batch"}, 400)
+    if not await async_db.table_exists(selected_table):
+        return _json({'success': False, 'message': "Invalid table"}, 400)
+    valid_headers = await async_db.get_column_names(selected_table, include_id=False)
+    batch = []
+    for operation in operations:
+        operation = operation if isinstance(operation, dict) else {}
+        values = operation.get('values') or {}
+        batch.append({'action': operation.get('action'), 'row_id': operation.get('row_id'),
+                      'data': _field_values(values, valid_headers) if isinstance(values, dict) else None})
+    success, message, results = await async_db.apply_batch(selected_table, batch)
+    return _json({'success': success, 'message': message, 'results': results})
+
+_INVENTORY_PATH = re.compile(r'^/api/inventory/([^/]+)$')
+
+async def route(request):
+    """``(endpoint, handler)`` for requests served asynchronously, or None to hand them to Flask."""
+    if request.path == '/stock_counter' and request.method == 'POST':
+        return 'async.stock_counter', lambda: stock_counter(request)
+    if request.path == '/stock_counter/batch' and request.method == 'POST':
+        return 'async.stock_counter_batch', lambda: stock_counter_batch(request)
+    match = _INVENTORY_PATH.match(request.path)
+    if match and request.method == 'GET':
+        table = unquote(match.group(1))
+        if table in await async_db.get_tables():  # Excel categories are served by Flask
+            return 'async.api_inventory', lambda: api_inventory(request, table)
+    return None
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope, so werkzeug can parse the request and Flask can serve it."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def _send_response(send, response):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+async def _call_flask(environ, send):
+    """Run the Flask app in a worker thread, streaming its body chunk by chunk."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'], started['headers'] = int(status.split(' ', 1)[0]), headers
+
+    iterable = await asyncio.to_thread(flask_app, environ, start_response)
+    response_started = False
+    try:
+        chunks = iter(iterable)
+        first = await asyncio.to_thread(next, chunks, None)
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in started['headers']]})
+        response_started = True
+        chunk = first
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await asyncio.to_thread(next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    except Exception as e:
+        if not response_started:
+            raise
+        # Too late for a 500: the status is already out, so end the truncated body
+        logger.error("Error streaming response for %s: %s", environ['PATH_INFO'], str(e))
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.get_pool().close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI callable: async stock-counter routes, everything else through Flask."""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    environ = _environ(scope, await _read_body(receive))
+    request = Request(environ)
+    started = time.perf_counter()
+    endpoint = 'async.unmatched'
+    try:
+        routed = await route(request)
+        if routed is None:
+            return await _call_flask(environ, send)  # timed by the Flask app's own request hooks
+        endpoint, handler = routed
+        response = await handler()
+    except QueryError as e:
+        logger.warning("Invalid query for %s: %s", request.path, str(e))
+        response = _json({'error': str(e)}, 400)
+    except Exception as e:
+        logger.error("Error in async route %s: %s", request.path, str(e))
+        response = _json({'success': False, 'message': f"Failed to process request: {str(e)}"}, 500)
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code)
+    await _send_response(send, response)
@@ -0,0 +1,514 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import os
+import time
+from mysql.connector import Error
+from cache import table_key
+from changes import DELETE, INSERT, RESET, UPSERT, commit_lock, record_change
+from db import (NUMERIC_TYPES, PoolTimeout, _batch_changes, _batch_outcome, _batch_row_ids, _next_cursor, _page_queries, _plan_batch,
+                _quote, _written_row, db_config, mysql_connect, pool_config)
+from logging_config import summarize
+from metrics import DB_CALL_SECONDS, DB_CONNECT_SECONDS, ROWS_READ, ROWS_WRITTEN, instrument_async, timed
+from query import QueryError
+
+try:
+    import aiomysql
+    import pymysql
+    from pymysql.constants import CLIENT
+except ImportError:  # optional: blocking connections are driven from worker threads instead
+    aiomysql = pymysql = CLIENT = None
+
+# aiomysql raises pymysql's errors, which are not mysql.connector errors
+DB_ERRORS = (Error, pymysql.err.MySQLError) if pymysql is not None else (Error,)
+
+logger = logging.getLogger(__name__)
+
+# Async counterpart of db.py for the ASGI app (async_app.py): the stock counter's helpers with the
+# same arguments and return values, as coroutines over a pool owned by the event loop. Streaming
+# export, workbook import and the reports keep using the synchronous db.py helpers.
+SCHEMA_TTL = float(os.environ.get('INVENTORY_SCHEMA_CACHE_TTL', 300))
+
+class ThreadedCursor:
+    """Awaitable facade over a blocking DB-API cursor; every call runs in a worker thread."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    async def execute(self, query, params=()):
+        return await asyncio.to_thread(self._cursor.execute, query, params)
+
+    async def executemany(self, query, params):
+        return await asyncio.to_thread(self._cursor.executemany, query, params)
+
+    async def fetchone(self):
+        return await asyncio.to_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await asyncio.to_thread(self._cursor.fetchall)
+
+class ThreadedConnection:
+    """Gives a blocking connection (``mysql.connector``, ``sqlite_shim``) the aiomysql call shape.
+
+    Only one coroutine uses a pooled connection at a time, so handing it from
+    one worker thread to the next is safe.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def in_transaction(self):
+        return getattr(self._connection, 'in_transaction', False)
+
+    async def cursor(self):
+        return ThreadedCursor(await asyncio.to_thread(self._connection.cursor))
+
+    async def commit(self):
+        await asyncio.to_thread(self._connection.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._connection.rollback)
+
+    def close(self):
+        self._connection.close()
+
+async def aiomysql_connect(host='localhost', user=None, password='', database=None, **options):
+    """``aiomysql.connect`` taking ``db_config``-style keyword arguments."""
+    options.setdefault('client_flag', CLIENT.FOUND_ROWS)  # rowcount counts matched rows, like db.mysql_connect
+    return await aiomysql.connect(host=host, user=user, password=password, db=database, **options)
+
+class AsyncConnectionPool:
+    """Bounded pool of connections for coroutines, the asyncio twin of ``db.ConnectionPool``.
+
+    ``connector`` is either a coroutine function returning an aiomysql-style
+    connection or a blocking DB-API connector (e.g. ``sqlite_shim.connect``),
+    whose connections are wrapped in ``ThreadedConnection``. Waiting for a free
+    connection suspends the coroutine instead of blocking a thread.
+    """
+
+    def __init__(self, connector, config, size=5, timeout=5.0, idle_timeout=300.0, **ignored):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.connector = connector
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = collections.deque()  # (connection, released_at), most recently used on the right
+        self._open = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._stats = {'checkouts': 0, 'waits': 0, 'timeouts': 0, 'created': 0, 'discarded': 0, 'evicted': 0}
+
+    async def _connect(self):
+        if asyncio.iscoroutinefunction(self.connector):
+            return await self.connector(**self.config)
+        return ThreadedConnection(await asyncio.to_thread(self.connector, **self.config))
+
+    async def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        async with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._evict_idle()
+                if self._idle:
+                    self._stats['checkouts'] += 1
+                    return self._idle.pop()[0]
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        try:
+            connection = await self._connect()
+        except Exception:
+            async with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        async with self._cond:
+            self._stats['created'] += 1
+            self._stats['checkouts'] += 1
+        return connection
+
+    async def release(self, connection):
+        if connection is None:
+            return
+        try:
+            in_transaction = getattr(connection, 'in_transaction', None)
+            if in_transaction is None and hasattr(connection, 'get_transaction_status'):  # aiomysql
+                in_transaction = connection.get_transaction_status()
+            if in_transaction:
+                await connection.rollback()
+        except Exception as e:
+            logger.warning("Discarding pooled connection that failed to roll back: %s", str(e))
+            self._close_quietly(connection)
+            async with self._cond:
+                self._open -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+            return
+        async with self._cond:
+            if self._closed:
+                self._open -= 1
+                self._close_quietly(connection)
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    async def close(self):
+        async with self._cond:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._open -= 1
+                self._close_quietly(connection)
+            self._cond.notify_all()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({'size': self.size, 'open': self._open, 'idle': len(self._idle), 'in_use': self._open - len(self._idle)})
+        return stats
+
+    def _evict_idle(self):
+        # Called with the condition held; the oldest idle connections sit on the left
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._open -= 1
+            self._stats['evicted'] += 1
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+_pool = None
+
+def _default_connector():
+    return aiomysql_connect if aiomysql is not None else mysql_connect
+
+def get_pool():
+    # Created on first use from inside the running event loop
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(_default_connector(), db_config, **pool_config)
+    return _pool
+
+def configure_pool(connector=None, config=None, **options):
+    """Replace the shared async pool, e.g. with ``sqlite_shim.connect`` for a local stand-in."""
+    global _pool
+    settings = dict(pool_config)
+    settings.update(options)
+    _pool = AsyncConnectionPool(connector or _default_connector(), db_config if config is None else config, **settings)
+    _schema.clear()
+    return _pool
+
+def get_pool_stats():
+    return get_pool().stats()
+
+async def get_db_connection():
+    try:
+        with timed(DB_CONNECT_SECONDS):
+            return await get_pool().acquire()
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a database connection: %s", str(e))
+        return None
+    except DB_ERRORS as e:
+        logger.error("Error connecting to MySQL database: %s", str(e))
+        return None
+    except Exception as e:
+        logger.error("Unexpected error while connecting to MySQL database: %s", str(e))
+        return None
+
+async def close_db_connection(connection):
+    if connection:
+        await get_pool().release(connection)
+
+# Schema cache: 'tables' -> (tables, loaded_at), table_name -> ([(name, type), ...], loaded_at)
+_schema = {}
+
+async def _fetch(query, label):
+    connection = await get_db_connection()
+    if not connection:
+        logger.warning("Failed to get database connection, returning empty %s", label)
+        return []
+    try:
+        cursor = await connection.cursor()
+        await cursor.execute(query)
+        return [tuple(row) for row in await cursor.fetchall()]
+    except DB_ERRORS as e:
+        logger.error("Error fetching %s: %s", label, str(e))
+        return []
+    finally:
+        await close_db_connection(connection)
+
+async def _cached_schema(key, query, label, convert):
+    cached = _schema.get(key)
+    if cached and time.monotonic() - cached[1] < SCHEMA_TTL:
+        return list(cached[0])
+    values = convert(await _fetch(query, label))
+    if values:
+        _schema[key] = (values, time.monotonic())
+    return list(values)
+
+async def get_tables():
+    return await _cached_schema(('tables',), "SHOW TABLES", 'table list', lambda rows: [row[0] for row in rows])
+
+async def table_exists(table_name):
+    if table_name in await get_tables():
+        return True
+    _schema.pop(('tables',), None)  # the table may have been created after we cached the list
+    return table_name in await get_tables()
+
+async def get_table_columns(table_name):
+    return await _cached_schema(table_name, f"SHOW COLUMNS FROM {table_name}", f"columns of {table_name}",
+                                lambda rows: [(row[0], row[1]) for row in rows])
+
+async def get_column_names(table_name, include_id=True):
+    return [name for name, _ in await get_table_columns(table_name) if include_id or name != 'id']
+
+def invalidate_schema(table_name=None):
+    if table_name is None:
+        _schema.clear()
+    else:
+        _schema.pop(table_name, None)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.get_table_data')
+async def get_table_data(table_name):
+    connection = await get_db_connection()
+    if not connection:
+        logger.warning("Failed to get database connection, returning empty data")
+        return []
+    try:
+        cursor = await connection.cursor()
+        await cursor.execute(f"SELECT * FROM {table_name}")
+        columns = [desc[0] for desc in cursor.description]
+        data = [list(row) for row in await cursor.fetchall()]
+        data.insert(0, columns)
+        ROWS_READ.inc(len(data) - 1, source='mysql')
+        logger.debug("Data fetched from table %s: %s", table_name, summarize(data))
+        return data
+    except DB_ERRORS as e:
+        logger.error("Error fetching data from table %s: %s", table_name, str(e))
+        return []
+    finally:
+        await close_db_connection(connection)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.get_table_page')
+async def get_table_page(table_name, limit=100, offset=0, sort=None, descending=False, filters=None, after=None):
+    """Async ``db.get_table_page``: returns ``(headers, rows, total, next_cursor)``."""
+    columns = await get_column_names(table_name)
+    if not columns:
+        raise QueryError(f"No columns found for table {table_name}")
+    sort, has_id, count_query, page_query = _page_queries(table_name, columns, limit, offset, sort, descending, filters, after)
+
+    connection = await get_db_connection()
+    if not connection:
+        raise QueryError("Failed to connect to database")
+    try:
+        cursor = await connection.cursor()
+        await cursor.execute(*count_query)
+        total = (await cursor.fetchone())[0]
+        await cursor.execute(*page_query)
+        headers = [desc[0] for desc in cursor.description]
+        rows = [list(row) for row in await cursor.fetchall()]
+        ROWS_READ.inc(len(rows), source='mysql')
+        return headers, rows, total, _next_cursor(headers, rows, limit, sort, has_id)
+    except DB_ERRORS as e:
+        logger.error("Error fetching page from table %s: %s", table_name, str(e))
+        raise QueryError(f"Error fetching data: {str(e)}")
+    finally:
+        await close_db_connection(connection)
+
+async def _fetch_row(cursor, table_name, row_id):
+    await cursor.execute(f"SELECT * FROM {table_name} WHERE id = %s", (row_id,))
+    rows = await cursor.fetchall()
+    return list(rows[0]) if rows else None
+
+async def _fetch_rows(cursor, table_name, row_ids):
+    if not row_ids:
+        return {}
+    await cursor.execute(f"SELECT * FROM {table_name} WHERE id IN ({', '.join(['%s'] * len(row_ids))})", list(row_ids))
+    return {str(row[0]): list(row) for row in await cursor.fetchall()}
+
+@contextlib.asynccontextmanager
+async def _commit_lock(table_name):
+    """``changes.commit_lock`` for coroutines; a contended lock is waited for in a worker thread, not on the loop."""
+    lock = commit_lock(table_key(table_name))
+    if not lock.acquire(blocking=False):
+        acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(lambda _: lock.release())
+            raise
+    try:
+        yield
+    finally:
+        lock.release()
+
+async def _write(table_name, query, params, message, error_message, op, row_id=None, rows=1, data=None):
+    """Run one write statement, commit and record it in the change feed; returns ``(success, message)``.
+
+    For an ``INSERT`` or ``UPSERT`` the row is built from ``data`` (``row_id`` None means the
+    inserted row); an UPSERT that matched no row records nothing.
+    """
+    connection = await get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database"
+    try:
+        cursor = await connection.cursor()
+        await cursor.execute(query, params)
+        row = None
+        if op in (INSERT, UPSERT):
+            row_id = cursor.lastrowid if row_id is None else row_id
+            row = _written_row(await get_column_names(table_name), row_id, data) if cursor.rowcount else None
+        async with _commit_lock(table_name):
+            await connection.commit()
+            if op not in (INSERT, UPSERT) or row is not None:
+                record_change(table_key(table_name), op, row_id, row)
+        ROWS_WRITTEN.inc(rows, source='mysql')
+        logger.debug("%s (table %s): %s", message, table_name, params)
+        return True, message
+    except DB_ERRORS as e:
+        logger.error("%s in table %s: %s", error_message, table_name, str(e))
+        invalidate_schema(table_name)
+        return False, f"{error_message}: {str(e)}"
+    finally:
+        await close_db_connection(connection)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.add_table_entry')
+async def add_table_entry(table_name, data):
+    columns = await get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table"
+    if len(columns) != len(data):
+        return False, "Data length does not match number of columns"
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    return await _write(table_name, query, data, "Entry added successfully", "Error adding entry", INSERT, data=data)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.update_table_entry')
+async def update_table_entry(table_name, row_id, data):
+    columns = await get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table"
+    if len(columns) != len(data):
+        return False, "Data length does not match number of columns"
+    query = f"UPDATE {table_name} SET {', '.join(f'{col} = %s' for col in columns)} WHERE id = %s"
+    return await _write(table_name, query, list(data) + [row_id], "Entry updated successfully", "Error updating entry", UPSERT, row_id,
+                        data=data)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.delete_table_entry')
+async def delete_table_entry(table_name, row_id):
+    return await _write(table_name, f"DELETE FROM {table_name} WHERE id = %s", (row_id,), "Entry deleted successfully", "Error deleting entry", DELETE, row_id)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.delete_all_entries')
+async def delete_all_entries(table_name):
+    return await _write(table_name, f"DELETE FROM {table_name}", (), f"All entries in table '{table_name}' deleted successfully",
+                        "Error deleting all entries", RESET, rows=0)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.apply_batch')
+async def apply_batch(table_name, operations):
+    """Async ``db.apply_batch``: all operations in one transaction, ``(success, message, results)``."""
+    columns = await get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table", []
+    results, queries, groups = _plan_batch(table_name, columns, operations)
+    if not all(result['success'] for result in results):
+        return False, "Batch rejected: fix the invalid operations and resubmit", results
+
+    connection = await get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database", results
+    try:
+        cursor = await connection.cursor()
+        counts = []  # rows matched per operation, None for adds
+        for action, params in groups:
+            if action == 'add_entry':
+                await cursor.executemany(queries[action], params)
+                counts.extend([None] * len(params))
+                continue
+            for statement_params in params:
+                await cursor.execute(queries[action], statement_params)
+                counts.append(cursor.rowcount)
+        changed = _batch_changes(operations, await _fetch_rows(cursor, table_name, _batch_row_ids(operations)), counts)
+        async with _commit_lock(table_name):
+            await connection.commit()
+            for op, row_id, row in changed:
+                record_change(table_key(table_name), op, row_id, row)
+        message = _batch_outcome(results, counts)
+        ROWS_WRITTEN.inc(sum(1 for count in counts if count != 0), source='mysql')
+        return True, message, results
+    except DB_ERRORS as e:
+        await connection.rollback()
+        logger.error("Error applying batch to table %s: %s", table_name, str(e))
+        invalidate_schema(table_name)
+        for result in results:
+            result['success'] = False
+            result['message'] = "Rolled back"
+        return False, f"Error applying batch: {str(e)}", results
+    finally:
+        await close_db_connection(connection)
+
+@instrument_async(DB_CALL_SECONDS, operation='async.adjust_stock')
+async def adjust_stock(table_name, row_id, column, delta):
+    """Async ``db.adjust_stock``: one conditional UPDATE, never below zero."""
+    column_types = dict(await get_table_columns(table_name))
+    if column not in column_types:
+        return False, f"Unknown column: {column}"
+    if not any(numeric in str(column_types[column]).lower() for numeric in NUMERIC_TYPES):
+        return False, f"Column {column} is not numeric"
+    connection = await get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database"
+    try:
+        cursor = await connection.cursor()
+        quoted = _quote(column)
+        await cursor.execute(f"UPDATE {table_name} SET {quoted} = {quoted} + %s WHERE id = %s AND {quoted} + %s >= 0",
+                             (delta, row_id, delta))
+        if cursor.rowcount == 1:
+            row = await _fetch_row(cursor, table_name, row_id)  # the new stock is computed by the database
+            async with _commit_lock(table_name):
+                await connection.commit()
+                record_change(table_key(table_name), UPSERT, row_id, row)
+            ROWS_WRITTEN.inc(source='mysql')
+            return True, "Stock updated successfully"
+        await cursor.execute(f"SELECT {quoted} FROM {table_name} WHERE id = %s", (row_id,))
+        found = await cursor.fetchone()
+        await connection.rollback()
+        return False, "Insufficient stock" if found else "Item not found"
+    except DB_ERRORS as e:
+        await connection.rollback()
+        logger.error("Error adjusting stock in table %s: %s", table_name, str(e))
+        return False, f"Error adjusting stock: {str(e)}"
+    finally:
+        await close_db_connection(connection)
@@ -0,0 +1,276 @@
+"""Reproducible benchmarks for the loaders, the stock functions, the db helpers and the Flask routes.
+
+Generates a synthetic workbook and a SQLite table (through ``sqlite_shim``, a
+MySQL-dialect stand-in plugged into ``db.configure_pool``), times everything
+and writes the results as JSON::
+
+    python benchmark.py run --rows 10000 --sheets 8 --output results.json
+    python benchmark.py run --rows 10000 --compare baseline.json
+    python benchmark.py compare baseline.json results.json --threshold 1.25
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import openpyxl
+import db
+import excel_handler
+import sqlite_shim
+from cache import response_cache
+from excel_handler import load_excel_data, load_excel_data_legacy
+from inventory import get_inventory_page, sanitize_category
+from logging_config import configure_logging
+from restock import process_restock
+from sales import process_sale
+from search import SearchIndex, category_index, invalidate_search, search
+from store import InventoryLoader, InventoryStore, StockJournal, resolve_columns
+
+HEADERS = ['S.No.', 'Item Name', 'Brand', 'Quantity', 'Rate']
+TABLE_NAME = 'bench_stock'
+BRANDS = ['Camlin', 'Faber', 'Doms', 'Apsara', 'Natraj', 'Classmate']
+LEGACY_MAX_ROWS = 50000  # the random-access loader is too slow to be worth timing beyond this
+INITIAL_STOCK = 10 ** 9  # high enough that repeated sales never run out
+CACHED_ROUTES = ('route.product_table', 'route.api_inventory.')  # served through cache.response_cache
+
+def generate_workbook(path, sheets=4, rows=1000, seed=0):
+    """Write ``sheets`` sheets of ``rows`` items each, laid out like data/inventory_data.xlsx."""
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_idx in range(sheets):
+        sheet = workbook.create_sheet(f"Category {sheet_idx + 1}")
+        sheet.append(HEADERS)
+        for item in range(1, rows + 1):
+            sheet.append([item, f"Item {sheet_idx + 1}-{item}", rng.choice(BRANDS), INITIAL_STOCK, round(rng.uniform(1, 500), 2)])
+    workbook.save(path)
+    return path
+
+def generate_table(database, rows=1000, seed=0, table_name=TABLE_NAME):
+    """Create and fill ``table_name`` in a SQLite file with the columns a stock counter table has."""
+    rng = random.Random(seed)
+    connection = sqlite3.connect(database)
+    try:
+        connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+        connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY AUTOINCREMENT, item_name VARCHAR(255), "
+                           "brand VARCHAR(64), quantity INT, rate DECIMAL(10, 2))")
+        connection.executemany(f"INSERT INTO {table_name} (item_name, brand, quantity, rate) VALUES (?, ?, ?, ?)",
+                               ((f"Item {item}", rng.choice(BRANDS), INITIAL_STOCK, round(rng.uniform(1, 500), 2))
+                                for item in range(1, rows + 1)))
+        connection.commit()
+    finally:
+        connection.close()
+    return database
+
+def measure(func, iterations=20, warmup=1, setup=None):
+    """Time ``func`` (``setup`` runs untimed before each call); returns a summary in milliseconds."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    timings = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'min_ms': timings[0],
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.fmean(timings),
+        'p95_ms': timings[min(int(len(timings) * 0.95), len(timings) - 1)],
+        'max_ms': timings[-1],
+    }
+
+def _load_app(workbook):
+    """Import the Flask app without touching data/, serving ``workbook`` from an in-memory journal."""
+    os.environ.setdefault('INVENTORY_LOAD_MODE', 'lazy')
+    level = logging.getLogger().level
+    import app as app_module
+    logging.getLogger().setLevel(level)  # the app configures logging at import
+    app_module.inventory_loader = InventoryLoader(
+        lambda: InventoryStore(load_excel_data(workbook, use_cache=False), journal=StockJournal()))
+    app_module.inventory_loader.wait()
+    return app_module.app
+
+def _expect(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.method} {response.request.path} returned {response.status_code}")
+    return response
+
+def bench_loaders(workbook, total_rows, repeat):
+    results = {}
+    if total_rows <= LEGACY_MAX_ROWS:
+        results['loader.legacy'] = measure(lambda: load_excel_data_legacy(workbook), repeat, warmup=0)
+    results['loader.streaming'] = measure(lambda: load_excel_data(workbook, use_cache=False), repeat, warmup=0)
+    results['loader.cached'] = measure(lambda: load_excel_data(workbook), repeat)
+    results['loader.cached_compact'] = measure(lambda: load_excel_data(workbook, compact=True), repeat)
+    return results
+
+def bench_stock(workbook, iterations):
+    data = load_excel_data(workbook, use_cache=False)
+    inventory_store = InventoryStore(load_excel_data(workbook, use_cache=False))
+    original = next(iter(data))
+    category = sanitize_category(original)
+    grid = data[original]
+    headers = grid[0]
+    s_no_idx, _ = resolve_columns(headers)
+    item_id = grid[-1][s_no_idx]  # last row: the linear scan's worst case
+    return {
+        'lookup.linear': measure(lambda: next(row for row in grid[1:] if str(row[s_no_idx]) == str(item_id)), iterations),
+        'lookup.indexed': measure(lambda: inventory_store.find_item(category, item_id), iterations),
+        'sale.linear': measure(lambda: process_sale(data, category, item_id, 1, headers), iterations),
+        'sale.store': measure(lambda: inventory_store.process_sale(category, item_id, 1), iterations),
+        'restock.linear': measure(lambda: process_restock(data, category, item_id, 1, headers), iterations),
+        'restock.store': measure(lambda: inventory_store.process_restock(category, item_id, 1), iterations),
+        'search.build': measure(lambda: SearchIndex([(row[0], row[1], row) for row in grid[1:]]), 3, warmup=0),
+        'search.typeahead': measure(lambda: search(inventory_store, [], f"item {str(item_id)[:-1]}"), iterations),
+        'inventory_page.sorted': measure(lambda: get_inventory_page(data, category, limit=100, sort='Item Name'), iterations),
+    }
+
+def bench_db(table_rows, iterations):
+    _, rows, _, _ = db.get_table_page(TABLE_NAME, limit=100)
+    deep_offset = max(table_rows - 100, 0)
+    return {
+        'db.get_table_data': measure(lambda: db.get_table_data(TABLE_NAME), iterations),
+        'db.page.first': measure(lambda: db.get_table_page(TABLE_NAME, limit=100), iterations),
+        'db.page.deep_offset': measure(lambda: db.get_table_page(TABLE_NAME, limit=100, offset=deep_offset), iterations),
+        'db.page.keyset': measure(lambda: db.get_table_page(TABLE_NAME, limit=100, after=(rows[-1][0], rows[-1][0])), iterations),
+        'db.adjust_stock': measure(lambda: db.adjust_stock(TABLE_NAME, rows[0][0], 'quantity', -1), iterations),
+    }
+
+def bench_routes(workbook, iterations):
+    client = _load_app(workbook).test_client()
+    category = sanitize_category(next(iter(load_excel_data(workbook))))
+    routes = {
+        'route.product_table': lambda: _expect(client.get('/product_table')),
+        'route.sales_reform': lambda: _expect(client.get('/sales_reform')),
+        'route.sales_reform.sale': lambda: _expect(client.post('/sales_reform', data={'category': category, 'item_id': '1', 'quantity': '1', 'sale': '1'})),
+        'route.stock_counter': lambda: _expect(client.get(f'/stock_counter?table={TABLE_NAME}')),
+        'route.stock_counter.sale': lambda: _expect(client.post('/stock_counter', data={'table': TABLE_NAME, 'action': 'sale', 'row_id': '1', 'quantity': '1'})),
+        'route.api_inventory.table': lambda: _expect(client.get(f'/api/inventory/{TABLE_NAME}')),
+        'route.api_inventory.table_page': lambda: _expect(client.get(f'/api/inventory/{TABLE_NAME}?limit=100&sort=item_name')),
+        'route.api_inventory.category': lambda: _expect(client.get(f'/api/inventory/{category}')),
+        'route.api_inventory.category_page': lambda: _expect(client.get(f'/api/inventory/{category}?limit=100&sort=Item Name')),
+        'route.api_search': lambda: _expect(client.get('/api/search?q=item 1-12')),
+    }
+    results = {}
+    for name, request in routes.items():
+        results[name] = measure(request, iterations)
+        if name.startswith(CACHED_ROUTES):
+            # The same request again with the response cache emptied first: the cost of a miss
+            results[name + '.uncached'] = measure(request, iterations, setup=response_cache.clear)
+    return results
+
+def run_suite(rows=1000, sheets=4, table_rows=None, iterations=20, loader_repeat=3, seed=0, workdir=None):
+    """Generate the data set, run every benchmark and return the JSON-serializable results."""
+    table_rows = rows if table_rows is None else table_rows
+    workdir = workdir or tempfile.mkdtemp(prefix='inventory-bench-')
+    cache_dir = excel_handler.CACHE_DIR
+    excel_handler.CACHE_DIR = os.path.join(workdir, 'cache')  # keep the pickles out of data/.cache
+    try:
+        started = time.perf_counter()
+        workbook = generate_workbook(os.path.join(workdir, 'bench.xlsx'), sheets=sheets, rows=rows, seed=seed)
+        database = generate_table(os.path.join(workdir, 'bench.sqlite3'), rows=table_rows, seed=seed)
+        db.configure_pool(connector=sqlite_shim.connect, config={'database': database})
+        db.invalidate_schema()
+        generate_seconds = time.perf_counter() - started
+
+        results = {}
+        results.update(bench_loaders(workbook, rows * sheets, loader_repeat))
+        results.update(bench_stock(workbook, iterations))
+        results.update(bench_db(table_rows, iterations))
+        results.update(bench_routes(workbook, iterations))
+        return {
+            'meta': {
+                'rows': rows, 'sheets': sheets, 'table_rows': table_rows, 'iterations': iterations,
+                'seed': seed, 'workbook_bytes': os.path.getsize(workbook), 'generate_seconds': generate_seconds,
+                'python': platform.python_version(), 'platform': platform.platform(), 'timestamp': time.time(),
+            },
+            'results': results,
+        }
+    finally:
+        excel_handler.CACHE_DIR = cache_dir
+        db.configure_pool()
+        db.invalidate_schema()
+        invalidate_search()  # indexes built over the generated table
+
+def compare(baseline, current, threshold=1.2, metric='median_ms'):
+    """Compare two result sets; returns ``(rows, regressions)`` where a row is ``(name, before, after, ratio)``."""
+    rows, regressions = [], []
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result[metric] / before[metric] if before[metric] else float('inf')
+        rows.append((name, before[metric], result[metric], ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def format_comparison(rows, regressions, threshold):
+    lines = [f"{'benchmark':<45} {'before':>10} {'after':>10} {'ratio':>7}"]
+    for name, before, after, ratio in rows:
+        flag = '  REGRESSION' if name in regressions else ''
+        lines.append(f"{name:<45} {before:>9.3f}ms {after:>9.3f}ms {ratio:>6.2f}x{flag}")
+    lines.append(f"{len(regressions)} of {len(rows)} benchmarks slower than {threshold:.2f}x the baseline")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inventory loaders, stock functions, db helpers and routes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="generate data and run the suite")
+    run_parser.add_argument('--rows', type=int, default=1000, help="items per sheet")
+    run_parser.add_argument('--sheets', type=int, default=4)
+    run_parser.add_argument('--table-rows', type=int, help="rows in the SQLite table (defaults to --rows)")
+    run_parser.add_argument('--iterations', type=int, default=20)
+    run_parser.add_argument('--loader-repeat', type=int, default=3)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--workdir', help="keep the generated data here instead of a temporary directory")
+    run_parser.add_argument('--output', help="write the results JSON here")
+    run_parser.add_argument('--compare', help="baseline results JSON to compare against")
+    run_parser.add_argument('--threshold', type=float, default=1.2)
+    compare_parser = commands.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+    configure_logging(level='WARNING')
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        with open(args.current, encoding='utf-8') as handle:
+            current = json.load(handle)
+    else:
+        workdir = args.workdir or tempfile.mkdtemp(prefix='inventory-bench-')
+        os.makedirs(workdir, exist_ok=True)
+        try:
+            current = run_suite(args.rows, args.sheets, args.table_rows, args.iterations, args.loader_repeat, args.seed, workdir)
+        finally:
+            if not args.workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as handle:
+                json.dump(current, handle, indent=2)
+        for name, result in current['results'].items():
+            print(f"{name:<45} median {result['median_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms")
+        if not args.compare:
+            return 0
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(format_comparison(rows, regressions, args.threshold))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
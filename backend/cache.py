@@ -0,0 +1,82 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Versions are per process. MySQL tables can also be written by other workers,
+# so their versions are combined with a time bucket of this many seconds to
+# bound how long another worker can keep serving a stale copy.
+TABLE_VERSION_TTL = float(os.environ.get('INVENTORY_TABLE_CACHE_TTL', 30))
+
+INVENTORY_KEY = 'inventory'  # bumped whenever the workbook data is replaced
+
+_versions = collections.defaultdict(int)
+_versions_lock = threading.Lock()
+
+def table_key(table_name):
+    return f"table:{table_name}"
+
+def category_key(original_category):
+    return f"category:{original_category}"
+
+def get_version(key):
+    with _versions_lock:
+        return _versions[key]
+
+def bump_version(key):
+    with _versions_lock:
+        _versions[key] += 1
+        return _versions[key]
+
+def table_version(table_name):
+    return f"{get_version(table_key(table_name))}.{int(time.time() // TABLE_VERSION_TTL)}"
+
+def category_version(original_category):
+    return f"{get_version(INVENTORY_KEY)}.{get_version(category_key(original_category))}"
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+
+class ResponseCache:
+    """Bounded LRU of rendered bodies, each valid only for the data version it was built from."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # key -> (version, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, body):
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_build(self, key, version, build):
+        body = self.get(key, version)
+        if body is None:
+            body = build()
+            self.put(key, version, body)
+        return body
+
+response_cache = ResponseCache(max_entries=int(os.environ.get('INVENTORY_RESPONSE_CACHE_SIZE', 256)))
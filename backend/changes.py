@@ -0,0 +1,79 @@
+import collections
+import logging
+import os
+import threading
+import uuid
+from cache import bump_version, get_version
+
+logger = logging.getLogger(__name__)
+
+# Changes kept per table/category; a client further behind than this gets a reset and refetches
+CHANGE_LOG_SIZE = int(os.environ.get('INVENTORY_CHANGE_LOG_SIZE', 1000))
+
+# Versions live in this process only; clients that see a different feed id must refetch
+FEED_ID = uuid.uuid4().hex[:12]
+
+INSERT, UPSERT, DELETE, RESET = 'insert', 'upsert', 'delete', 'reset'
+
+class ChangeFeed:
+    """Recent changes to one table or category as ``(version, op, row_id, row)``.
+
+    The version is the data version in cache.py (``table_key``/``category_key``),
+    so recording a change also invalidates the cached responses for it. ``op``
+    is ``insert`` (a new row), ``upsert`` (an existing row changed; ``row`` is
+    the full row after the change in both cases), ``delete`` or ``reset`` (too
+    much changed to describe row by row). Writers hold
+    ``commit_lock`` from just before their commit until the change is recorded,
+    so versions follow the order the database committed in.
+    """
+
+    def __init__(self, key, size=CHANGE_LOG_SIZE):
+        self.key = key
+        self.commit_lock = threading.Lock()
+        self._changes = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, op, row_id=None, row=None):
+        with self._lock:
+            version = bump_version(self.key)
+            self._changes.append((version, op, row_id, list(row) if row is not None else None))
+        return version
+
+    def since(self, version):
+        """``(current_version, changes)`` after ``version``; ``changes`` is None when the client must refetch."""
+        with self._lock:
+            current = get_version(self.key)
+            if version == current:
+                return current, []
+            if version > current or not self._changes or self._changes[0][0] > version + 1:
+                return current, None  # from another process/restart, or older than the retained log
+            changes = [change for change in self._changes if change[0] > version]
+        if any(change[1] == RESET for change in changes):
+            return current, None
+        return current, changes
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+def get_feed(key):
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = ChangeFeed(key)
+        return feed
+
+def commit_lock(key):
+    return get_feed(key).commit_lock
+
+def record_change(key, op, row_id=None, row=None):
+    return get_feed(key).record(op, row_id, row)
+
+def changes_since(key, version):
+    return get_feed(key).since(version)
+
+def change_response(name, key, version):
+    """JSON body for ``/api/changes``: only the rows changed since ``version``, or ``reset``."""
+    current, changes = changes_since(key, version)
+    return {'feed': FEED_ID, 'table': name, 'version': current, 'reset': changes is None,
+            'changes': [{'version': change_version, 'op': op, 'id': row_id, 'row': row}
+                        for change_version, op, row_id, row in changes or ()]}
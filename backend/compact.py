@@ -0,0 +1,240 @@
+import array
+import logging
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Numeric columns are stored in typed arrays; everything else is dictionary-encoded:
+# each distinct (interned) value is kept once and cells hold a small integer code.
+_INT_MIN, _INT_MAX = -(1 << 63), (1 << 63) - 1
+
+def _code_typecode(distinct):
+    return 'B' if distinct <= 0xFF else 'H' if distinct <= 0xFFFF else 'L'
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and _INT_MIN <= value <= _INT_MAX
+
+def _is_float(value):
+    return isinstance(value, float)
+
+class NumericColumn:
+    """``array('q')`` or ``array('d')`` of values, with a mask for blank (``''``) cells."""
+
+    def __init__(self, typecode, values):
+        self.typecode = typecode
+        self.accepts = _is_int if typecode == 'q' else _is_float
+        self.values = array.array(typecode, (0 if value == '' else value for value in values))
+        blanks = [idx for idx, value in enumerate(values) if value == '']
+        self.blanks = bytearray(len(values)) if blanks else None
+        for idx in blanks:
+            self.blanks[idx] = 1
+
+    def __getitem__(self, idx):
+        if self.blanks is not None and self.blanks[idx]:
+            return ''
+        return self.values[idx]
+
+    def set(self, idx, value):
+        """Store ``value``; returns False when it does not fit and the column must be re-encoded."""
+        if value == '':
+            if self.blanks is None:
+                self.blanks = bytearray(len(self.values))
+            self.blanks[idx] = 1
+            return True
+        if not self.accepts(value):
+            return False
+        self.values[idx] = value
+        if self.blanks is not None:
+            self.blanks[idx] = 0
+        return True
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + (sys.getsizeof(self.blanks) if self.blanks is not None else 0)
+
+class DictionaryColumn:
+    """Distinct values stored once (strings interned), cells hold codes into that table."""
+
+    def __init__(self, values):
+        self.table = []
+        self.positions = {}  # (type, value) -> code; the type keeps 1, 1.0 and True apart
+        codes = [self._code(value) for value in values]
+        self.codes = array.array(_code_typecode(len(self.table)), codes)
+
+    def _code(self, value):
+        key = (type(value), value)
+        code = self.positions.get(key)
+        if code is None:
+            code = self.positions[key] = len(self.table)
+            self.table.append(sys.intern(value) if isinstance(value, str) else value)
+        return code
+
+    def __getitem__(self, idx):
+        return self.table[self.codes[idx]]
+
+    def set(self, idx, value):
+        try:
+            code = self._code(value)
+        except TypeError:  # unhashable cell value
+            code = len(self.table)
+            self.table.append(value)
+        if _code_typecode(len(self.table)) != self.codes.typecode:
+            self.codes = array.array(_code_typecode(len(self.table)), self.codes)
+        self.codes[idx] = code
+        return True
+
+    def nbytes(self):
+        strings = sum(sys.getsizeof(value) for value in self.table)
+        return sys.getsizeof(self.codes) + sys.getsizeof(self.table) + strings
+
+class ObjectColumn:
+    """Plain list, for the rare column holding unhashable values."""
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def __getitem__(self, idx):
+        return self.values[idx]
+
+    def set(self, idx, value):
+        self.values[idx] = value
+        return True
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+
+def encode_column(values):
+    non_blank = [value for value in values if value != '']
+    if non_blank and all(_is_int(value) for value in non_blank):
+        return NumericColumn('q', values)
+    if non_blank and all(_is_float(value) for value in non_blank):
+        return NumericColumn('d', values)
+    try:
+        return DictionaryColumn(values)
+    except TypeError:
+        return ObjectColumn(values)
+
+class RowView:
+    """A row of a ``CompactSheet`` that reads and writes through to its columns."""
+
+    __slots__ = ('_sheet', '_row')
+
+    def __init__(self, sheet, row):
+        self._sheet = sheet
+        self._row = row
+
+    def __len__(self):
+        return len(self._sheet.columns)
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [self[idx] for idx in range(*col.indices(len(self)))]
+        return self._sheet.columns[col][self._row]
+
+    def __setitem__(self, col, value):
+        self._sheet.set_cell(self._row, col, value)
+
+    def __iter__(self):
+        row = self._row
+        return (column[row] for column in self._sheet.columns)
+
+    def __eq__(self, other):
+        if isinstance(other, (RowView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def to_list(self):
+        return list(self)
+
+class CompactSheet:
+    """Column-oriented replacement for a ``[headers, row, ...]`` grid.
+
+    Indexing, slicing, ``len`` and iteration behave like the list grid (index 0
+    is the header list, later indexes are ``RowView``s), so ``InventoryStore``,
+    the sort indexes and the templates work unchanged. ``to_lists`` rebuilds
+    the plain grid, e.g. for JSON.
+    """
+
+    def __init__(self, grid):
+        self.headers = list(grid[0])
+        self.rows = len(grid) - 1
+        self.columns = [encode_column([row[col] for row in grid[1:]]) for col in range(len(self.headers))]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.rows + 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[pos] for pos in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx == 0:
+            return self.headers
+        if not 0 < idx <= self.rows:
+            raise IndexError("sheet index out of range")
+        return RowView(self, idx - 1)
+
+    def __iter__(self):
+        yield self.headers
+        for row in range(self.rows):
+            yield RowView(self, row)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactSheet, list)):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<CompactSheet {self.rows} rows x {len(self.headers)} cols>"
+
+    def set_cell(self, row, col, value):
+        with self._lock:
+            column = self.columns[col]
+            if not column.set(row, value):
+                # The value does not fit the typed array (e.g. text in a stock column): re-encode
+                values = [column[idx] for idx in range(self.rows)]
+                values[row] = value
+                self.columns[col] = encode_column(values)
+                logger.debug("Re-encoded column %s of %r", self.headers[col], self)
+
+    def to_lists(self):
+        return [list(self.headers)] + [list(RowView(self, row)) for row in range(self.rows)]
+
+    def nbytes(self):
+        return sys.getsizeof(self.headers) + sum(column.nbytes() for column in self.columns)
+
+def compact_sheets(inventory_data):
+    """Convert every non-empty grid of ``{sheet_name: grid}`` to a ``CompactSheet``."""
+    return {name: CompactSheet(grid) if grid else grid for name, grid in inventory_data.items()}
+
+def grid_nbytes(grid):
+    """Approximate footprint of a list-of-lists grid, counting each distinct cell object once."""
+    seen = set()
+    total = sys.getsizeof(grid)
+    for row in grid:
+        total += sys.getsizeof(row)
+        for value in row:
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return total
+
+def memory_report(inventory_data):
+    """``{sheet_name: (list_bytes, compact_bytes)}`` for a ``load_excel_data`` result."""
+    return {name: (grid_nbytes(grid), CompactSheet(grid).nbytes()) for name, grid in inventory_data.items() if grid}
+
+if __name__ == '__main__':
+    # Memory before/after on the bundled workbooks: python compact.py
+    import os
+    from excel_handler import EXCEL_FILE, load_excel_data
+    data_dir = os.path.dirname(EXCEL_FILE)
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith('.xlsx'):
+            report = memory_report(load_excel_data(os.path.join(data_dir, name), use_cache=False))
+            before = sum(sizes[0] for sizes in report.values())
+            after = sum(sizes[1] for sizes in report.values())
+            print(f"{name}: {len(report)} sheets, lists {before / 1024:.0f} KiB, compact {after / 1024:.0f} KiB ({after / max(before, 1):.0%})")
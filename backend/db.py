@@ -1,6 +1,16 @@
+import collections
+import os
+import threading
+import time
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.constants import ClientFlag
 import logging
+from logging_config import summarize
+from query import QueryError, encode_cursor
+from cache import table_key
+from changes import DELETE, INSERT, RESET, UPSERT, commit_lock, record_change
+from metrics import DB_CALL_SECONDS, DB_CONNECT_SECONDS, ROWS_READ, ROWS_WRITTEN, instrument, timed
 
 logger = logging.getLogger(__name__)
 
@@ -12,17 +22,205 @@ db_config = {
     'database': 'InventoryDB'
 }
 
+# Connection pool configuration (overridable through the environment)
+pool_config = {
+    'size': int(os.environ.get('INVENTORY_DB_POOL_SIZE', 5)),
+    'timeout': float(os.environ.get('INVENTORY_DB_POOL_TIMEOUT', 5)),  # seconds to wait for a free connection
+    'idle_timeout': float(os.environ.get('INVENTORY_DB_POOL_IDLE_TIMEOUT', 300)),  # evict connections idle this long
+    'health_check_interval': float(os.environ.get('INVENTORY_DB_POOL_HEALTH_CHECK', 30)),  # ping connections idle this long
+}
+
+def mysql_connect(**config):
+    # FOUND_ROWS: rowcount counts matched rows, so an UPDATE that leaves a row unchanged still finds it
+    return mysql.connector.connect(client_flags=[ClientFlag.FOUND_ROWS], **config)
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of reusable database connections.
+
+    ``connector`` is any callable returning a DB-API connection
+    (``mysql.connector.connect`` by default), so the pool can be exercised
+    against SQLite or a fake connector.
+    """
+
+    def __init__(self, connector, config, size=5, timeout=5.0, idle_timeout=300.0, health_check_interval=30.0):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.connector = connector
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = collections.deque()  # (connection, released_at), most recently used on the right
+        self._open = 0  # connections currently owned by the pool (idle + checked out)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {'checkouts': 0, 'waits': 0, 'timeouts': 0, 'created': 0, 'discarded': 0, 'evicted': 0}
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            candidate = None
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._evict_idle()
+                if self._idle:
+                    candidate = self._idle.pop()
+                elif self._open < self.size:
+                    self._open += 1
+                else:
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                    self._cond.wait(remaining)
+                    continue
+
+            if candidate is not None:
+                connection, released_at = candidate
+                if time.monotonic() - released_at < self.health_check_interval or self._is_healthy(connection):
+                    self._checked_out()
+                    return connection
+                logger.debug("Discarding unhealthy pooled connection")
+                self._discard(connection)
+                continue
+
+            try:
+                connection = self.connector(**self.config)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+            self._checked_out()
+            return connection
+
+    def release(self, connection):
+        if connection is None:
+            return
+        try:
+            if getattr(connection, 'in_transaction', False):
+                connection.rollback()
+        except Exception as e:
+            logger.warning("Discarding pooled connection that failed to roll back: %s", str(e))
+            self._discard(connection)
+            return
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                self._close_quietly(connection)
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, connection):
+        """Close a checked-out connection instead of returning it, e.g. one with unread results."""
+        self._discard(connection)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._open -= 1
+                self._close_quietly(connection)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+            })
+            return stats
+
+    def _checked_out(self):
+        with self._cond:
+            self._stats['checkouts'] += 1
+
+    def _discard(self, connection):
+        self._close_quietly(connection)
+        with self._cond:
+            self._open -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def _evict_idle(self):
+        # Called with the lock held; the oldest idle connections sit on the left
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._open -= 1
+            self._stats['evicted'] += 1
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _is_healthy(connection):
+        try:
+            is_connected = getattr(connection, 'is_connected', None)
+            if is_connected is not None:
+                return is_connected()
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(mysql_connect, db_config, **pool_config)
+    return _pool
+
+def configure_pool(connector=None, config=None, **options):
+    """Replace the shared pool, e.g. with a different size or a SQLite/fake connector."""
+    global _pool
+    settings = dict(pool_config)
+    settings.update(options)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(connector or mysql_connect, db_config if config is None else config, **settings)
+    return _pool
+
+def get_pool_stats():
+    return get_pool().stats()
+
 def get_db_connection():
     try:
-        logger.debug("Attempting to connect to MySQL database with config: host=%s, user=%s, database=%s", 
-                     db_config['host'], db_config['user'], db_config['database'])
-        connection = mysql.connector.connect(**db_config)
-        if connection.is_connected():
-            logger.debug("Successfully connected to MySQL database")
-            return connection
-        else:
-            logger.error("Connection established but not connected")
-            return None
+        with timed(DB_CONNECT_SECONDS):
+            connection = get_pool().acquire()
+        logger.debug("Checked out pooled database connection")
+        return connection
+    except PoolTimeout as e:
+        logger.error("Timed out waiting for a database connection: %s", str(e))
+        return None
     except Error as e:
         logger.error("Error connecting to MySQL database: %s", str(e))
         return None
@@ -31,11 +229,70 @@ def get_db_connection():
         return None
 
 def close_db_connection(connection):
-    if connection and connection.is_connected():
-        connection.close()
-        logger.debug("MySQL connection closed")
+    if connection:
+        get_pool().release(connection)
+        logger.debug("Database connection returned to pool")
 
-def get_tables():
+def discard_db_connection(connection):
+    if connection:
+        get_pool().discard(connection)
+        logger.debug("Database connection closed instead of returned to pool")
+
+class SchemaCache:
+    """In-memory cache of table names and column definitions.
+
+    Entries expire after ``ttl`` seconds; ``invalidate`` drops them early,
+    e.g. after a statement fails because the schema changed underneath us.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._tables = None  # (tables, loaded_at)
+        self._columns = {}  # table_name -> ([(name, type), ...], loaded_at)
+        self._lock = threading.Lock()
+
+    def get_tables(self):
+        with self._lock:
+            if self._tables and time.monotonic() - self._tables[1] < self.ttl:
+                return list(self._tables[0])
+        tables = _fetch_tables()
+        if tables:
+            with self._lock:
+                self._tables = (tables, time.monotonic())
+        return list(tables)
+
+    def has_table(self, table_name):
+        if table_name in self.get_tables():
+            return True
+        # A miss may mean the table was created after we cached the list; refresh once
+        with self._lock:
+            self._tables = None
+        return table_name in self.get_tables()
+
+    def get_columns(self, table_name):
+        with self._lock:
+            cached = self._columns.get(table_name)
+            if cached and time.monotonic() - cached[1] < self.ttl:
+                return list(cached[0])
+        columns = _fetch_columns(table_name)
+        if columns:
+            with self._lock:
+                self._columns[table_name] = (columns, time.monotonic())
+        return list(columns)
+
+    def invalidate(self, table_name=None):
+        with self._lock:
+            if table_name is None:
+                self._tables = None
+                self._columns.clear()
+            else:
+                self._columns.pop(table_name, None)
+        logger.debug("Schema cache invalidated for %s", table_name or 'all tables')
+
+schema_cache = SchemaCache(ttl=float(os.environ.get('INVENTORY_SCHEMA_CACHE_TTL', 300)))
+
+@instrument(DB_CALL_SECONDS, operation='fetch_tables')
+def _fetch_tables():
     connection = get_db_connection()
     if not connection:
         logger.warning("Failed to get database connection, returning empty table list")
@@ -44,7 +301,7 @@ def get_tables():
         cursor = connection.cursor()
         cursor.execute("SHOW TABLES")
         tables = [table[0] for table in cursor.fetchall()]
-        logger.debug("Tables in database: %s", tables)
+        logger.debug("Tables in database: %s", summarize(tables))
         return tables
     except Error as e:
         logger.error("Error fetching tables: %s", str(e))
@@ -52,6 +309,41 @@ def get_tables():
     finally:
         close_db_connection(connection)
 
+@instrument(DB_CALL_SECONDS, operation='fetch_columns')
+def _fetch_columns(table_name):
+    connection = get_db_connection()
+    if not connection:
+        logger.warning("Failed to get database connection, returning empty column list")
+        return []
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
+        columns = [(col[0], col[1]) for col in cursor.fetchall()]
+        logger.debug("Columns in table %s: %s", table_name, columns)
+        return columns
+    except Error as e:
+        logger.error("Error fetching columns for table %s: %s", table_name, str(e))
+        return []
+    finally:
+        close_db_connection(connection)
+
+def get_tables():
+    return schema_cache.get_tables()
+
+def table_exists(table_name):
+    return schema_cache.has_table(table_name)
+
+def get_table_columns(table_name):
+    """Return ``[(column_name, column_type), ...]`` for a table, served from the schema cache."""
+    return schema_cache.get_columns(table_name)
+
+def get_column_names(table_name, include_id=True):
+    return [name for name, _ in schema_cache.get_columns(table_name) if include_id or name != 'id']
+
+def invalidate_schema(table_name=None):
+    schema_cache.invalidate(table_name)
+
+@instrument(DB_CALL_SECONDS, operation='get_table_data')
 def get_table_data(table_name):
     connection = get_db_connection()
     if not connection:
@@ -63,7 +355,8 @@ def get_table_data(table_name):
         columns = [desc[0] for desc in cursor.description]
         data = [list(row) for row in cursor.fetchall()]
         data.insert(0, columns)  # Insert column headers as the first row
-        logger.debug("Data fetched from table %s: %s", table_name, data)
+        ROWS_READ.inc(len(data) - 1, source='mysql')
+        logger.debug("Data fetched from table %s: %s", table_name, summarize(data))
         return data
     except Error as e:
         logger.error("Error fetching data from table %s: %s", table_name, str(e))
@@ -71,55 +364,232 @@ def get_table_data(table_name):
     finally:
         close_db_connection(connection)
 
+_SQL_OPERATORS = {'=': '=', '!=': '<>', '>': '>', '<': '<', '>=': '>=', '<=': '<=', '~': 'LIKE'}
+
+def _quote(column):
+    return '`' + column.replace('`', '``') + '`'
+
+def _page_queries(table_name, columns, limit, offset, sort, descending, filters, after):
+    """Build the COUNT and page SELECT for ``get_table_page`` (shared with async_db).
+
+    Returns ``(sort, has_id, (count_sql, count_params), (page_sql, page_params))``.
+    """
+    sort = sort or ('id' if 'id' in columns else columns[0])
+    for column in [sort] + [f[0] for f in (filters or [])]:
+        if column not in columns:
+            raise QueryError(f"Unknown column: {column}")
+
+    where, params = [], []
+    for column, op, value in filters or []:
+        if op == '~':
+            value = f"%{value}%"
+        where.append(f"{_quote(column)} {_SQL_OPERATORS[op]} %s")
+        params.append(value)
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ''
+
+    has_id = 'id' in columns
+    direction = 'DESC' if descending else 'ASC'
+    order_sql = f" ORDER BY {_quote(sort)} {direction}" + (f", `id` {direction}" if has_id and sort != 'id' else '')
+    page_where, page_params = list(where), list(params)
+    if after is not None:
+        sort_value, row_id = after
+        comparison = '<' if descending else '>'
+        if has_id and sort != 'id':
+            page_where.append(f"({_quote(sort)}, `id`) {comparison} (%s, %s)")
+            page_params.extend([sort_value, row_id])
+        else:
+            page_where.append(f"{_quote(sort)} {comparison} %s")
+            page_params.append(sort_value)
+        offset = 0
+    page_where_sql = f" WHERE {' AND '.join(page_where)}" if page_where else ''
+    return (sort, has_id, (f"SELECT COUNT(*) FROM {table_name}{where_sql}", params),
+            (f"SELECT * FROM {table_name}{page_where_sql}{order_sql} LIMIT %s OFFSET %s", page_params + [limit, offset]))
+
+def _next_cursor(headers, rows, limit, sort, has_id):
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[headers.index(sort)], last[headers.index('id')] if has_id else None)
+
+@instrument(DB_CALL_SECONDS, operation='get_table_page')
+def get_table_page(table_name, limit=100, offset=0, sort=None, descending=False, filters=None, after=None):
+    """Fetch one page of a table with sorting and filtering pushed down into SQL.
+
+    ``filters`` is a list of ``(column, op, value)`` tuples from ``query.parse_filter``;
+    ``after`` is a decoded keyset cursor ``(sort_value, id)`` and, when given, replaces
+    ``offset``. Returns ``(headers, rows, total, next_cursor)``.
+    """
+    columns = get_column_names(table_name)
+    if not columns:
+        raise QueryError(f"No columns found for table {table_name}")
+    sort, has_id, count_query, page_query = _page_queries(table_name, columns, limit, offset, sort, descending, filters, after)
+
+    connection = get_db_connection()
+    if not connection:
+        raise QueryError("Failed to connect to database")
+    try:
+        cursor = connection.cursor()
+        cursor.execute(*count_query)
+        total = cursor.fetchone()[0]
+        cursor.execute(*page_query)
+        headers = [desc[0] for desc in cursor.description]
+        rows = [list(row) for row in cursor.fetchall()]
+        ROWS_READ.inc(len(rows), source='mysql')
+        logger.debug("Fetched %d of %d rows from table %s (offset=%s, sort=%s)", len(rows), total, table_name, page_query[1][-1], sort)
+        return headers, rows, total, _next_cursor(headers, rows, limit, sort, has_id)
+    except Error as e:
+        logger.error("Error fetching page from table %s: %s", table_name, str(e))
+        raise QueryError(f"Error fetching data: {str(e)}")
+    finally:
+        close_db_connection(connection)
+
+def iter_table_rows(table_name, batch_size=1000):
+    """Stream a table through an unbuffered server-side cursor.
+
+    Yields the column headers first, then one row list at a time, fetching
+    ``batch_size`` rows per round trip so memory stays flat regardless of table
+    size. The pooled connection is held until the generator is exhausted or closed;
+    if it is closed early the connection still has unread rows, so it is discarded.
+    """
+    connection = get_db_connection()
+    if not connection:
+        raise QueryError("Failed to connect to database")
+    exhausted = False
+    try:
+        cursor = connection.cursor()  # unbuffered: rows are pulled from the server as we fetch
+        cursor.execute(f"SELECT * FROM {table_name}")
+        yield [desc[0] for desc in cursor.description]
+        streamed = 0
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            streamed += len(batch)
+            ROWS_READ.inc(len(batch), source='mysql')
+            for row in batch:
+                yield list(row)
+        logger.debug("Streamed %d rows from table %s", streamed, table_name)
+        exhausted = True
+    except Error as e:
+        logger.error("Error streaming table %s: %s", table_name, str(e))
+        raise QueryError(f"Error streaming data: {str(e)}")
+    finally:
+        if exhausted:
+            close_db_connection(connection)
+        else:
+            discard_db_connection(connection)
+
+def _written_row(headers, row_id, data):
+    """The row an INSERT/UPDATE of ``data`` (columns without ``id``) wrote, for the change feed."""
+    values = iter(data)
+    return [row_id if header == 'id' else next(values) for header in headers]
+
+def _fetch_row(cursor, table_name, row_id):
+    """The row as written, for the change feed (fetched in the writing transaction)."""
+    cursor.execute(f"SELECT * FROM {table_name} WHERE id = %s", (row_id,))
+    rows = cursor.fetchall()
+    return list(rows[0]) if rows else None
+
+def _fetch_rows(cursor, table_name, row_ids):
+    if not row_ids:
+        return {}
+    cursor.execute(f"SELECT * FROM {table_name} WHERE id IN ({', '.join(['%s'] * len(row_ids))})", list(row_ids))
+    return {str(row[0]): list(row) for row in cursor.fetchall()}
+
+def _batch_row_ids(operations):
+    # Rows an add-free batch edited, to report them in the change feed
+    if any(operation['action'] == 'add_entry' for operation in operations):
+        return []
+    return list(dict.fromkeys(operation['row_id'] for operation in operations if operation['action'] == 'edit_entry'))
+
+def _batch_outcome(results, counts):
+    """Fill in per-operation results from each statement's row count (None for adds); returns the batch message."""
+    missing = 0
+    for result, count in zip(results, counts):
+        if count == 0:
+            result['success'], result['message'] = False, "Not found"
+            missing += 1
+        else:
+            result['message'] = "Applied"
+    return f"Applied {len(results) - missing} operations" + (f", {missing} not found" if missing else "")
+
+def _batch_changes(operations, rows, counts):
+    """``(op, row_id, row)`` per row a batch touched; inserted ids are unknown after executemany, so adds reset."""
+    if any(operation['action'] == 'add_entry' for operation in operations):
+        return [(RESET, None, None)]
+    changed = {}
+    for operation, count in zip(operations, counts):
+        if count == 0:
+            continue
+        row = rows.get(str(operation['row_id'])) if operation['action'] == 'edit_entry' else None
+        changed.pop(str(operation['row_id']), None)
+        changed[str(operation['row_id'])] = (UPSERT if row else DELETE, operation['row_id'], row)
+    return list(changed.values())
+
+@instrument(DB_CALL_SECONDS, operation='add_table_entry')
 def add_table_entry(table_name, data):
+    # Column names (excluding 'id' since it's AUTO_INCREMENT) come from the schema cache
+    columns = get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table"
+    if len(columns) != len(data):
+        return False, "Data length does not match number of columns"
+
     connection = get_db_connection()
     if not connection:
         return False, "Failed to connect to database"
     try:
-        cursor = connection.cursor()
-        # Get column names (excluding 'id' since it's AUTO_INCREMENT)
-        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-        columns = [col[0] for col in cursor.fetchall() if col[0] != 'id']
-        if len(columns) != len(data):
-            return False, "Data length does not match number of columns"
-        
         placeholders = ', '.join(['%s'] * len(columns))
         columns_str = ', '.join(columns)
         query = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
+        cursor = connection.cursor()
         cursor.execute(query, data)
-        connection.commit()
+        row_id = cursor.lastrowid
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            record_change(table_key(table_name), INSERT, row_id, _written_row(get_column_names(table_name), row_id, data))
+        ROWS_WRITTEN.inc(source='mysql')
         logger.debug("Added entry to table %s: %s", table_name, data)
         return True, "Entry added successfully"
     except Error as e:
         logger.error("Error adding entry to table %s: %s", table_name, str(e))
+        invalidate_schema(table_name)
         return False, f"Error adding entry: {str(e)}"
     finally:
         close_db_connection(connection)
 
+@instrument(DB_CALL_SECONDS, operation='update_table_entry')
 def update_table_entry(table_name, row_id, data):
+    # Column names (excluding 'id') come from the schema cache
+    columns = get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table"
+    if len(columns) != len(data):
+        return False, "Data length does not match number of columns"
+
     connection = get_db_connection()
     if not connection:
         return False, "Failed to connect to database"
     try:
-        cursor = connection.cursor()
-        # Get column names (excluding 'id')
-        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-        columns = [col[0] for col in cursor.fetchall() if col[0] != 'id']
-        if len(columns) != len(data):
-            return False, "Data length does not match number of columns"
-        
         set_clause = ', '.join([f"{col} = %s" for col in columns])
         query = f"UPDATE {table_name} SET {set_clause} WHERE id = %s"
+        cursor = connection.cursor()
         cursor.execute(query, data + [row_id])
-        connection.commit()
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            if cursor.rowcount:  # 0: no such row (or nothing changed), nothing to report
+                record_change(table_key(table_name), UPSERT, row_id, _written_row(get_column_names(table_name), row_id, data))
+        ROWS_WRITTEN.inc(source='mysql')
         logger.debug("Updated entry in table %s, id %s: %s", table_name, row_id, data)
         return True, "Entry updated successfully"
     except Error as e:
         logger.error("Error updating entry in table %s: %s", table_name, str(e))
+        invalidate_schema(table_name)
         return False, f"Error updating entry: {str(e)}"
     finally:
         close_db_connection(connection)
 
+@instrument(DB_CALL_SECONDS, operation='delete_table_entry')
 def delete_table_entry(table_name, row_id):
     connection = get_db_connection()
     if not connection:
@@ -128,7 +598,10 @@ def delete_table_entry(table_name, row_id):
         cursor = connection.cursor()
         query = f"DELETE FROM {table_name} WHERE id = %s"
         cursor.execute(query, (row_id,))
-        connection.commit()
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            record_change(table_key(table_name), DELETE, row_id)
+        ROWS_WRITTEN.inc(source='mysql')
         logger.debug("Deleted entry from table %s, id %s", table_name, row_id)
         return True, "Entry deleted successfully"
     except Error as e:
@@ -137,6 +610,7 @@ def delete_table_entry(table_name, row_id):
     finally:
         close_db_connection(connection)
 
+@instrument(DB_CALL_SECONDS, operation='delete_all_entries')
 def delete_all_entries(table_name):
     connection = get_db_connection()
     if not connection:
@@ -145,11 +619,218 @@ def delete_all_entries(table_name):
         cursor = connection.cursor()
         query = f"DELETE FROM {table_name}"
         cursor.execute(query)
-        connection.commit()
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            record_change(table_key(table_name), RESET)
         logger.debug("Deleted all entries from table %s", table_name)
         return True, f"All entries in table '{table_name}' deleted successfully"
     except Error as e:
         logger.error("Error deleting all entries from table %s: %s", table_name, str(e))
         return False, f"Error deleting all entries: {str(e)}"
     finally:
-        close_db_connection(connection)
\ No newline at end of file
+        close_db_connection(connection)
+
+BATCH_ACTIONS = ('add_entry', 'edit_entry', 'delete_entry')
+
+def _plan_batch(table_name, columns, operations):
+    """Validate ``apply_batch`` operations and group them into statements (shared with async_db).
+
+    Returns ``(results, queries, groups)``; ``groups`` is only meaningful when every result succeeded.
+    """
+    results = []
+    for index, operation in enumerate(operations):
+        action = operation.get('action')
+        error = None
+        if action not in BATCH_ACTIONS:
+            error = f"Invalid action: {action}"
+        elif action != 'add_entry' and not operation.get('row_id'):
+            error = "Row ID is required"
+        elif action != 'delete_entry' and len(operation.get('data') or []) != len(columns):
+            error = "Data length does not match number of columns"
+        results.append({'index': index, 'action': action, 'success': error is None, 'message': error or "Pending"})
+    if not all(result['success'] for result in results):
+        return results, {}, []
+
+    columns_str = ', '.join(columns)
+    queries = {
+        'add_entry': f"INSERT INTO {table_name} ({columns_str}) VALUES ({', '.join(['%s'] * len(columns))})",
+        'edit_entry': f"UPDATE {table_name} SET {', '.join(f'{col} = %s' for col in columns)} WHERE id = %s",
+        'delete_entry': f"DELETE FROM {table_name} WHERE id = %s",
+    }
+    # Group consecutive operations of the same kind so ordering between kinds is preserved
+    groups = []
+    for operation in operations:
+        action = operation['action']
+        if action == 'add_entry':
+            params = list(operation['data'])
+        elif action == 'edit_entry':
+            params = list(operation['data']) + [operation['row_id']]
+        else:
+            params = [operation['row_id']]
+        if groups and groups[-1][0] == action:
+            groups[-1][1].append(params)
+        else:
+            groups.append((action, [params]))
+    return results, queries, groups
+
+@instrument(DB_CALL_SECONDS, operation='apply_batch')
+def apply_batch(table_name, operations):
+    """Apply mixed add/edit/delete operations to a table in a single transaction.
+
+    Each operation is ``{'action': 'add_entry' | 'edit_entry' | 'delete_entry',
+    'row_id': ..., 'data': [...]}`` with ``data`` ordered like the table's columns
+    (excluding ``id``). Runs of adds are sent with ``executemany``; edits and
+    deletes run one by one so an id that matches no row is reported "Not found".
+    Returns ``(success, message, results)`` with one result dict per operation;
+    either every operation is committed or none is.
+    """
+    columns = get_column_names(table_name, include_id=False)
+    if not columns:
+        return False, "No valid columns found in the table", []
+
+    results, queries, groups = _plan_batch(table_name, columns, operations)
+    if not all(result['success'] for result in results):
+        return False, "Batch rejected: fix the invalid operations and resubmit", results
+
+    connection = get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database", results
+    try:
+        cursor = connection.cursor()
+        counts = []  # rows matched per operation, None for adds
+        for action, params in groups:
+            if action == 'add_entry':
+                cursor.executemany(queries[action], params)
+                counts.extend([None] * len(params))
+                continue
+            for statement_params in params:
+                cursor.execute(queries[action], statement_params)
+                counts.append(cursor.rowcount)
+        changed = _batch_changes(operations, _fetch_rows(cursor, table_name, _batch_row_ids(operations)), counts)
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            for op, row_id, row in changed:
+                record_change(table_key(table_name), op, row_id, row)
+        message = _batch_outcome(results, counts)
+        ROWS_WRITTEN.inc(sum(1 for count in counts if count != 0), source='mysql')
+        logger.debug("Applied batch of %d operations to table %s: %s", len(operations), table_name, message)
+        return True, message, results
+    except Error as e:
+        connection.rollback()
+        logger.error("Error applying batch to table %s: %s", table_name, str(e))
+        invalidate_schema(table_name)
+        for result in results:
+            result['success'] = False
+            result['message'] = "Rolled back"
+        return False, f"Error applying batch: {str(e)}", results
+    finally:
+        close_db_connection(connection)
+
+@instrument(DB_CALL_SECONDS, operation='insert_rows')
+def insert_rows(table_name, columns, rows):
+    """Insert ``rows`` (lists ordered like ``columns``) with one executemany and one commit."""
+    known = get_column_names(table_name)
+    unknown = [column for column in columns if column not in known]
+    if unknown:
+        return False, f"Unknown columns: {', '.join(unknown)}"
+    connection = get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database"
+    try:
+        cursor = connection.cursor()
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        cursor.executemany(query, rows)
+        with commit_lock(table_key(table_name)):
+            connection.commit()
+            record_change(table_key(table_name), RESET)
+        ROWS_WRITTEN.inc(len(rows), source='mysql')
+        logger.debug("Inserted %d rows into table %s", len(rows), table_name)
+        return True, f"Inserted {len(rows)} rows"
+    except Error as e:
+        connection.rollback()
+        logger.error("Error inserting rows into table %s: %s", table_name, str(e))
+        return False, f"Error inserting rows: {str(e)}"
+    finally:
+        close_db_connection(connection)
+
+NUMERIC_TYPES = ('int', 'decimal', 'numeric', 'float', 'double')
+
+@instrument(DB_CALL_SECONDS, operation='adjust_stock')
+def adjust_stock(table_name, row_id, column, delta):
+    """Atomically add ``delta`` to a numeric column, refusing to go below zero.
+
+    The check and the update happen in one conditional UPDATE, so concurrent
+    sales against the same row cannot oversell regardless of how many workers
+    run. Returns ``(success, message)``.
+    """
+    column_types = dict(get_table_columns(table_name))
+    if column not in column_types:
+        return False, f"Unknown column: {column}"
+    if not any(numeric in str(column_types[column]).lower() for numeric in NUMERIC_TYPES):
+        return False, f"Column {column} is not numeric"
+    connection = get_db_connection()
+    if not connection:
+        return False, "Failed to connect to database"
+    try:
+        cursor = connection.cursor()
+        quoted = _quote(column)
+        cursor.execute(f"UPDATE {table_name} SET {quoted} = {quoted} + %s WHERE id = %s AND {quoted} + %s >= 0",
+                       (delta, row_id, delta))
+        if cursor.rowcount == 1:
+            row = _fetch_row(cursor, table_name, row_id)  # the new stock is computed by the database
+            with commit_lock(table_key(table_name)):
+                connection.commit()
+                record_change(table_key(table_name), UPSERT, row_id, row)
+            ROWS_WRITTEN.inc(source='mysql')
+            logger.debug("Adjusted %s of row %s in table %s by %s", column, row_id, table_name, delta)
+            return True, "Stock updated successfully"
+        cursor.execute(f"SELECT {quoted} FROM {table_name} WHERE id = %s", (row_id,))
+        found = cursor.fetchone()
+        connection.rollback()
+        return False, "Insufficient stock" if found else "Item not found"
+    except Error as e:
+        connection.rollback()
+        logger.error("Error adjusting stock in table %s: %s", table_name, str(e))
+        return False, f"Error adjusting stock: {str(e)}"
+    finally:
+        close_db_connection(connection)
+
+@instrument(DB_CALL_SECONDS, operation='get_stock_summary')
+def get_stock_summary(table_name, stock_column, price_column=None):
+    """Aggregate a table in SQL: returns ``(items, units, value)``, ``value`` being None without a price column."""
+    connection = get_db_connection()
+    if not connection:
+        raise QueryError("Failed to connect to database")
+    try:
+        cursor = connection.cursor()
+        stock = _quote(stock_column)
+        value_sql = f"COALESCE(SUM({stock} * {_quote(price_column)}), 0)" if price_column else "NULL"
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM({stock}), 0), {value_sql} FROM {table_name}")
+        items, units, value = cursor.fetchone()
+        return int(items), int(units), float(value) if value is not None else None
+    except Error as e:
+        logger.error("Error summarizing table %s: %s", table_name, str(e))
+        raise QueryError(f"Error summarizing data: {str(e)}")
+    finally:
+        close_db_connection(connection)
+
+@instrument(DB_CALL_SECONDS, operation='get_low_stock')
+def get_low_stock(table_name, stock_column, threshold, limit=100, name_column=None):
+    """Rows whose stock is below ``threshold``, lowest first, as ``[(id, name, stock), ...]``."""
+    connection = get_db_connection()
+    if not connection:
+        raise QueryError("Failed to connect to database")
+    try:
+        cursor = connection.cursor()
+        stock = _quote(stock_column)
+        name_sql = _quote(name_column) if name_column else "''"
+        cursor.execute(f"SELECT `id`, {name_sql}, {stock} FROM {table_name} WHERE {stock} < %s ORDER BY {stock} ASC, `id` ASC LIMIT %s",
+                       (threshold, limit))
+        rows = cursor.fetchall()
+        ROWS_READ.inc(len(rows), source='mysql')
+        return [tuple(row) for row in rows]
+    except Error as e:
+        logger.error("Error fetching low stock from table %s: %s", table_name, str(e))
+        raise QueryError(f"Error fetching low stock: {str(e)}")
+    finally:
+        close_db_connection(connection)
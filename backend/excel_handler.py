@@ -1,20 +1,193 @@
+import concurrent.futures
+import hashlib
 import openpyxl
 import os
+import pickle
 import logging
+import time
+import zipfile
+from xml.etree import ElementTree
+from compact import compact_sheets
+from logging_config import summarize
+from metrics import EXCEL_LOAD_SECONDS, ROWS_READ, timed
 
 logger = logging.getLogger(__name__)
 
 # File to read the inventory data
 EXCEL_FILE = os.path.join(os.path.dirname(__file__), '../data/inventory_data.xlsx')
 
-def load_excel_data():
+# Parsed grids are cached here, keyed by workbook path, mtime and size
+CACHE_DIR = os.environ.get('INVENTORY_EXCEL_CACHE_DIR', os.path.join(os.path.dirname(__file__), '../data/.cache'))
+CACHE_FORMAT = 1  # bump when the parsed representation changes
+
+# Opt-in parallel parsing: number of worker processes (0/1 = serial) and the
+# smallest workbook worth the process start-up cost
+PARALLEL_WORKERS = int(os.environ.get('INVENTORY_EXCEL_WORKERS', 0))
+PARALLEL_MIN_BYTES = int(os.environ.get('INVENTORY_EXCEL_PARALLEL_MIN_BYTES', 2 * 1024 * 1024))
+
+# Opt-in column-oriented sheets (see compact.py): less memory per worker, slower cell access
+COMPACT_SHEETS = os.environ.get('INVENTORY_COMPACT_SHEETS', '').lower() in ('1', 'true', 'yes')
+
+# Custom document property holding the last journal entry already written into the workbook
+JOURNAL_SEQ_PROPERTY = 'inventory_journal_seq'
+
+def read_journal_seq(excel_file):
+    """Return the ``JOURNAL_SEQ_PROPERTY`` stamped by the write-behind persister, or 0."""
+    try:
+        with zipfile.ZipFile(excel_file) as archive:
+            if 'docProps/custom.xml' not in archive.namelist():
+                return 0
+            properties = ElementTree.fromstring(archive.read('docProps/custom.xml'))
+        for prop in properties:
+            if prop.get('name') == JOURNAL_SEQ_PROPERTY and len(prop):
+                return int(prop[0].text)
+    except (OSError, ValueError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        logger.warning("Could not read journal position from %s: %s", excel_file, str(e))
+    return 0
+
+def load_excel_data(excel_file=EXCEL_FILE, use_cache=True, workers=None, compact=None):
+    """Load every sheet as ``{sheet_name: grid}`` using a single streaming pass.
+
+    Grids are identical to ``load_excel_data_legacy``: rows padded to the sheet
+    width, ``''`` for empty cells and fully empty rows dropped. When ``use_cache``
+    is set the parsed grids are pickled under ``CACHE_DIR`` so an unchanged
+    workbook is never parsed twice. ``workers`` (default ``PARALLEL_WORKERS``)
+    greater than 1 parses sheets across a process pool. ``compact`` (default
+    ``COMPACT_SHEETS``) returns ``compact.CompactSheet`` grids instead of lists.
+    """
+    try:
+        logger.debug("Loading Excel file from: %s", excel_file)
+        if not os.path.exists(excel_file):
+            logger.error("Excel file not found at: %s", excel_file)
+            return {}
+        compact = COMPACT_SHEETS if compact is None else compact
+        inventory_data = None
+        if use_cache:
+            with timed(EXCEL_LOAD_SECONDS, loader='cache'):
+                inventory_data = _read_cache(excel_file)
+        if inventory_data is None:
+            workers = PARALLEL_WORKERS if workers is None else workers
+            with timed(EXCEL_LOAD_SECONDS, loader='parallel' if workers > 1 else 'streaming'):
+                if workers > 1:
+                    inventory_data = load_excel_data_parallel(excel_file, workers)
+                else:
+                    inventory_data = _load_serial(excel_file)
+            ROWS_READ.inc(sum(len(grid) for grid in inventory_data.values()), source='excel')
+            if use_cache:
+                _write_cache(excel_file, inventory_data)
+        return compact_sheets(inventory_data) if compact else inventory_data
+    except Exception as e:
+        logger.error("Error loading Excel data: %s", str(e))
+        return {}
+
+def _load_serial(excel_file):
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        return {sheet_name: _read_sheet(workbook[sheet_name]) for sheet_name in workbook.sheetnames}
+    finally:
+        workbook.close()
+
+def _load_sheet(excel_file, sheet_name):
+    # Runs in a worker process; each worker opens its own read-only handle
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        return _read_sheet(workbook[sheet_name])
+    finally:
+        workbook.close()
+
+def load_excel_data_parallel(excel_file=EXCEL_FILE, workers=None, min_bytes=None):
+    """Parse sheets across a process pool, merging into the usual ``{sheet_name: grid}``.
+
+    Falls back to the serial loader for single-sheet or small workbooks
+    (below ``min_bytes``, default ``PARALLEL_MIN_BYTES``), where starting
+    processes costs more than it saves.
+    """
+    workers = workers or os.cpu_count() or 1
+    min_bytes = PARALLEL_MIN_BYTES if min_bytes is None else min_bytes
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        sheet_names = list(workbook.sheetnames)
+    finally:
+        workbook.close()
+    if workers <= 1 or len(sheet_names) < 2 or os.path.getsize(excel_file) < min_bytes:
+        logger.debug("Parsing %s serially (%d sheets)", excel_file, len(sheet_names))
+        return _load_serial(excel_file)
+    logger.debug("Parsing %d sheets of %s with %d workers", len(sheet_names), excel_file, workers)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(sheet_names))) as executor:
+        futures = [executor.submit(_load_sheet, excel_file, sheet_name) for sheet_name in sheet_names]
+        return {sheet_name: future.result() for sheet_name, future in zip(sheet_names, futures)}
+
+def _read_sheet(sheet):
+    # sheet.max_column comes from the stored dimensions and may be missing or stale
+    width = max(sheet.max_column or 1, 1)
+    grid = []
+    for values in sheet.iter_rows(values_only=True):
+        last = len(values)
+        while last and values[last - 1] is None:
+            last -= 1
+        if not last:
+            continue
+        width = max(width, last)
+        grid.append(['' if value is None else value for value in values[:last]])
+    for row in grid:
+        row.extend([''] * (width - len(row)))
+    return [row for row in grid if any(cell != '' for cell in row)]
+
+def iter_sheet_rows(excel_file, sheet_name):
+    """Stream the non-empty rows of one sheet (``''`` for empty cells) without building the grid."""
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        for values in workbook[sheet_name].iter_rows(values_only=True):
+            row = ['' if value is None else value for value in values]
+            if any(cell != '' for cell in row):
+                yield row
+    finally:
+        workbook.close()
+
+def _cache_path(excel_file):
+    key = hashlib.sha1(os.path.abspath(excel_file).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.pickle")
+
+def _cache_key(excel_file):
+    stat = os.stat(excel_file)
+    return (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size)
+
+def _read_cache(excel_file):
+    path = _cache_path(excel_file)
     try:
-        logger.debug("Loading Excel file from: %s", EXCEL_FILE)
-        if not os.path.exists(EXCEL_FILE):
-            logger.error("Excel file not found at: %s", EXCEL_FILE)
+        with open(path, 'rb') as handle:
+            key, inventory_data = pickle.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable Excel cache %s: %s", path, str(e))
+        return None
+    if key != _cache_key(excel_file):
+        logger.debug("Excel cache for %s is stale", excel_file)
+        return None
+    logger.debug("Loaded parsed workbook %s from cache", excel_file)
+    return inventory_data
+
+def _write_cache(excel_file, inventory_data):
+    path = _cache_path(excel_file)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as handle:
+            pickle.dump((_cache_key(excel_file), inventory_data), handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("Could not write Excel cache %s: %s", path, str(e))
+
+def load_excel_data_legacy(excel_file=EXCEL_FILE):
+    """Original random-access loader, kept for comparison with ``load_excel_data``."""
+    try:
+        logger.debug("Loading Excel file from: %s", excel_file)
+        if not os.path.exists(excel_file):
+            logger.error("Excel file not found at: %s", excel_file)
             return {}
         
-        workbook = openpyxl.load_workbook(EXCEL_FILE, data_only=True)
+        workbook = openpyxl.load_workbook(excel_file, data_only=True)
         inventory_data = {}
         
         for sheet_name in workbook.sheetnames:
@@ -59,10 +232,39 @@ def load_excel_data():
                 if any(cell != '' for cell in row_data):
                     grid.append(row_data)
             
-            logger.debug("Grid for sheet %s: %s", sheet_name, grid)
+            logger.debug("Grid for sheet %s: %s", sheet_name, summarize(grid))
             inventory_data[sheet_name] = grid
         
         return inventory_data
     except Exception as e:
         logger.error("Error loading Excel data: %s", str(e))
-        return {}
\ No newline at end of file
+        return {}
+
+def benchmark_loaders(paths=None, repeat=3):
+    """Time the legacy, streaming and cached loaders; returns ``{path: {loader: best_seconds}}``."""
+    data_dir = os.path.dirname(EXCEL_FILE)
+    paths = paths or sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.endswith('.xlsx'))
+    loaders = {
+        'legacy': load_excel_data_legacy,
+        'streaming': lambda path: load_excel_data(path, use_cache=False),
+        'parallel': lambda path: load_excel_data_parallel(path, min_bytes=0),
+        'cached': lambda path: load_excel_data(path, use_cache=True),
+    }
+    results = {}
+    for path in paths:
+        load_excel_data(path, use_cache=True)  # prime the cache
+        results[path] = {}
+        for name, loader in loaders.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                loader(path)
+                timings.append(time.perf_counter() - start)
+            results[path][name] = min(timings)
+        if load_excel_data_legacy(path) != load_excel_data(path, use_cache=False):
+            logger.error("Streaming loader output differs from legacy loader for %s", path)
+    return results
+
+if __name__ == '__main__':
+    for path, timings in benchmark_loaders().items():
+        print(os.path.basename(path) + ': ' + ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in timings.items()))
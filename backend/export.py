@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+def _dumps(value):
+    # Decimal/date values from MySQL are written as strings
+    return json.dumps(value, default=str)
+
+def unique_keys(headers, width=0):
+    """Object keys for a header row: blank headers become ``column_<n>`` and repeats get ``_<n>``.
+
+    ``n`` is the 1-based column position, so two '2024-25' columns in a sheet
+    export as '2024-25' and '2024-25_7' instead of one overwriting the other.
+    """
+    keys, seen = [], set()
+    for pos in range(1, max(len(headers), width) + 1):
+        header = str(headers[pos - 1]).strip() if pos <= len(headers) and headers[pos - 1] is not None else ''
+        key = header if header and header not in seen else f"{header or 'column'}_{pos}"
+        while key in seen:
+            key += '_'
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+def iter_ndjson(rows):
+    """One JSON object per line, keyed by the header row (the first item of ``rows``) made unique."""
+    rows = iter(rows)
+    headers = list(next(rows, []))
+    keys = unique_keys(headers)
+    for row in rows:
+        if len(row) > len(keys):
+            keys = unique_keys(headers, len(row))
+        yield _dumps(dict(zip(keys, row))) + '\n'
+
+def iter_json_array(rows):
+    """The same ``[headers, row, ...]`` grid as api_inventory, emitted piece by piece."""
+    yield '['
+    for idx, row in enumerate(rows):
+        yield (',\n' if idx else '') + _dumps(row)
+    yield ']\n'
+
+def iter_csv(rows, chunk_rows=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for idx, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if idx % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_rows(rows, export_format):
+    if export_format == 'ndjson':
+        return iter_ndjson(rows)
+    if export_format == 'json':
+        return iter_json_array(rows)
+    if export_format == 'csv':
+        return iter_csv(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,109 @@
+import argparse
+import logging
+import re
+import sys
+import time
+from excel_handler import iter_sheet_rows
+from db import get_column_names, insert_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+def normalize_header(name):
+    return re.sub(r'[^a-z0-9]+', '', str(name).lower())
+
+def map_headers(headers, columns):
+    """Match sheet headers to table columns (ignoring case, spaces and punctuation).
+
+    Returns ``[(column, header_index), ...]`` for every column that has a matching header.
+    """
+    positions = {}
+    for idx, header in enumerate(headers):
+        positions.setdefault(normalize_header(header), idx)
+    return [(column, positions[normalize_header(column)]) for column in columns if normalize_header(column) in positions]
+
+def import_sheet(excel_file, sheet_name, table_name, chunk_size=DEFAULT_CHUNK_SIZE, header_row=0, progress=None):
+    """Stream a sheet into a table in chunked, transactional ``executemany`` batches.
+
+    ``header_row`` counts non-empty rows (0 = first). ``progress`` is called with
+    the running stats after each committed chunk. Returns the final stats dict;
+    chunks committed before a failure stay committed and are reported.
+    """
+    columns = get_column_names(table_name, include_id=False)
+    if not columns:
+        raise ValueError(f"Table {table_name} has no importable columns")
+    rows = iter_sheet_rows(excel_file, sheet_name)
+    try:
+        return _load_rows(rows, excel_file, sheet_name, table_name, columns, chunk_size, header_row, progress)
+    finally:
+        rows.close()
+
+def _load_rows(rows, excel_file, sheet_name, table_name, columns, chunk_size, header_row, progress):
+    headers = None
+    for _ in range(header_row + 1):
+        headers = next(rows, None)
+    if headers is None:
+        raise ValueError(f"Sheet {sheet_name} has no header row")
+    mapping = map_headers(headers, columns)
+    if not mapping:
+        raise ValueError(f"No sheet headers match the columns of {table_name}")
+    target_columns = [column for column, _ in mapping]
+    logger.info("Importing %s/%s into %s with columns %s", excel_file, sheet_name, table_name, target_columns)
+
+    stats = {'table': table_name, 'sheet': sheet_name, 'columns': target_columns, 'rows': 0, 'skipped': 0,
+             'chunks': 0, 'seconds': 0.0, 'rows_per_sec': 0.0, 'success': True, 'message': "Import completed"}
+    start = time.perf_counter()
+
+    def flush(chunk):
+        success, message = insert_rows(table_name, target_columns, chunk)
+        if not success:
+            stats['success'], stats['message'] = False, message
+            return False
+        stats['rows'] += len(chunk)
+        stats['chunks'] += 1
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        if progress:
+            progress(stats)
+        return True
+
+    chunk = []
+    for row in rows:
+        # Blank cells go in as NULL: strict MySQL rejects '' for INT/DECIMAL columns.
+        values = [row[idx] if idx < len(row) and row[idx] != '' else None for _, idx in mapping]
+        if all(value is None for value in values):
+            stats['skipped'] += 1
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            if not flush(chunk):
+                return stats
+            chunk = []
+    if chunk:
+        flush(chunk)
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+    logger.info("Imported %d rows into %s in %.2fs (%.0f rows/sec)", stats['rows'], table_name, stats['seconds'], stats['rows_per_sec'])
+    return stats
+
+def _print_progress(stats):
+    sys.stderr.write(f"\r{stats['table']}: {stats['rows']} rows, {stats['chunks']} chunks, {stats['rows_per_sec']:.0f} rows/sec")
+    sys.stderr.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load an Excel sheet into a stock counter table")
+    parser.add_argument('excel_file')
+    parser.add_argument('--sheet', required=True)
+    parser.add_argument('--table', required=True)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--header-row', type=int, default=0, help="index of the header among non-empty rows")
+    args = parser.parse_args(argv)
+    stats = import_sheet(args.excel_file, args.sheet, args.table, args.chunk_size, args.header_row, progress=_print_progress)
+    sys.stderr.write('\n')
+    print(f"{stats['message']}: {stats['rows']} rows ({stats['skipped']} empty skipped) in {stats['seconds']:.2f}s, "
+          f"{stats['rows_per_sec']:.0f} rows/sec")
+    return 0 if stats['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,17 @@
+import bisect
 import logging
+import threading
+from logging_config import summarize
+from query import QueryError, encode_cursor
 
 logger = logging.getLogger(__name__)
 
+def sanitize_category(category):
+    return category.replace(',', '_').replace(' ', '_')
+
 def get_categories(inventory_data):
     try:
-        categories = [(cat.replace(',', '_').replace(' ', '_'), cat) for cat in inventory_data.keys()]
+        categories = [(sanitize_category(cat), cat) for cat in inventory_data.keys()]
         logger.debug("Categories (sanitized, original): %s", categories)
         return categories
     except Exception as e:
@@ -15,11 +22,11 @@ def get_inventory(inventory_data, sanitized_category):
     try:
         logger.debug("Original inventory keys: %s", list(inventory_data.keys()))
         logger.debug("Looking for sanitized category: %s", sanitized_category)
-        original_category = next((cat for cat in inventory_data.keys() if cat.replace(',', '_').replace(' ', '_') == sanitized_category), None)
+        original_category = next((cat for cat in inventory_data.keys() if sanitize_category(cat) == sanitized_category), None)
         logger.debug("Mapped to original category: %s", original_category)
         if original_category:
             data = inventory_data.get(original_category, [])
-            logger.debug("Data for %s: %s", original_category, data)
+            logger.debug("Data for %s: %s", original_category, summarize(data))
             return data
         logger.warning("Category %s not found in inventory data", sanitized_category)
         return []
@@ -27,6 +34,101 @@ def get_inventory(inventory_data, sanitized_category):
         logger.error("Error in get_inventory: %s", str(e))
         return []
 
+# (category, column) -> (grid, sorted [(key, row_index), ...]); rebuilt when the grid object changes
+_sort_indexes = {}
+_sort_indexes_lock = threading.Lock()
+
+def _sort_key(value):
+    # Numbers before text, blanks last, so mixed Excel columns still sort deterministically
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, '')
+    if value is None or value == '':
+        return (2, 0, '')
+    return (1, 0, str(value).lower())
+
+def _get_sort_index(category, grid, column_idx):
+    key = (category, column_idx)
+    with _sort_indexes_lock:
+        cached = _sort_indexes.get(key)
+        if cached and cached[0] is grid and len(cached[1]) == len(grid) - 1:
+            return cached[1]
+    index = sorted((_sort_key(row[column_idx]), row_idx) for row_idx, row in enumerate(grid[1:], start=1))
+    with _sort_indexes_lock:
+        _sort_indexes[key] = (grid, index)
+    return index
+
+def invalidate_sort_indexes(category=None):
+    with _sort_indexes_lock:
+        for key in [key for key in _sort_indexes if category is None or key[0] == category]:
+            del _sort_indexes[key]
+
+def _matches(value, op, expected):
+    if op == '~':
+        return expected.lower() in str(value).lower()
+    if op in ('=', '!='):
+        equal = str(value) == expected
+        return equal if op == '=' else not equal
+    try:
+        left, right = float(value), float(expected)
+    except (TypeError, ValueError):
+        left, right = str(value).lower(), expected.lower()
+    return {'>': left > right, '<': left < right, '>=': left >= right, '<=': left <= right}[op]
+
+def get_inventory_page(inventory_data, sanitized_category, limit=100, offset=0, sort=None, descending=False, filters=None, after=None):
+    """In-memory counterpart of ``db.get_table_page`` for Excel categories.
+
+    Rows are addressed by their position in the grid, which doubles as the keyset
+    tie-breaker. Returns ``(headers, rows, total, next_cursor)``.
+    """
+    grid = get_inventory(inventory_data, sanitized_category)
+    if not grid:
+        raise QueryError(f"Category {sanitized_category} not found")
+    headers = grid[0]
+    column_names = [str(header).strip() for header in headers]
+
+    def column_index(name):
+        name = name.strip()
+        if name not in column_names:
+            raise QueryError(f"Unknown column: {name}")
+        return column_names.index(name)
+
+    resolved_filters = [(column_index(column), op, value) for column, op, value in filters or []]
+    if sort is not None:
+        sort_idx = column_index(sort)
+        ordered = [row_idx for _, row_idx in _get_sort_index(sanitized_category, grid, sort_idx)]
+        if descending:
+            ordered.reverse()
+    else:
+        sort_idx = None
+        ordered = list(range(len(grid) - 1, 0, -1)) if descending else range(1, len(grid))
+
+    if resolved_filters:
+        ordered = [row_idx for row_idx in ordered
+                   if all(_matches(grid[row_idx][idx], op, value) for idx, op, value in resolved_filters)]
+    total = len(ordered)
+
+    start = offset
+    if after is not None:
+        _, last_row_idx = after
+        if sort_idx is None:
+            start = next((pos for pos, row_idx in enumerate(ordered) if (row_idx < last_row_idx if descending else row_idx > last_row_idx)), total)
+        elif not resolved_filters and last_row_idx < len(grid):
+            # Binary search in the sort index instead of scanning for the cursor row
+            index = _get_sort_index(sanitized_category, grid, sort_idx)
+            pos = bisect.bisect_left(index, (_sort_key(grid[last_row_idx][sort_idx]), last_row_idx))
+            start = len(index) - pos if descending else pos + 1
+        else:
+            start = next((pos + 1 for pos, row_idx in enumerate(ordered) if row_idx == last_row_idx), total)
+
+    page_indexes = list(ordered[start:start + limit])
+    rows = [grid[row_idx] for row_idx in page_indexes]
+    next_cursor = None
+    if len(rows) == limit and start + limit < total:
+        last_idx = page_indexes[-1]
+        next_cursor = encode_cursor(grid[last_idx][sort_idx] if sort_idx is not None else None, last_idx)
+    logger.debug("Paged %d of %d rows from category %s (offset=%s, sort=%s)", len(rows), total, sanitized_category, start, sort)
+    return headers, rows, total, next_cursor
+
 def update_inventory(inventory_data, sanitized_category, item_id, new_stock, headers):
     logger.warning("update_inventory is deprecated; inventory is updated directly in Excel file")
     return True
\ No newline at end of file
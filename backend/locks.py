@@ -0,0 +1,37 @@
+import threading
+import zlib
+
+class StripedLock:
+    """A fixed set of locks shared by many keys.
+
+    Each key hashes to one stripe, so mutations of different items rarely
+    contend while mutations of the same item are serialized. ``all()`` takes
+    every stripe (in order, so it cannot deadlock with single-stripe holders)
+    for operations such as swapping in freshly loaded data.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock_for(self, *key):
+        # crc32 rather than hash() so the stripe for a key is stable across processes
+        return self._locks[zlib.crc32(repr(key).encode('utf-8')) % len(self._locks)]
+
+    def all(self):
+        return _AllStripes(self._locks)
+
+class _AllStripes:
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self):
+        for lock in self._locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self._locks):
+            lock.release()
+
+# Shared by process_sale, process_restock and InventoryStore
+stock_locks = StripedLock()
@@ -0,0 +1,67 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_LEVEL = os.environ.get('INVENTORY_LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE = os.environ.get('INVENTORY_LOG_QUEUE', '').lower() in ('1', 'true', 'yes')
+LOG_FORMAT = os.environ.get('INVENTORY_LOG_FORMAT', '%(asctime)s %(levelname)s %(name)s: %(message)s')
+SUMMARY_ITEMS = int(os.environ.get('INVENTORY_LOG_SUMMARY_ITEMS', 3))
+SUMMARY_CHARS = int(os.environ.get('INVENTORY_LOG_SUMMARY_CHARS', 200))
+
+_listener = None
+
+def configure_logging(level=None, use_queue=None):
+    """Configure the root logger from the environment; safe to call more than once.
+
+    With ``use_queue`` (``INVENTORY_LOG_QUEUE=1``) request threads only enqueue
+    records and a QueueListener thread does the formatting and I/O.
+    """
+    global _listener
+    level = level or LOG_LEVEL
+    use_queue = LOG_QUEUE if use_queue is None else use_queue
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return root
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    if use_queue:
+        records = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # drain queued records on shutdown
+    else:
+        root.addHandler(handler)
+        _listener = False  # configured, nothing to stop
+    return root
+
+class summarize:
+    """Lazy, size-capped description of a dataset for log messages.
+
+    Pass it as a logging argument (``logger.debug("Data: %s", summarize(grid))``):
+    nothing is formatted unless the record is actually emitted, and then only
+    the shape plus the first few items are shown instead of the whole dataset.
+    """
+
+    def __init__(self, data, max_items=None, max_chars=None):
+        self.data = data
+        self.max_items = SUMMARY_ITEMS if max_items is None else max_items
+        self.max_chars = SUMMARY_CHARS if max_chars is None else max_chars
+
+    def __str__(self):
+        data = self.data
+        if isinstance(data, dict):
+            text = f"<{len(data)} keys: {', '.join(map(str, list(data)[:self.max_items]))}{', ...' if len(data) > self.max_items else ''}>"
+        elif isinstance(data, (list, tuple)):
+            width = f" x {len(data[0])} cols" if data and isinstance(data[0], (list, tuple)) else ''
+            head = ', '.join(repr(item) for item in data[:self.max_items])
+            text = f"<{len(data)} rows{width}: {head}{', ...' if len(data) > self.max_items else ''}>"
+        else:
+            text = repr(data)
+        return text if len(text) <= self.max_chars else text[:self.max_chars - 4] + '...>'
@@ -0,0 +1,132 @@
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second workbook parses
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labels))
+        return series[-2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, series):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]:.6f}")
+        return lines
+
+@contextlib.contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def instrument(histogram, **labels):
+    """Decorator recording every call's duration in ``histogram``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+def instrument_async(histogram, **labels):
+    """``instrument`` for coroutine functions: times until the awaited call completes."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+def render_prometheus(extra_gauges=()):
+    """Prometheus text exposition of every registered metric plus ``(name, help, value)`` gauges."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, help_text, value in extra_gauges:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return '\n'.join(lines) + '\n'
+
+REQUEST_SECONDS = Histogram('inventory_http_request_duration_seconds', 'Time spent handling HTTP requests.', labels=('endpoint', 'method', 'status'))
+DB_CALL_SECONDS = Histogram('inventory_db_call_duration_seconds', 'Time spent in db.py helpers, including connection checkout.', labels=('operation',))
+DB_CONNECT_SECONDS = Histogram('inventory_db_connection_acquire_seconds', 'Time spent checking a connection out of the pool.')
+EXCEL_LOAD_SECONDS = Histogram('inventory_excel_load_duration_seconds', 'Time spent loading workbooks.', labels=('loader',))
+WRITE_BEHIND_SECONDS = Histogram('inventory_write_behind_flush_seconds', 'Time spent writing journaled stock changes back to the workbook.')
+TEMPLATE_RENDER_SECONDS = Histogram('inventory_template_render_duration_seconds', 'Time spent rendering Jinja templates.', labels=('template',))
+ROWS_READ = Counter('inventory_rows_read_total', 'Rows read from MySQL tables or Excel sheets.', labels=('source',))
+ROWS_WRITTEN = Counter('inventory_rows_written_total', 'Rows written to MySQL tables or stock changes applied in memory.', labels=('source',))
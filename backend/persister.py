@@ -0,0 +1,252 @@
+import atexit
+import collections
+import logging
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from xml.etree import ElementTree
+import openpyxl
+from openpyxl.utils import column_index_from_string, get_column_letter
+from excel_handler import JOURNAL_SEQ_PROPERTY
+from metrics import WRITE_BEHIND_SECONDS, timed
+from store import file_signature, parse_stock, resolve_columns
+
+logger = logging.getLogger(__name__)
+
+# Seconds between write-behind flushes of sales/restocks into the workbook; 0 keeps them in the journal only
+FLUSH_INTERVAL = float(os.environ.get('INVENTORY_WRITE_BEHIND_INTERVAL', 0))
+
+SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# The journal stamp lives in the workbook's custom document properties
+CUSTOM_PROPS_PART = 'docProps/custom.xml'
+CUSTOM_PROPS_EMPTY = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                      b'<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/custom-properties" '
+                      b'xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes"></Properties>')
+CUSTOM_PROPS_OVERRIDE = (b'<Override PartName="/docProps/custom.xml" '
+                         b'ContentType="application/vnd.openxmlformats-officedocument.custom-properties+xml"/>')
+CUSTOM_PROPS_RELATIONSHIP = (b'<Relationship Id="rIdInventoryJournal" Target="docProps/custom.xml" '
+                             b'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/custom-properties"/>')
+
+def coalesce(entries):
+    """Sum journal deltas per ``(category, item_id)``, dropping items that net to zero."""
+    deltas = collections.defaultdict(int)
+    for entry in entries:
+        deltas[(entry['category'], entry['item_id'])] += entry['delta']
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def apply_stock_deltas(excel_file, deltas, journal_seq, output_file):
+    """Save a copy of ``excel_file`` with ``{(sheet, item_id): delta}`` applied to ``output_file``.
+
+    Rows and columns are located like ``InventoryStore`` does (first non-empty
+    row as headers, first row whose S.No. matches), and the copy is stamped
+    with ``journal_seq``. Only the changed stock cells, the stamp and the
+    workbook's recalculation flag are rewritten; every other part of the
+    package (formulas and their cached values, charts, images) is copied as
+    is. S.No. formulas are matched by their cached value; stock cells
+    holding a formula are left alone. Returns the
+    ``(sheet, item_id)`` keys that were not updated.
+    """
+    by_sheet = collections.defaultdict(dict)
+    for (sheet_name, item_id), delta in deltas.items():
+        by_sheet[sheet_name][str(item_id)] = delta
+    missing, edits = [], {}
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        for sheet_name, pending in by_sheet.items():
+            if sheet_name in workbook.sheetnames:
+                edits[sheet_name] = _stock_cell_edits(workbook[sheet_name], pending)
+            missing.extend((sheet_name, item_id) for item_id in pending)
+    finally:
+        workbook.close()
+    with zipfile.ZipFile(excel_file) as source:
+        workbook_part = _workbook_part(source)
+        sheet_parts = _sheet_parts(source, workbook_part)
+        patched = {workbook_part: _set_full_calc_on_load(source.read(workbook_part))}
+        for sheet_name, cells in edits.items():
+            if cells:
+                xml = source.read(sheet_parts[sheet_name])
+                for (row, column), (item_id, value) in cells.items():
+                    updated = _set_cell_value(xml, row, column, value)
+                    if updated is None:
+                        logger.warning("Not writing stock for %s item %s: the cell holds a formula or its row is missing", sheet_name, item_id)
+                        missing.append((sheet_name, item_id))
+                    else:
+                        xml = updated
+                patched[sheet_parts[sheet_name]] = xml
+        names = source.namelist()
+        if CUSTOM_PROPS_PART in names:
+            patched[CUSTOM_PROPS_PART] = _set_journal_seq(source.read(CUSTOM_PROPS_PART), journal_seq)
+        else:
+            patched['[Content_Types].xml'] = source.read('[Content_Types].xml').replace(b'</Types>', CUSTOM_PROPS_OVERRIDE + b'</Types>')
+            patched['_rels/.rels'] = source.read('_rels/.rels').replace(b'</Relationships>', CUSTOM_PROPS_RELATIONSHIP + b'</Relationships>')
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                target.writestr(info, patched.get(info.filename) or source.read(info))
+            if CUSTOM_PROPS_PART not in names:
+                target.writestr(CUSTOM_PROPS_PART, _set_journal_seq(CUSTOM_PROPS_EMPTY, journal_seq))
+    return missing
+
+def _stock_cell_edits(sheet, pending):
+    """``{(row, column): (item_id, new_stock)}`` for the items in ``pending`` found in a read-only sheet."""
+    edits = {}
+    rows = enumerate(sheet.iter_rows(min_row=1, min_col=1), start=1)
+    header = next((row for _, row in rows if any(cell.value is not None for cell in row)), ())
+    s_no_idx, stock_idx = resolve_columns(['' if cell.value is None else cell.value for cell in header])
+    if s_no_idx is None or stock_idx is None:
+        return edits
+    for row_number, row in rows:
+        if len(row) <= s_no_idx:
+            continue
+        item_id = '' if row[s_no_idx].value is None else str(row[s_no_idx].value)
+        delta = pending.pop(item_id, None)
+        if delta is not None:
+            stock = row[stock_idx].value if len(row) > stock_idx else None
+            edits[(row_number, stock_idx + 1)] = (item_id, parse_stock(stock) + delta)
+            if not pending:
+                break
+    return edits
+
+def _workbook_part(archive):
+    for rel in ElementTree.fromstring(archive.read('_rels/.rels')):
+        if rel.get('Type', '').endswith('/officeDocument'):
+            return rel.get('Target').lstrip('/')
+    return 'xl/workbook.xml'
+
+def _sheet_parts(archive, workbook_part):
+    """``{sheet_name: zip entry}`` from the workbook and its relationships."""
+    base = posixpath.dirname(workbook_part)
+    rels_part = posixpath.join(base, '_rels', posixpath.basename(workbook_part) + '.rels')
+    targets = {}
+    for rel in ElementTree.fromstring(archive.read(rels_part)):
+        target = rel.get('Target', '')
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+    sheets = ElementTree.fromstring(archive.read(workbook_part)).find(f'{{{SHEET_NS}}}sheets')
+    return {sheet.get('name'): targets.get(sheet.get(f'{{{REL_NS}}}id')) for sheet in sheets}
+
+def _set_cell_value(xml, row, column, value):
+    """Sheet XML with the cell at ``(row, column)`` holding the number ``value``.
+
+    Returns None if the cell holds a formula or its row is absent.
+    """
+    ref = f'{get_column_letter(column)}{row}'.encode()
+    cell = f'<v>{value}</v></c>'.encode()
+    match = re.search(rb'<c\b([^>]*?\br="' + ref + rb'"[^>]*?)(/?)>', xml)
+    if match:
+        end = match.end() if match.group(2) else xml.index(b'</c>', match.end()) + len(b'</c>')
+        if re.search(rb'<f\b', xml[match.end():end]):
+            return None
+        attrs = re.sub(rb'\s+t="[^"]*"', b'', match.group(1))
+        return xml[:match.start()] + b'<c' + attrs + b'>' + cell + xml[end:]
+    match = re.search(rb'<row\b([^>]*?\br="' + str(row).encode() + rb'"[^>]*?)(/?)>', xml)
+    if not match:
+        return None
+    cell = b'<c r="' + ref + b'">' + cell
+    if match.group(2):
+        return xml[:match.start()] + b'<row' + match.group(1) + b'>' + cell + b'</row>' + xml[match.end():]
+    end = xml.index(b'</row>', match.end())
+    insert_at = end
+    for other in re.finditer(rb'<c\b[^>]*?\br="([A-Z]+)\d+"', xml[match.end():end]):
+        if column_index_from_string(other.group(1).decode()) > column:
+            insert_at = match.end() + other.start()
+            break
+    return xml[:insert_at] + cell + xml[insert_at:]
+
+def _set_full_calc_on_load(xml):
+    # Formulas depending on the stock keep their old cached values until Excel recalculates them
+    match = re.search(rb'<calcPr\b[^>]*?/?>', xml)
+    if match:
+        tag = re.sub(rb'\s+fullCalcOnLoad="[^"]*"', b'', match.group(0))
+        tag = tag[:-2] + b' fullCalcOnLoad="1"/>' if tag.endswith(b'/>') else tag[:-1] + b' fullCalcOnLoad="1">'
+        return xml[:match.start()] + tag + xml[match.end():]
+    # calcPr must come before these in the workbook schema
+    match = re.search(rb'<(oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing|'
+                      rb'fileRecoveryPr|webPublishObjects|extLst)\b|</workbook>', xml)
+    return xml[:match.start()] + b'<calcPr fullCalcOnLoad="1"/>' + xml[match.start():]
+
+def _set_journal_seq(xml, journal_seq):
+    """Custom properties XML with ``JOURNAL_SEQ_PROPERTY`` set to ``journal_seq``."""
+    xml = re.sub(rb'<property\b[^>]*\bname="' + JOURNAL_SEQ_PROPERTY.encode() + rb'".*?</property>', b'', xml, flags=re.S)
+    pid = max([int(pid) for pid in re.findall(rb'\bpid="(\d+)"', xml)] + [1]) + 1
+    prop = (f'<property fmtid="{{D5CDD505-2E9C-101B-9397-08002B2CF9AE}}" pid="{pid}" name="{JOURNAL_SEQ_PROPERTY}">'
+            f'<vt:i4 xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes">{journal_seq}</vt:i4></property>').encode()
+    if b'</Properties>' in xml:
+        return xml.replace(b'</Properties>', prop + b'</Properties>')
+    return re.sub(rb'<Properties\b([^>]*?)\s*/>', lambda match: b'<Properties' + match.group(1) + b'>' + prop + b'</Properties>', xml)
+
+class WorkbookPersister:
+    """Write-behind persistence of sales and restocks to the workbook.
+
+    Requests only update memory and append to the store's journal. Every
+    ``interval`` seconds a daemon thread coalesces the pending journal entries
+    per item, writes them into a copy of the workbook and swaps it in with
+    ``InventoryStore.commit_source``, which then truncates the journal. ``stop``
+    (registered with atexit by ``start``) does a final flush on shutdown.
+    """
+
+    def __init__(self, inventory_store, interval=FLUSH_INTERVAL):
+        self.store = inventory_store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_entries = 0
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='workbook-persister', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def pending(self):
+        return len(self.store.journal.entries()) if self.store.journal else 0
+
+    def flush(self):
+        """Write all pending journal entries into the workbook; returns how many were flushed."""
+        journal, source = self.store.journal, self.store.source
+        if journal is None or not source:
+            return 0
+        with self._flush_lock:
+            entries = journal.entries()
+            if not entries:
+                return 0
+            upto_seq = entries[-1]['seq']
+            deltas = coalesce(entries)
+            base_signature = file_signature(source)
+            tmp_path = f"{source}.{os.getpid()}.tmp"
+            try:
+                with timed(WRITE_BEHIND_SECONDS):
+                    missing = apply_stock_deltas(source, deltas, upto_seq, tmp_path)
+                    committed = self.store.commit_source(tmp_path, upto_seq, base_signature)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Error writing stock changes to %s: %s", source, str(e))
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return 0
+            if not committed:
+                logger.warning("Workbook %s changed on disk during a flush; will retry after it is reloaded", source)
+                return 0
+            if missing:
+                logger.warning("%d journaled items were not found in %s: %s", len(missing), source, missing[:10])
+            self.flushes += 1
+            self.flushed_entries += len(entries)
+            self.last_error = None
+            logger.info("Flushed %d stock changes (%d items) to %s", len(entries), len(deltas), source)
+            return len(entries)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return self.flush()
@@ -0,0 +1,79 @@
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Longest operators first so '>=' is not read as '>' at the same position
+FILTER_OPERATORS = ('>=', '<=', '!=', '=', '>', '<', '~')
+
+PAGE_ARGS = ('limit', 'offset', 'page', 'sort', 'order', 'filter', 'cursor')
+
+class QueryError(ValueError):
+    pass
+
+def parse_filter(expression):
+    """Parse ``column<op>value`` (``~`` means case-insensitive contains) into a tuple.
+
+    The expression splits at the first operator, so the value may contain operator characters.
+    """
+    for position in range(1, len(expression)):
+        op = next((op for op in FILTER_OPERATORS if expression.startswith(op, position)), None)
+        if op:
+            column, value = expression[:position].strip(), expression[position + len(op):].strip()
+            if not column:
+                break
+            return column, op, value
+    raise QueryError(f"Invalid filter expression: {expression}")
+
+def encode_cursor(sort_value, row_key):
+    payload = json.dumps([sort_value, row_key], default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        sort_value, row_key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return sort_value, row_key
+    except Exception:
+        raise QueryError("Invalid cursor")
+
+def wants_page(args):
+    return any(name in args for name in PAGE_ARGS)
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """Turn request args into keyword arguments for ``get_table_page``/``get_inventory_page``."""
+    try:
+        limit = int(args.get('limit', default_limit))
+        if 'page' in args:
+            offset = (max(int(args.get('page')), 1) - 1) * limit
+        else:
+            offset = int(args.get('offset', 0))
+    except (TypeError, ValueError):
+        raise QueryError("limit, offset and page must be integers")
+    if limit < 1 or offset < 0:
+        raise QueryError("limit must be positive and offset must not be negative")
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise QueryError("order must be 'asc' or 'desc'")
+    cursor = args.get('cursor')
+    return {
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'offset': offset,
+        'sort': args.get('sort') or None,
+        'descending': order == 'desc',
+        'filters': [parse_filter(expression) for expression in args.getlist('filter') if expression],
+        'after': decode_cursor(cursor) if cursor else None,
+    }
+
+def page_response(headers, rows, total, limit, offset, next_cursor):
+    return {
+        'headers': headers,
+        'rows': rows,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'next_cursor': next_cursor,
+    }
@@ -1,5 +1,5 @@
 import logging
-from excel_handler import load_excel_data
+from locks import stock_locks
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +28,18 @@ def process_sale(inventory_data, sanitized_category, item_id, quantity, headers)
         if len(grid_data) <= 1:
             return False, "No items in this category"
 
-        item_found = False
-        for row in grid_data[1:]:
-            if str(row[s_no_idx]) == str(item_id):
-                current_stock = int(row[stock_idx]) if row[stock_idx] and str(row[stock_idx]).isdigit() else 0
-                if current_stock < quantity:
-                    return False, "Insufficient stock"
-                new_stock = current_stock - quantity
-                row[stock_idx] = new_stock
-                item_found = True
-                break
+        # Hold the item's stripe across the read-modify-write so concurrent requests cannot oversell
+        with stock_locks.lock_for(original_category, str(item_id)):
+            item_found = False
+            for row in grid_data[1:]:
+                if str(row[s_no_idx]) == str(item_id):
+                    current_stock = int(row[stock_idx]) if row[stock_idx] and str(row[stock_idx]).isdigit() else 0
+                    if current_stock < quantity:
+                        return False, "Insufficient stock"
+                    new_stock = current_stock - quantity
+                    row[stock_idx] = new_stock
+                    item_found = True
+                    break
 
         if not item_found:
             return False, "Item not found"
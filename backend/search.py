@@ -0,0 +1,322 @@
+import bisect
+import copy
+import itertools
+import logging
+import re
+import threading
+import time
+from analytics import NAME_HEADERS, find_column, table_columns
+from cache import INVENTORY_KEY, TABLE_VERSION_TTL, get_version, table_key
+from changes import DELETE, changes_since
+from db import iter_table_rows
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 50
+_TOKEN = re.compile(r'[0-9a-z]+')
+
+# Match quality per query token, summed into the result score
+EXACT, PREFIX, INFIX = 3, 2, 1
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+def _trigrams(token):
+    return {token[pos:pos + 3] for pos in range(len(token) - 2)}
+
+def _doc_tokens(doc):
+    item_id, name, _ = doc
+    return tuple(set(tokenize(name)) | set(tokenize(item_id)))
+
+class SearchIndex:
+    """Inverted index over one category's or table's items.
+
+    ``docs`` is a list of ``(item_id, name, payload)``; item names and ids are
+    tokenized into postings (token -> doc numbers). Query tokens match exactly,
+    as a prefix through bisect on the sorted vocabulary, or anywhere inside a
+    token through a trigram index over the vocabulary. Docs are stored shortest
+    name first, so among equally scored matches the lowest doc numbers rank best.
+    ``updated`` applies changed items to a copy: removed docs leave a ``None``
+    hole and new or renamed ones are appended after the sorted docs.
+    """
+
+    def __init__(self, docs):
+        self.docs = sorted(docs, key=lambda doc: len(str(doc[1])))
+        self.sorted_count = len(self.docs)
+        self.removed = 0
+        self.ids = {}
+        self.doc_tokens = []
+        self.postings = {}
+        for doc_no, doc in enumerate(self.docs):
+            tokens = _doc_tokens(doc)
+            self.ids.setdefault(str(doc[0]), doc_no)
+            self.doc_tokens.append(tokens)
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(doc_no)
+        self.vocabulary = sorted(self.postings)
+        self.trigrams = {}
+        for token in self.vocabulary:
+            for trigram in _trigrams(token):
+                self.trigrams.setdefault(trigram, set()).add(token)
+
+    def updated(self, changes):
+        """A copy with ``[(item_id, doc), ...]`` applied (``doc`` None removes the item).
+
+        Searches may still be running on this index, so only the lists and dicts
+        are copied up front and a posting or trigram set is copied the first time
+        it changes.
+        """
+        index = copy.copy(self)
+        index.docs, index.doc_tokens, index.ids = list(self.docs), list(self.doc_tokens), dict(self.ids)
+        index.postings, index.trigrams, index.vocabulary = dict(self.postings), dict(self.trigrams), list(self.vocabulary)
+        index._owned = set()
+        for item_id, doc in changes:
+            index._update(str(item_id), doc)
+        del index._owned
+        return index
+
+    def _own(self, name, key):
+        mapping = getattr(self, name)
+        if (name, key) not in self._owned or key not in mapping:
+            self._owned.add((name, key))
+            mapping[key] = set(mapping.get(key, ()))
+        return mapping[key]
+
+    def _update(self, item_id, doc):
+        tokens = _doc_tokens(doc) if doc is not None else ()
+        doc_no = self.ids.get(item_id)
+        if doc_no is not None:
+            if doc is not None and set(tokens) == set(self.doc_tokens[doc_no]):
+                self.docs[doc_no] = doc  # same name and id, e.g. a stock change
+                return
+            for token in self.doc_tokens[doc_no]:
+                docs = self._own('postings', token)
+                docs.discard(doc_no)
+                if not docs:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    for trigram in _trigrams(token):
+                        tokens_with_trigram = self._own('trigrams', trigram)
+                        tokens_with_trigram.discard(token)
+                        if not tokens_with_trigram:
+                            del self.trigrams[trigram]
+            self.docs[doc_no], self.doc_tokens[doc_no] = None, ()
+            del self.ids[item_id]
+            self.removed += 1
+        if doc is not None:
+            doc_no = len(self.docs)
+            self.docs.append(doc)
+            self.doc_tokens.append(tokens)
+            self.ids[item_id] = doc_no
+            for token in tokens:
+                if token not in self.postings:
+                    bisect.insort(self.vocabulary, token)
+                    for trigram in _trigrams(token):
+                        self._own('trigrams', trigram).add(token)
+                self._own('postings', token).add(doc_no)
+
+    def fragmented(self):
+        """True once holes and appended docs make up more than a quarter of the index."""
+        return self.removed + len(self.docs) - self.sorted_count > max(self.sorted_count // 4, 64)
+
+    def _expand(self, query_token):
+        """Vocabulary tokens matching ``query_token`` as ``{score: [token, ...]}``.
+
+        Prefix matches are one slice of the sorted vocabulary; building a tuple
+        per matching token instead is slow enough to show up in typeahead latency.
+        """
+        start = bisect.bisect_left(self.vocabulary, query_token)
+        end = bisect.bisect_left(self.vocabulary, query_token + '\uffff')
+        exact = start < end and self.vocabulary[start] == query_token
+        matches = {EXACT: [query_token] if exact else [], PREFIX: self.vocabulary[start + exact:end], INFIX: []}
+        if len(query_token) >= 3:
+            candidates = set.intersection(*(self.trigrams.get(trigram, set()) for trigram in _trigrams(query_token)))
+            matches[INFIX] = [token for token in candidates if query_token in token and not token.startswith(query_token)]
+        return matches
+
+    def _tiers(self, query_token, matches, postings_size, candidates):
+        """``{score: {doc_no, ...}}`` for one query token, restricted to ``candidates`` when given."""
+        tiers = {}
+        if candidates is not None and len(candidates) * 4 < postings_size:
+            # Few docs left: check their own tokens instead of walking every matching posting
+            by_score = [(score, set(matches[score])) for score in (EXACT, PREFIX, INFIX) if matches[score]]
+            for doc_no in candidates:
+                tokens = self.doc_tokens[doc_no]
+                for score, matching in by_score:
+                    if not matching.isdisjoint(tokens):
+                        tiers.setdefault(score, set()).add(doc_no)
+                        break
+            return tiers
+        seen = set()
+        for score in (EXACT, PREFIX, INFIX):
+            docs = set().union(*map(self.postings.__getitem__, matches[score])) - seen  # a doc matching several words keeps its best score
+            if candidates is not None:
+                docs &= candidates
+            if docs:
+                tiers[score] = docs
+                seen |= docs
+        return tiers
+
+    def search(self, query_tokens):
+        """``{score: {doc_no, ...}}`` for docs matching every query token.
+
+        The most selective token is resolved first and later tokens only look
+        at the docs that survived, so a common word like "item" costs little
+        once a rarer token has narrowed the candidates.
+        """
+        expanded = []
+        for query_token in query_tokens:
+            matches = self._expand(query_token)
+            postings_size = sum(len(self.postings[token]) for tokens in matches.values() for token in tokens)
+            expanded.append((postings_size, query_token, matches))
+        expanded.sort(key=lambda entry: entry[0])
+        matched = None
+        for postings_size, query_token, matches in expanded:
+            candidates = None if matched is None else set().union(*matched.values())
+            tiers = self._tiers(query_token, matches, postings_size, candidates)
+            if matched is None:
+                matched = tiers
+            else:
+                combined = {}
+                for previous_score, previous_docs in matched.items():
+                    for score, docs in tiers.items():
+                        both = previous_docs & docs
+                        if both:
+                            combined.setdefault(previous_score + score, set()).update(both)
+                matched = combined
+            if not matched:
+                return {}
+        return matched or {}
+
+    def best(self, docs, limit):
+        """The ``limit`` best docs of one score tier: shortest name, then lowest doc number."""
+        if len(docs) * 8 > len(self.docs):
+            # Dense tier: walk doc numbers in order and stop early
+            best = list(itertools.islice((doc_no for doc_no in range(self.sorted_count) if doc_no in docs), limit))
+        else:
+            best = sorted(doc_no for doc_no in docs if doc_no < self.sorted_count)[:limit]
+        appended = [doc_no for doc_no in range(self.sorted_count, len(self.docs)) if doc_no in docs]
+        if appended:
+            best = sorted(best + appended, key=lambda doc_no: (len(str(self.docs[doc_no][1])), doc_no))[:limit]
+        return best
+
+# source key -> (version, SearchIndex); rebuilt lazily when the source's version changes
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _get_index(key, version, build):
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    start = time.perf_counter()
+    index = SearchIndex(build())
+    logger.debug("Indexed %d items of %s in %.1fms", len(index.docs), key, (time.perf_counter() - start) * 1000)
+    with _indexes_lock:
+        _indexes[key] = (version, index)
+    return index
+
+def invalidate_search(key=None):
+    with _indexes_lock:
+        if key is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(key, None)
+
+def _category_docs(inventory_store, sanitized_category):
+    grid = inventory_store.get_inventory(sanitized_category)
+    if not grid:
+        return []
+    s_no_idx, stock_idx = inventory_store.columns(sanitized_category)
+    name_idx = find_column(grid[0], NAME_HEADERS, skip=(s_no_idx, stock_idx))
+    if name_idx is None:
+        return []
+    # Rows are kept by reference so results show the live stock after sales/restocks
+    return [(row[s_no_idx] if s_no_idx is not None else '', row[name_idx], row)
+            for row in grid[1:] if str(row[name_idx]).strip()]
+
+def category_index(inventory_store, sanitized_category):
+    # Sales and restocks only change stock, so the index is rebuilt only when the workbook data is replaced
+    return _get_index(f"excel:{sanitized_category}", (get_version(INVENTORY_KEY), id(inventory_store)),
+                      lambda: _category_docs(inventory_store, sanitized_category))
+
+# table name -> (id_idx, name_idx, stock_idx) of the columns its index was built from
+_table_layouts = {}
+
+def _table_doc(layout, row):
+    id_idx, name_idx, stock_idx = layout
+    if row is None or row[name_idx] is None or not str(row[name_idx]).strip():
+        return None
+    return (row[id_idx] if id_idx is not None else '', row[name_idx], row[stock_idx] if stock_idx is not None else None)
+
+def _table_docs(table_name):
+    stock_column, _, name_column = table_columns(table_name)
+    if not name_column:
+        with _indexes_lock:
+            _table_layouts.pop(table_name, None)
+        return []
+    rows = iter_table_rows(table_name)
+    headers = next(rows)
+    layout = (headers.index('id') if 'id' in headers else None, headers.index(name_column),
+              headers.index(stock_column) if stock_column in headers else None)
+    with _indexes_lock:
+        _table_layouts[table_name] = layout
+    return [doc for doc in (_table_doc(layout, row) for row in rows) if doc is not None]
+
+def table_index(table_name):
+    """Search index of one MySQL table, kept current from its change feed (changes.py).
+
+    Rows written through db.py/async_db.py are applied to the existing index;
+    the table is only re-read when the feed cannot say what changed (a reset or
+    a gap), when the index gets fragmented, or once per ``TABLE_VERSION_TTL``
+    to pick up writes made outside this process.
+    """
+    key = f"table:{table_name}"
+    version, bucket = get_version(table_key(table_name)), int(time.time() // TABLE_VERSION_TTL)
+    with _indexes_lock:
+        cached, layout = _indexes.get(key), _table_layouts.get(table_name)
+    if cached and cached[0] == (version, bucket):
+        return cached[1]
+    if cached and layout and cached[0][1] == bucket:
+        current, changes = changes_since(table_key(table_name), cached[0][0])
+        if changes is not None:
+            index = cached[1].updated([(row_id, None if op == DELETE else _table_doc(layout, row))
+                                       for _, op, row_id, row in changes])
+            if not index.fragmented():
+                with _indexes_lock:
+                    _indexes[key] = ((current, bucket), index)
+                return index
+    return _get_index(key, (version, bucket), lambda: _table_docs(table_name))
+
+def search(inventory_store, tables, query, limit=20):
+    """Rank items from every category and table against ``query``, best first.
+
+    Every query token must match (exactly, as a prefix or inside a word) the
+    item's name or id; exact matches score higher, then shorter names win.
+    """
+    query_tokens = list(dict.fromkeys(tokenize(query)))
+    if not query_tokens:
+        return []
+    sources = []
+    if inventory_store is not None:
+        for sanitized, _ in inventory_store.categories():
+            columns = inventory_store.columns(sanitized)
+            sources.append(('excel', sanitized, category_index(inventory_store, sanitized), columns[1]))
+    for table in tables:
+        sources.append(('table', table, table_index(table), None))
+
+    matches = [(source, category, index, stock_idx, index.search(query_tokens)) for source, category, index, stock_idx in sources]
+    results = []
+    for score in sorted({score for *_, tiers in matches for score in tiers}, reverse=True):
+        hits = []
+        for source, category, index, stock_idx, tiers in matches:
+            for doc_no in index.best(tiers.get(score, ()), limit):
+                item_id, name, payload = index.docs[doc_no]
+                stock = (payload[stock_idx] if stock_idx is not None else None) if source == 'excel' else payload
+                hits.append((len(str(name)), source, category, doc_no, {'source': source, 'category': category, 'item_id': item_id,
+                                                                       'name': name, 'stock': stock, 'score': score}))
+        hits.sort(key=lambda hit: hit[:4])
+        results.extend(hit[4] for hit in hits[:limit - len(results)])
+        if len(results) >= limit:
+            break
+    return results
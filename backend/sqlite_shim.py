@@ -0,0 +1,104 @@
+import re
+import sqlite3
+from mysql.connector import Error
+
+# MySQL-dialect stand-in over sqlite3 for local benchmarks and tests.
+# Pass ``connect`` to ``db.configure_pool(connector=connect, config={'database': path})``
+# and the db.py helpers run unchanged: %s placeholders, backtick quoting,
+# SHOW TABLES and SHOW COLUMNS are translated to their SQLite equivalents.
+
+_SHOW_COLUMNS = re.compile(r'^\s*SHOW\s+COLUMNS\s+FROM\s+`?(\w+)`?\s*$', re.I)
+_SHOW_TABLES = re.compile(r'^\s*SHOW\s+TABLES\s*$', re.I)
+
+def translate(query):
+    if _SHOW_TABLES.match(query):
+        return "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    return query.replace('%s', '?').replace('`', '"')
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.cursor()
+        self._rows = None  # pre-computed result for SHOW COLUMNS
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, query, params=()):
+        self._rows = None
+        try:
+            match = _SHOW_COLUMNS.match(query)
+            if match:
+                info = self._connection.execute(f'PRAGMA table_info("{match.group(1)}")').fetchall()
+                # (Field, Type, Null, Key, Default, Extra) like MySQL
+                self._rows = [(name, col_type.lower() or 'text', 'NO' if notnull else 'YES', 'PRI' if pk else '', default, '')
+                              for _, name, col_type, notnull, default, pk in info]
+                return
+            self._cursor.execute(translate(query), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise Error(msg=str(e))
+
+    def executemany(self, query, seq_of_params):
+        try:
+            self._cursor.executemany(translate(query), [tuple(params) for params in seq_of_params])
+        except sqlite3.Error as e:
+            raise Error(msg=str(e))
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+class SqliteConnection:
+    def __init__(self, database):
+        uri = database.startswith('file:')
+        self._connection = sqlite3.connect(database, uri=uri, check_same_thread=False)
+        self._open = True
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def cursor(self, **options):
+        return SqliteCursor(self._connection)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._open = False
+        self._connection.close()
+
+def connect(database=':memory:', **ignored):
+    """Drop-in for ``mysql.connector.connect``; ``host``/``user``/``password`` are ignored."""
+    return SqliteConnection(database)
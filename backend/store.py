@@ -0,0 +1,385 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from cache import INVENTORY_KEY, bump_version, category_key
+from changes import RESET, UPSERT, record_change
+from excel_handler import EXCEL_FILE, load_excel_data, read_journal_seq
+from inventory import invalidate_sort_indexes, sanitize_category
+from locks import stock_locks
+from metrics import ROWS_WRITTEN
+
+logger = logging.getLogger(__name__)
+
+def resolve_columns(headers):
+    """Find the (S.No., stock) column indexes the same way process_sale/process_restock do."""
+    s_no_idx = None
+    stock_idx = None
+    for col_idx, header in enumerate(headers):
+        header_lower = str(header).lower()
+        if 's.no' in header_lower or 'sno' in header_lower or 'sl. no' in header_lower:
+            s_no_idx = col_idx
+        if 'quantity' in header_lower or 'list' in header_lower or 'stock' in header_lower:
+            stock_idx = col_idx
+    return s_no_idx, stock_idx
+
+def parse_stock(value):
+    return int(value) if value and str(value).isdigit() else 0
+
+JOURNAL_FILE = os.environ.get('INVENTORY_JOURNAL_FILE', os.path.join(os.path.dirname(__file__), '../data/inventory_journal.jsonl'))
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class StockJournal:
+    """Append-only log of stock deltas that are not reflected in the workbook.
+
+    Every sale/restock is appended (and, with a ``path``, written as a JSON line)
+    so the deltas can be replayed after the workbook is re-read or the app restarts.
+    Entries carry the item's stock after the change, which tells a replay whether
+    the workbook still holds the stock the delta was applied to.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.append(entry)
+                        self._seq = max(self._seq, entry['seq'])
+            logger.debug("Loaded %d journal entries from %s", len(self._entries), path)
+
+    def append(self, category, item_id, delta, kind, stock=None):
+        with self._lock:
+            self._seq += 1
+            entry = {'seq': self._seq, 'ts': time.time(), 'category': category, 'item_id': str(item_id), 'delta': delta, 'kind': kind}
+            if stock is not None:
+                entry['stock'] = stock
+            self._entries.append(entry)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as handle:
+                    handle.write(json.dumps(entry) + '\n')
+            return entry
+
+    def entries(self, after_seq=0):
+        with self._lock:
+            return [entry for entry in self._entries if entry['seq'] > after_seq]
+
+    def truncate(self, upto_seq):
+        """Drop entries up to ``upto_seq`` once they are reflected in the workbook."""
+        with self._lock:
+            self._seq = max(self._seq, upto_seq)  # never reuse sequence numbers the workbook has seen
+            self._keep([entry for entry in self._entries if entry['seq'] > upto_seq])
+
+    def discard(self, seqs):
+        """Drop the entries with sequence numbers in ``seqs`` (superseded by an edit of the workbook)."""
+        seqs = set(seqs)
+        with self._lock:
+            self._keep([entry for entry in self._entries if entry['seq'] not in seqs])
+
+    def _keep(self, remaining):
+        if len(remaining) == len(self._entries):
+            return
+        self._entries = remaining
+        if self.path:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as handle:
+                for entry in self._entries:
+                    handle.write(json.dumps(entry) + '\n')
+            os.replace(tmp_path, self.path)
+
+class InventoryStore:
+    """Indexed view over the ``{sheet_name: grid}`` dict from ``load_excel_data``.
+
+    Keeps a sanitized -> original category map, the resolved S.No./stock columns
+    per sheet and a hash index from item id to row, so lookups, sales and
+    restocks no longer scan keys, headers and rows on every call. Rows are shared
+    with ``data``, so changes are visible to code still using the plain dict.
+    Stock changes hold the item's stripe of ``locks.stock_locks`` across the
+    check-and-update, so concurrent sales cannot oversell.
+
+    With a ``journal`` every sale/restock is applied in place and journaled
+    instead of re-reading the workbook; ``refresh_if_changed`` only re-reads
+    ``source`` when its mtime/size and content hash change, replaying the journal
+    on top of the fresh data. An item whose stock was edited in the workbook in
+    the meantime keeps the edited value and its journal entries are dropped.
+    """
+
+    def __init__(self, data, source=None, journal=None):
+        self.data = {}
+        self.source = source
+        self.journal = journal
+        self._signature = None
+        self._digest = None
+        self._reload_lock = threading.Lock()
+        self._categories = {}  # sanitized -> original
+        self._columns = {}  # original -> (s_no_idx, stock_idx)
+        self._items = {}  # original -> {str(item_id): row}
+        self.replace(data)
+
+    @classmethod
+    def from_excel(cls, journal=None, excel_file=EXCEL_FILE):
+        signature = file_signature(excel_file)  # taken first so a write during the load triggers another reload
+        if journal and signature:
+            journal.truncate(read_journal_seq(excel_file))  # entries a write-behind flush already saved
+        store = cls(load_excel_data(excel_file), source=excel_file, journal=journal)
+        store._signature = signature
+        store._digest = file_digest(excel_file) if signature else None
+        return store
+
+    def refresh_if_changed(self):
+        if not self.source:
+            return False
+        signature = file_signature(self.source)
+        if signature is None or signature == self._signature:
+            return False
+        with self._reload_lock:
+            if signature == self._signature:
+                return False
+            digest = file_digest(self.source)
+            if digest == self._digest:
+                self._signature = signature
+                return False
+            logger.info("Workbook %s changed on disk, reloading", self.source)
+            if self.journal:
+                self.journal.truncate(read_journal_seq(self.source))
+            self.replace(load_excel_data(self.source))
+            self._signature, self._digest = signature, digest
+            return True
+
+    def commit_source(self, tmp_path, upto_seq, base_signature):
+        """Swap in ``tmp_path``, a copy of the workbook with journal entries up to ``upto_seq`` applied.
+
+        The copy's signature and digest are adopted so ``refresh_if_changed`` does
+        not reload (and replay) data that is already in memory. Returns False,
+        leaving the workbook alone, if it changed on disk since ``base_signature``.
+        """
+        signature, digest = file_signature(tmp_path), file_digest(tmp_path)  # os.replace keeps mtime and size
+        with self._reload_lock:
+            if file_signature(self.source) != base_signature or base_signature != self._signature:
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, self.source)
+            self._signature, self._digest = signature, digest
+            if self.journal:
+                self.journal.truncate(upto_seq)
+        return True
+
+    def replace(self, data):
+        categories, columns, items = {}, {}, {}
+        for original, grid in data.items():
+            categories[sanitize_category(original)] = original
+            columns[original] = resolve_columns(grid[0]) if grid else (None, None)
+            items[original] = self._index_rows(grid, columns[original][0])
+        with stock_locks.all():
+            # Replay before publishing so readers never see the workbook without journaled deltas
+            if self.journal:
+                entries = self._drop_edited(columns, items, self.journal.entries())
+                for entry in entries:
+                    self._apply_delta(columns, items, entry['category'], entry['item_id'], entry['delta'])
+                logger.debug("Replayed %d journal entries", len(entries))
+            previous = set(self._categories.values())
+            self.data, self._categories, self._columns, self._items = data, categories, columns, items
+            bump_version(INVENTORY_KEY)
+            for original in previous | set(categories.values()):
+                record_change(category_key(original), RESET)  # clients of the change feed refetch
+        logger.debug("Indexed %d categories", len(categories))
+
+    def _drop_edited(self, columns, items, entries):
+        """Journal entries still to replay, discarding those of items edited outside the app.
+
+        The first entry kept for an item expects the workbook to hold the stock
+        it started from (its ``stock`` minus its ``delta``); any other value is an
+        edit made in the workbook after the sale, and it wins over the deltas.
+        """
+        edited = set()
+        seen = set()
+        for entry in entries:
+            key = (entry['category'], entry['item_id'])
+            if key in seen:
+                continue
+            seen.add(key)
+            row = items.get(entry['category'], {}).get(entry['item_id'])
+            stock_idx = columns.get(entry['category'], (None, None))[1]
+            if 'stock' in entry and row is not None and stock_idx is not None \
+                    and parse_stock(row[stock_idx]) != entry['stock'] - entry['delta']:
+                edited.add(key)
+        if not edited:
+            return entries
+        dropped = [entry['seq'] for entry in entries if (entry['category'], entry['item_id']) in edited]
+        logger.info("Dropping %d journal entries for %d items edited in the workbook", len(dropped), len(edited))
+        self.journal.discard(dropped)
+        return [entry for entry in entries if (entry['category'], entry['item_id']) not in edited]
+
+    @staticmethod
+    def _apply_delta(columns, items, original, item_id, delta):
+        row = items.get(original, {}).get(str(item_id))
+        stock_idx = columns.get(original, (None, None))[1]
+        if row is None or stock_idx is None:
+            logger.warning("Skipping journal entry for missing item %s in %s", item_id, original)
+            return
+        row[stock_idx] = parse_stock(row[stock_idx]) + delta
+
+    def _record(self, sanitized_category, item_id, delta, kind, row):
+        original = self._categories[sanitized_category]
+        invalidate_sort_indexes(sanitized_category)
+        record_change(category_key(original), UPSERT, item_id, row)
+        ROWS_WRITTEN.inc(source='excel')
+        if self.journal:
+            stock_idx = self._columns[original][1]
+            self.journal.append(original, item_id, delta, kind, parse_stock(row[stock_idx]))
+
+    @staticmethod
+    def _index_rows(grid, s_no_idx):
+        index = {}
+        if s_no_idx is None:
+            return index
+        for row in grid[1:]:
+            if s_no_idx < len(row):
+                index.setdefault(str(row[s_no_idx]), row)  # first match wins, like the linear scan
+        return index
+
+    def categories(self):
+        return list(self._categories.items())
+
+    def original_category(self, sanitized_category):
+        return self._categories.get(sanitized_category)
+
+    def get_inventory(self, sanitized_category):
+        original = self._categories.get(sanitized_category)
+        if original is None:
+            logger.warning("Category %s not found in inventory data", sanitized_category)
+            return []
+        return self.data.get(original, [])
+
+    def columns(self, sanitized_category):
+        original = self._categories.get(sanitized_category)
+        return self._columns.get(original, (None, None))
+
+    def find_item(self, sanitized_category, item_id):
+        original = self._categories.get(sanitized_category)
+        if original is None:
+            return None
+        return self._items[original].get(str(item_id))
+
+    def _locate(self, sanitized_category, item_id):
+        """Return ``(row, stock_idx, error_message)`` for a stock change."""
+        original = self._categories.get(sanitized_category)
+        if not original:
+            logger.error("Category %s not found", sanitized_category)
+            return None, None, "Category not found"
+        s_no_idx, stock_idx = self._columns[original]
+        if s_no_idx is None or stock_idx is None:
+            logger.error("Required columns (S.No., Stock) not found in headers: %s", self.data[original][:1])
+            return None, None, "Required columns not found"
+        if len(self.data[original]) <= 1:
+            return None, None, "No items in this category"
+        row = self._items[original].get(str(item_id))
+        if row is None:
+            return None, None, "Item not found"
+        return row, stock_idx, None
+
+    def process_sale(self, sanitized_category, item_id, quantity):
+        logger.debug("Processing sale for category %s, item %s, quantity %d", sanitized_category, item_id, quantity)
+        with stock_locks.lock_for(self._categories.get(sanitized_category), str(item_id)):
+            row, stock_idx, error = self._locate(sanitized_category, item_id)
+            if error:
+                return False, error
+            current_stock = parse_stock(row[stock_idx])
+            if current_stock < quantity:
+                return False, "Insufficient stock"
+            row[stock_idx] = current_stock - quantity
+            self._record(sanitized_category, item_id, -quantity, 'sale', row)
+        return True, "Sale recorded successfully (Excel file not modified)"
+
+    def process_restock(self, sanitized_category, item_id, quantity):
+        logger.debug("Processing restock for category %s, item %s, quantity %d", sanitized_category, item_id, quantity)
+        with stock_locks.lock_for(self._categories.get(sanitized_category), str(item_id)):
+            row, stock_idx, error = self._locate(sanitized_category, item_id)
+            if error:
+                return False, error
+            row[stock_idx] = parse_stock(row[stock_idx]) + quantity
+            self._record(sanitized_category, item_id, quantity, 'restock', row)
+        return True, "Restock recorded successfully (Excel file not modified)"
+
+class InventoryLoader:
+    """Builds the inventory store off the request path.
+
+    ``start`` runs ``factory`` on a daemon thread (idempotent); ``wait`` blocks up
+    to ``timeout`` seconds and returns the store, or ``None`` while it is still
+    loading or if loading failed.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._store = None
+        self._error = None
+        self.load_seconds = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='inventory-loader', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self._store = self._factory()
+            self.load_seconds = time.perf_counter() - start
+            logger.info("Inventory loaded: %d categories in %.2fs", len(self._store.data), self.load_seconds)
+        except Exception as e:
+            self._error = e
+            logger.error("Error loading inventory: %s", str(e))
+        finally:
+            self._ready.set()
+
+    def wait(self, timeout=None):
+        self.start()
+        self._ready.wait(timeout)
+        return self._store
+
+    def status(self):
+        if not self._ready.is_set():
+            return 'loading' if self._thread else 'idle'
+        return 'ready' if self._store is not None else 'failed'
+
+if __name__ == '__main__':
+    # Quick comparison against the linear-scan functions: python store.py
+    import copy
+    import timeit
+    from excel_handler import load_excel_data
+    from sales import process_sale
+
+    data = load_excel_data()
+    store = InventoryStore(copy.deepcopy(data))
+    category = sanitize_category(max(data, key=lambda name: len(data[name])))
+    grid = data[store.original_category(category)]
+    s_no_idx, _ = resolve_columns(grid[0])
+    item_id = next((row[s_no_idx] for row in reversed(grid[1:]) if str(row[s_no_idx]).isdigit()), None)
+    runs = 2000
+    linear = timeit.timeit(lambda: process_sale(data, category, item_id, 0, grid[0]), number=runs)
+    indexed = timeit.timeit(lambda: store.process_sale(category, item_id, 0), number=runs)
+    print(f"{category} item {item_id}: linear {linear / runs * 1e6:.1f}us, indexed {indexed / runs * 1e6:.1f}us per sale")
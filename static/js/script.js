@@ -1,19 +1,133 @@
+const PAGE_SIZE = 100;
+const tableState = { offset: 0, limit: PAGE_SIZE, sort: null, order: 'asc', filter: '' };
+// Change-feed position of the rows on screen (from /api/inventory's X-Change-* headers)
+const changeState = { version: null, feed: null, total: 0, headers: [] };
+
+function resetTableState() {
+    tableState.offset = 0;
+    tableState.sort = null;
+    tableState.order = 'asc';
+    tableState.filter = '';
+    const filterInput = document.getElementById('filter');
+    if (filterInput) {
+        filterInput.value = '';
+    }
+}
+
+// Filters are comma-separated in the filter box; a literal comma inside a value is written as \,
+function splitFilters(text) {
+    return text.split(/(?<!\\),/).map(f => f.trim().replace(/\\,/g, ',')).filter(f => f);
+}
+
+function joinFilters(filters) {
+    return filters.map(f => f.replace(/,/g, '\\,')).join(', ');
+}
+
+// Start from the paging/sorting/filter in the URL, e.g. the server-rendered ?page=N links
+function initTableState() {
+    const params = new URLSearchParams(window.location.search);
+    const limit = parseInt(params.get('limit'), 10);
+    if (limit > 0) {
+        tableState.limit = limit;
+    }
+    const page = parseInt(params.get('page'), 10);
+    const offset = parseInt(params.get('offset'), 10);
+    if (page > 0) {
+        tableState.offset = (page - 1) * tableState.limit;
+    } else if (offset >= 0) {
+        tableState.offset = offset;
+    }
+    tableState.sort = params.get('sort') || null;
+    tableState.order = params.get('order') === 'desc' ? 'desc' : 'asc';
+    tableState.filter = joinFilters(params.getAll('filter'));
+    const filterInput = document.getElementById('filter');
+    if (filterInput) {
+        filterInput.value = tableState.filter;
+    }
+}
+
+function buildTableQuery() {
+    const params = new URLSearchParams({
+        limit: tableState.limit,
+        offset: tableState.offset,
+        order: tableState.order
+    });
+    if (tableState.sort) {
+        params.set('sort', tableState.sort);
+    }
+    splitFilters(tableState.filter).forEach(f => params.append('filter', f));
+    return params.toString();
+}
+
+function sortBy(table, column) {
+    if (tableState.sort === column) {
+        tableState.order = tableState.order === 'asc' ? 'desc' : 'asc';
+    } else {
+        tableState.sort = column;
+        tableState.order = 'asc';
+    }
+    tableState.offset = 0;
+    loadTable(table);
+}
+
+function renderPager(table, page) {
+    const pager = document.getElementById('pager');
+    if (!pager) {
+        return;
+    }
+    pager.innerHTML = '';
+    const first = page.total === 0 ? 0 : page.offset + 1;
+    const last = page.offset + page.rows.length;
+
+    if (page.offset > 0) {
+        const prevButton = document.createElement('button');
+        prevButton.textContent = 'Previous';
+        prevButton.onclick = () => {
+            tableState.offset = Math.max(tableState.offset - tableState.limit, 0);
+            loadTable(table);
+        };
+        pager.appendChild(prevButton);
+    }
+
+    const summary = document.createElement('span');
+    summary.textContent = `Showing ${first}-${last} of ${page.total} rows`;
+    pager.appendChild(summary);
+
+    if (last < page.total) {
+        const nextButton = document.createElement('button');
+        nextButton.textContent = 'Next';
+        nextButton.onclick = () => {
+            tableState.offset += tableState.limit;
+            loadTable(table);
+        };
+        pager.appendChild(nextButton);
+    }
+}
+
 function loadTable(table) {
     console.log("loadTable called with table:", table);
     if (!table) {
         console.log("No table provided, aborting loadTable");
         return;
     }
-    fetch(`/api/inventory/${table}`)
+    const query = buildTableQuery();
+    window.history.replaceState(null, '', `?table=${encodeURIComponent(table)}&${query}`);  // keep reloads and links on this page
+    fetch(`/api/inventory/${table}?${query}`)
         .then(response => {
             console.log("Fetch response status for loadTable:", response.status);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
+            changeState.version = response.headers.get('X-Change-Version');
+            changeState.feed = response.headers.get('X-Change-Feed');
             return response.json();
         })
-        .then(grid_data => {
-            console.log("Data received for table:", grid_data);
+        .then(page => {
+            console.log("Page received for table:", page.offset, page.rows.length, page.total);
+            changeState.total = page.total;
+            changeState.headers = page.headers || [];
+            renderPager(table, page);
+            const grid_data = page.headers && page.headers.length ? [page.headers, ...page.rows] : [];
             const tbody = document.querySelector('#inventory-table tbody');
             if (!tbody) {
                 console.log("Table body not found");
@@ -28,51 +142,21 @@ function loadTable(table) {
                 return;
             }
             
-            grid_data.forEach((row, rowIndex) => {
-                const tr = document.createElement('tr');
-                if (rowIndex > 0) {
-                    tr.className = 'editable';
-                    tr.dataset.rowId = row[0];  // Store the 'id' for editing/deleting
+            const headerRow = document.createElement('tr');
+            grid_data[0].forEach(cell => {
+                const td = document.createElement('td');
+                td.textContent = cell;
+                td.className = 'sortable';
+                if (tableState.sort === cell) {
+                    td.textContent += tableState.order === 'asc' ? ' \u25B2' : ' \u25BC';
                 }
-                row.forEach((cell, cellIndex) => {
-                    const td = document.createElement('td');
-                    td.textContent = cell;
-                    if (cellIndex === 1 && rowIndex > 0) {  // Place Delete button in the second column
-                        const deleteButton = document.createElement('button');
-                        deleteButton.className = 'delete-row-button';
-                        deleteButton.textContent = 'Delete';
-                        deleteButton.onclick = () => deleteRow(table, row[0]);
-                        td.appendChild(deleteButton);
-                    }
-                    tr.appendChild(td);
-                });
-                tbody.appendChild(tr);
+                td.onclick = () => sortBy(table, cell);
+                headerRow.appendChild(td);
             });
+            tbody.appendChild(headerRow);
+            grid_data.slice(1).forEach(row => tbody.appendChild(buildRow(table, row, grid_data[0])));
 
             updateStockForm(grid_data[0] || []);
-
-            // Add click event listeners to editable rows
-            document.querySelectorAll('.editable').forEach(row => {
-                row.addEventListener('click', (e) => {
-                    if (e.target.className.includes('delete-row-button')) return;  // Ignore clicks on delete button
-                    const rowId = row.dataset.rowId;
-                    const cells = row.querySelectorAll('td');
-                    const headers = grid_data[0];
-                    const form = document.getElementById('stock-form');
-                    form.querySelector('input[name="action"]').value = 'edit_entry';
-                    form.querySelector('input[name="row_id"]').value = rowId;
-                    headers.forEach((header, colIndex) => {
-                        if (header === 'id') return;  // Skip 'id' column
-                        const fieldName = header.replace(/[\s\.]/g, '_').toLowerCase();
-                        const input = form.querySelector(`input[name="${fieldName}"]`);
-                        if (input) {
-                            input.value = cells[colIndex].textContent;
-                        }
-                    });
-                    document.getElementById('message').textContent = 'Editing row with ID ' + rowId + '. Update the form and click "Add Entry" to save changes.';
-                    document.getElementById('message').className = '';
-                });
-            });
         })
         .catch(error => {
             console.error('Error loading table:', error);
@@ -84,6 +168,103 @@ function loadTable(table) {
         });
 }
 
+function buildRow(table, row, headers) {
+    const tr = document.createElement('tr');
+    tr.className = 'editable';
+    tr.dataset.rowId = row[0];  // Store the 'id' for editing/deleting
+    row.forEach((cell, cellIndex) => {
+        const td = document.createElement('td');
+        td.textContent = cell;
+        if (cellIndex === 1) {  // Place Delete button in the second column
+            const deleteButton = document.createElement('button');
+            deleteButton.className = 'delete-row-button';
+            deleteButton.textContent = 'Delete';
+            deleteButton.onclick = () => deleteRow(table, row[0]);
+            td.appendChild(deleteButton);
+        }
+        tr.appendChild(td);
+    });
+    tr.addEventListener('click', (e) => {
+        if (e.target.className.includes('delete-row-button')) return;  // Ignore clicks on delete button
+        const rowId = tr.dataset.rowId;
+        const cells = tr.querySelectorAll('td');
+        const form = document.getElementById('stock-form');
+        form.querySelector('input[name="action"]').value = 'edit_entry';
+        form.querySelector('input[name="row_id"]').value = rowId;
+        headers.forEach((header, colIndex) => {
+            if (header === 'id') return;  // Skip 'id' column
+            const fieldName = header.replace(/[\s\.]/g, '_').toLowerCase();
+            const input = form.querySelector(`input[name="${fieldName}"]`);
+            if (input) {
+                input.value = cells[colIndex].textContent;
+            }
+        });
+        document.getElementById('message').textContent = 'Editing row with ID ' + rowId + '. Update the form and click "Add Entry" to save changes.';
+        document.getElementById('message').className = '';
+    });
+    return tr;
+}
+
+// Patch the rows on screen with what changed since they were loaded instead of refetching the table.
+// Falls back to loadTable when the server asks for a reset (too far behind, bulk change, other process).
+function applyChanges(table) {
+    if (changeState.version === null) {
+        loadTable(table);
+        return;
+    }
+    fetch(`/api/changes/${table}?since=${changeState.version}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(result => {
+            const tbody = document.querySelector('#inventory-table tbody');
+            if (result.reset || result.feed !== changeState.feed || !tbody || changeState.headers.length === 0) {
+                loadTable(table);
+                return;
+            }
+            const onLastPage = tableState.offset + tableState.limit >= changeState.total;
+            // The row count only moves for rows known to be in this view; otherwise let the server count
+            let recount = false;
+            result.changes.forEach(change => {
+                const current = tbody.querySelector(`tr[data-row-id="${CSS.escape(String(change.id))}"]`);
+                if (change.op === 'delete') {
+                    if (current) {
+                        current.remove();
+                        changeState.total -= 1;
+                    } else {
+                        recount = true;  // another page's row, filtered out, or never existed
+                    }
+                } else if (current) {
+                    current.replaceWith(buildRow(table, change.row, changeState.headers));
+                } else if (change.op === 'insert') {
+                    if (tableState.filter) {
+                        recount = true;  // the new row may not match the filter
+                    } else {
+                        changeState.total += 1;
+                        // New rows sort last by id; only show them where a full reload would
+                        if (onLastPage && !tableState.sort) {
+                            tbody.appendChild(buildRow(table, change.row, changeState.headers));
+                        }
+                    }
+                }
+                // An edit of a row on another page changes neither this page nor the count
+            });
+            if (recount) {
+                loadTable(table);
+                return;
+            }
+            changeState.version = result.version;
+            renderPager(table, { offset: tableState.offset, total: changeState.total, rows: tbody.querySelectorAll('tr.editable') });
+        })
+        .catch(error => {
+            console.error('Error applying changes, reloading table:', error);
+            loadTable(table);
+        });
+}
+
 function updateStockForm(headers) {
     console.log("Updating stock form with headers:", headers);
     const form = document.getElementById('stock-form');
@@ -150,12 +331,98 @@ function updateStockForm(headers) {
     submitButton.textContent = 'Add Entry';
     form.appendChild(submitButton);
 
+    if (headers.length > 0) {
+        appendQueueButtons(form);
+    }
+
     const messageDiv = document.getElementById('message');
     if (messageDiv) {
         form.appendChild(messageDiv);
     }
 }
 
+// Entries queued here are saved together through /stock_counter/batch in one transaction
+const pendingOperations = [];
+
+function appendQueueButtons(form) {
+    const queueButton = document.createElement('button');
+    queueButton.type = 'button';
+    queueButton.textContent = 'Queue Entry';
+    queueButton.onclick = () => queueFormEntry(form);
+    form.appendChild(queueButton);
+
+    const flushButton = document.createElement('button');
+    flushButton.type = 'button';
+    flushButton.id = 'flush-queue';
+    flushButton.onclick = () => flushQueuedOperations(form.querySelector('input[name="table"]').value);
+    form.appendChild(flushButton);
+    updateQueueCount();
+}
+
+function updateQueueCount() {
+    const flushButton = document.getElementById('flush-queue');
+    if (flushButton) {
+        flushButton.textContent = `Save Queued Entries (${pendingOperations.length})`;
+        flushButton.disabled = pendingOperations.length === 0;
+    }
+}
+
+function queueFormEntry(form) {
+    if (!form.reportValidity()) {
+        return;
+    }
+    const formData = new FormData(form);
+    const values = {};
+    formData.forEach((value, key) => {
+        if (!['table', 'action', 'row_id'].includes(key)) {
+            values[key] = value;
+        }
+    });
+    pendingOperations.push({
+        action: formData.get('action') || 'add_entry',
+        row_id: formData.get('row_id') || null,
+        values: values
+    });
+    console.log("Queued operation:", pendingOperations[pendingOperations.length - 1]);
+    form.reset();
+    form.querySelector('input[name="action"]').value = 'add_entry';
+    form.querySelector('input[name="row_id"]').value = '';
+    updateQueueCount();
+}
+
+function flushQueuedOperations(table) {
+    if (!table || pendingOperations.length === 0) {
+        return;
+    }
+    const messageDiv = document.getElementById('message');
+    fetch('/stock_counter/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ table: table, operations: pendingOperations })
+    })
+    .then(response => response.json())
+    .then(result => {
+        console.log("Batch result:", result);
+        if (result.success) {
+            pendingOperations.length = 0;
+            messageDiv.textContent = result.message;
+            messageDiv.className = 'success-message';
+            applyChanges(table);
+        } else {
+            const failed = (result.results || []).filter(r => !r.success && r.message !== 'Rolled back');
+            const details = failed.map(r => `#${r.index + 1}: ${r.message}`).join('; ');
+            messageDiv.textContent = result.message + (details ? ` (${details})` : '');
+            messageDiv.className = 'error-message';
+        }
+        updateQueueCount();
+    })
+    .catch(error => {
+        console.error('Error saving queued entries:', error);
+        messageDiv.textContent = 'Failed to save queued entries: ' + error.message;
+        messageDiv.className = 'error-message';
+    });
+}
+
 function handleFormSubmit(formId, endpoint) {
     console.log("handleFormSubmit called for form:", formId, "with endpoint:", endpoint);
     const form = document.getElementById(formId);
@@ -204,7 +471,7 @@ function handleFormSubmit(formId, endpoint) {
                 form.querySelector('input[name="row_id"]').value = '';
                 const table = form.querySelector('input[name="table"]').value;
                 console.log("Reloading table for table:", table);
-                loadTable(table);
+                applyChanges(table);
             } else {
                 messageDiv.className = 'error-message';
             }
@@ -253,7 +520,7 @@ function deleteRow(table, rowId) {
         messageDiv.textContent = result.message;
         if (result.success) {
             messageDiv.className = 'success-message';
-            loadTable(table);
+            applyChanges(table);
         } else {
             messageDiv.className = 'error-message';
         }
@@ -308,7 +575,7 @@ function handleDeleteAll() {
         messageDiv.textContent = result.message;
         if (result.success) {
             messageDiv.className = 'success-message';
-            loadTable(table);
+            applyChanges(table);
         } else {
             messageDiv.className = 'error-message';
         }
@@ -330,6 +597,8 @@ document.addEventListener('DOMContentLoaded', () => {
             e.preventDefault();  // Prevent default form submission
             const selectedTable = e.target.value;
             console.log("Table changed to:", selectedTable);
+            resetTableState();
+            pendingOperations.length = 0;  // Queued entries belong to the previous table
             
             // Update the hidden table input in the stock form
             const stockForm = document.getElementById('stock-form');
@@ -345,7 +614,21 @@ document.addEventListener('DOMContentLoaded', () => {
             // Load the table data dynamically
             loadTable(selectedTable);
         });
+        const filterInput = document.getElementById('filter');
+        if (filterInput) {
+            filterInput.addEventListener('change', (e) => {
+                tableState.filter = e.target.value.trim();
+                tableState.offset = 0;
+                loadTable(tableSelect.value);
+            });
+            filterInput.addEventListener('keydown', (e) => {
+                if (e.key === 'Enter') {
+                    e.preventDefault();  // Keep the table form from submitting
+                }
+            });
+        }
         if (tableSelect.value) {
+            initTableState();
             loadTable(tableSelect.value);
         } else {
             console.log("No table selected, skipping loadTable");
@@ -0,0 +1,921 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend'))
+
+import analytics
+import benchmark
+import cache
+import compact
+import db
+import excel_handler
+import importer
+import logging_config
+import metrics
+import export
+import inventory
+import query
+import search
+import sqlite_shim
+import store
+from restock import process_restock
+from sales import process_sale
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class RecordingCursor:
+    def __init__(self, statements, fail_on=None, missing=()):
+        self.statements = statements
+        self.fail_on = fail_on
+        self.missing = missing
+        self.rowcount = -1
+
+    def executemany(self, query, params):
+        if self.fail_on and self.fail_on in query:
+            raise db.Error("boom")
+        self.statements.append((query, params))
+
+    def execute(self, query, params):
+        if query.startswith('SELECT'):
+            return
+        self.executemany(query, params)
+        self.rowcount = 0 if params[-1] in self.missing else 1
+
+    def fetchall(self):
+        return []
+
+
+class RecordingConnection(FakeConnection):
+    def __init__(self, fail_on=None, missing=()):
+        super().__init__()
+        self.statements = []
+        self.commits = 0
+        self.fail_on = fail_on
+        self.missing = missing
+
+    def cursor(self):
+        return RecordingCursor(self.statements, self.fail_on, self.missing)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeConnector:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self, **config):
+        connection = FakeConnection()
+        self.created.append(connection)
+        return connection
+
+
+class StreamingConnection(FakeConnection):
+    """Like mysql.connector: a new statement fails while an unbuffered result still has unread rows."""
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.unread = False
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            description = [('id',), ('name',)]
+
+            def execute(self, query, params=None):
+                if connection.unread:
+                    raise db.Error("Unread result found")
+                connection.unread, self.pending = True, list(connection.rows)
+
+            def fetchmany(self, size):
+                batch, self.pending = self.pending[:size], self.pending[size:]
+                connection.unread = bool(batch)
+                return batch
+
+        return Cursor()
+
+
+def make_pool(**options):
+    settings = {'size': 2, 'timeout': 0.2, 'idle_timeout': 300, 'health_check_interval': 0}
+    settings.update(options)
+    connector = FakeConnector()
+    return db.ConnectionPool(connector, {}, **settings), connector
+
+
+@pytest.fixture
+def sqlite_db(request, tmp_path):
+    """A generated bench table (``rows`` via indirect parametrize, default 5) behind the sync pool."""
+    database = benchmark.generate_table(str(tmp_path / 'bench.sqlite3'), rows=getattr(request, 'param', 5))
+    db.configure_pool(connector=sqlite_shim.connect, config={'database': database})
+    db.invalidate_schema()
+    yield database
+    db.configure_pool()
+    db.invalidate_schema()
+
+
+def test_pool_reuses_released_connections():
+    pool, connector = make_pool()
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is first
+    assert len(connector.created) == 1
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_pool_times_out_when_exhausted():
+    pool, _ = make_pool(size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(db.PoolTimeout):
+        pool.acquire()
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['timeouts'] == 1
+
+
+def test_pool_waiter_gets_released_connection():
+    pool, connector = make_pool(size=1, timeout=2)
+    held = pool.acquire()
+    result = {}
+    waiter = threading.Thread(target=lambda: result.setdefault('connection', pool.acquire()))
+    waiter.start()
+    pool.release(held)
+    waiter.join()
+    assert result['connection'] is held
+    assert len(connector.created) == 1
+
+
+def test_pool_discards_unhealthy_and_rolls_back_open_transactions():
+    pool, connector = make_pool()
+    connection = pool.acquire()
+    connection.in_transaction = True
+    pool.release(connection)
+    assert connection.rollbacks == 1
+    connection.connected = False
+    replacement = pool.acquire()
+    assert replacement is not connection
+    assert connection.closed
+    assert pool.stats()['discarded'] == 1
+    assert len(connector.created) == 2
+
+
+def test_pool_evicts_idle_connections():
+    pool, _ = make_pool(idle_timeout=0)
+    connection = pool.acquire()
+    pool.release(connection)
+    assert pool.acquire() is not connection
+    assert connection.closed
+    assert pool.stats()['evicted'] == 1
+
+
+def test_abandoned_table_stream_does_not_return_its_connection_to_the_pool():
+    connections = []
+    db.configure_pool(connector=lambda **config: connections.append(StreamingConnection([(1, 'a'), (2, 'b'), (3, 'c')])) or connections[-1],
+                      config={}, size=1)
+    try:
+        rows = db.iter_table_rows('stock', batch_size=2)
+        assert next(rows) == ['id', 'name'] and next(rows) == [1, 'a']
+        rows.close()  # e.g. the client stopped reading the export
+        assert connections[0].closed and db.get_pool_stats()['discarded'] == 1
+        assert list(db.iter_table_rows('stock', batch_size=2)) == [['id', 'name'], [1, 'a'], [2, 'b'], [3, 'c']]
+        assert len(connections) == 2 and not connections[1].closed and db.get_pool_stats()['idle'] == 1
+    finally:
+        db.configure_pool()
+
+
+def test_schema_cache_serves_repeat_lookups_until_invalidated(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db, '_fetch_tables', lambda: calls.append('tables') or ['stock'])
+    monkeypatch.setattr(db, '_fetch_columns', lambda table: calls.append(table) or [('id', 'int'), ('item', 'varchar(50)')])
+    cache = db.SchemaCache(ttl=60)
+    assert cache.get_tables() == ['stock']
+    assert cache.get_tables() == ['stock']
+    assert cache.get_columns('stock') == [('id', 'int'), ('item', 'varchar(50)')]
+    assert cache.get_columns('stock') == [('id', 'int'), ('item', 'varchar(50)')]
+    assert calls == ['tables', 'stock']
+    cache.invalidate('stock')
+    cache.get_columns('stock')
+    assert calls == ['tables', 'stock', 'stock']
+
+
+def make_inventory(rows=10):
+    grid = [['S.No.', 'Item Name', 'Quantity']]
+    grid += [[i, f'Item {i}', (i * 7) % 10] for i in range(1, rows + 1)]
+    return {'Main Store': grid}
+
+
+def test_parse_filter_prefers_longest_operator():
+    assert query.parse_filter('Quantity>=5') == ('Quantity', '>=', '5')
+    assert query.parse_filter('Item Name~bolt') == ('Item Name', '~', 'bolt')
+    assert query.parse_filter('name~a=b') == ('name', '~', 'a=b')
+    assert query.parse_filter('note=x>y') == ('note', '=', 'x>y')
+    assert query.parse_filter('Quantity<=-1') == ('Quantity', '<=', '-1')
+    with pytest.raises(query.QueryError):
+        query.parse_filter('no operator')
+
+
+def test_inventory_page_sorts_filters_and_follows_cursor():
+    data = make_inventory()
+    headers, rows, total, cursor = inventory.get_inventory_page(data, 'Main_Store', limit=3, sort='Quantity', filters=[('Quantity', '>=', '3')])
+    assert headers == ['S.No.', 'Item Name', 'Quantity']
+    assert total == 7
+    assert [row[2] for row in rows] == [3, 4, 5]
+    _, next_rows, _, _ = inventory.get_inventory_page(data, 'Main_Store', limit=3, sort='Quantity', filters=[('Quantity', '>=', '3')], after=query.decode_cursor(cursor))
+    assert [row[2] for row in next_rows] == [6, 7, 8]
+
+
+def test_inventory_page_keyset_matches_offset_paging():
+    data = make_inventory(25)
+    _, first, _, cursor = inventory.get_inventory_page(data, 'Main_Store', limit=10, sort='Quantity', descending=True)
+    _, by_cursor, _, _ = inventory.get_inventory_page(data, 'Main_Store', limit=10, sort='Quantity', descending=True, after=query.decode_cursor(cursor))
+    _, by_offset, _, _ = inventory.get_inventory_page(data, 'Main_Store', limit=10, offset=10, sort='Quantity', descending=True)
+    assert by_cursor == by_offset
+    assert not set(map(tuple, first)) & set(map(tuple, by_cursor))
+
+
+def test_export_formats_stream_the_same_rows():
+    grid = make_inventory(3)['Main Store']
+    assert ''.join(export.iter_ndjson(iter(grid))).splitlines()[0] == '{"S.No.": 1, "Item Name": "Item 1", "Quantity": 7}'
+    assert json.loads(''.join(export.iter_json_array(iter(grid)))) == grid
+    assert ''.join(export.iter_csv(iter(grid), chunk_rows=2)).splitlines() == ['S.No.,Item Name,Quantity', '1,Item 1,7', '2,Item 2,4', '3,Item 3,1']
+
+
+def test_ndjson_export_keeps_blank_and_duplicate_header_columns():
+    grid = [['S.No.', '2024-25', '', '2024-25', None], [1, 5, 'x', 7, 'y', 'extra']]
+    record = json.loads(''.join(export.iter_ndjson(iter(grid))))
+    assert record == {'S.No.': 1, '2024-25': 5, 'column_3': 'x', '2024-25_4': 7, 'column_5': 'y', 'column_6': 'extra'}
+
+
+def test_store_matches_linear_sale_and_restock():
+    linear = make_inventory()
+    indexed = store.InventoryStore(make_inventory())
+    headers = linear['Main Store'][0]
+    cases = [('Main_Store', 3, 1), ('Main_Store', 3, 50), ('Main_Store', 99, 1), ('Missing', 1, 1)]
+    for category, item_id, quantity in cases:
+        assert indexed.process_sale(category, item_id, quantity) == process_sale(linear, category, item_id, quantity, headers)
+        assert indexed.process_restock(category, item_id, quantity) == process_restock(linear, category, item_id, quantity, headers)
+    assert indexed.data == linear
+    assert indexed.find_item('Main_Store', '4') == [4, 'Item 4', 8]
+
+
+def test_store_journal_replays_sales_over_reloaded_data(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    indexed = store.InventoryStore(make_inventory(), journal=store.StockJournal(journal_path))
+    assert indexed.process_sale('Main_Store', 2, 3)[0]
+    assert indexed.process_restock('Main_Store', 5, 10)[0]
+    indexed.replace(make_inventory())
+    assert indexed.find_item('Main_Store', 2)[2] == 1
+    assert indexed.find_item('Main_Store', 5)[2] == 15
+    restarted = store.InventoryStore(make_inventory(), journal=store.StockJournal(journal_path))
+    assert restarted.find_item('Main_Store', 5)[2] == 15
+    restarted.journal.truncate(1)
+    assert [entry['kind'] for entry in store.StockJournal(journal_path).entries()] == ['restock']
+
+
+def write_workbook(path, sheets):
+    import openpyxl
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        sheet = workbook.create_sheet(name)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def test_store_refresh_keeps_stock_edited_in_the_workbook(tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_handler, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'book.xlsx')
+    journal_path = str(tmp_path / 'journal.jsonl')
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 751], [2, 'Nut', 10]]})
+    live = store.InventoryStore.from_excel(journal=store.StockJournal(journal_path), excel_file=path)
+    live.process_sale('Main_Store', 1, 1)
+    live.process_sale('Main_Store', 2, 2)
+    assert live.find_item('Main_Store', 1)[2] == 750
+
+    # Someone sets the bolt stock to 50 in Excel; the nut's sale is not in the workbook and still replays
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 50], [2, 'Nut', 10], [3, 'Washer', 1]]})
+    os.utime(path, ns=(1, 1))
+    assert live.refresh_if_changed()
+    assert [live.find_item('Main_Store', n)[2] for n in (1, 2)] == [50, 8]
+    assert [entry['item_id'] for entry in live.journal.entries()] == ['2']
+    restarted = store.InventoryStore.from_excel(journal=store.StockJournal(journal_path), excel_file=path)
+    assert [restarted.find_item('Main_Store', n)[2] for n in (1, 2)] == [50, 8]
+
+    live.process_sale('Main_Store', 1, 1)
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 50], [2, 'Nut', 10]]})
+    os.utime(path, ns=(2, 2))
+    assert live.refresh_if_changed()
+    assert [live.find_item('Main_Store', n)[2] for n in (1, 2)] == [49, 8]
+
+def test_streaming_loader_matches_legacy_and_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_handler, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 5], [None, None, None], [2, None, None, None, 'x']], 'Empty': []})
+    streamed = excel_handler.load_excel_data(path)
+    assert streamed == excel_handler.load_excel_data_legacy(path)
+    assert streamed['Empty'] == []
+    monkeypatch.setattr(excel_handler.openpyxl, 'load_workbook', lambda *args, **kwargs: pytest.fail("cache miss"))
+    assert excel_handler.load_excel_data(path) == streamed
+
+
+def test_parallel_loader_merges_sheets_in_order(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    sheets = {f'Sheet {i}': [['S.No.', 'Item', 'Stock']] + [[n, f'Item {n}', n * i] for n in range(1, 20)] for i in range(3)}
+    write_workbook(path, sheets)
+    parallel = excel_handler.load_excel_data_parallel(path, workers=2, min_bytes=0)
+    assert list(parallel) == list(sheets)
+    assert parallel == excel_handler.load_excel_data(path, use_cache=False)
+
+
+def test_inventory_loader_reports_readiness():
+    release = threading.Event()
+    loader = store.InventoryLoader(lambda: release.wait() and store.InventoryStore(make_inventory()))
+    assert loader.status() == 'idle'
+    assert loader.wait(timeout=0.01) is None
+    assert loader.status() == 'loading'
+    release.set()
+    assert loader.wait(timeout=2).categories() == [('Main_Store', 'Main Store')]
+    assert loader.status() == 'ready'
+    failing = store.InventoryLoader(lambda: 1 / 0)
+    assert failing.wait(timeout=2) is None
+    assert failing.status() == 'failed'
+
+
+def use_recording_connection(monkeypatch, connection):
+    monkeypatch.setattr(db, 'get_column_names', lambda table, include_id=True: ['item', 'stock'])
+    monkeypatch.setattr(db, 'get_db_connection', lambda: connection)
+    monkeypatch.setattr(db, 'close_db_connection', lambda conn: None)
+
+
+def test_apply_batch_groups_runs_into_one_transaction(monkeypatch):
+    connection = RecordingConnection()
+    use_recording_connection(monkeypatch, connection)
+    success, _, results = db.apply_batch('stock', [
+        {'action': 'add_entry', 'data': ['bolt', 5]},
+        {'action': 'add_entry', 'data': ['nut', 7]},
+        {'action': 'edit_entry', 'row_id': 3, 'data': ['washer', 1]},
+        {'action': 'delete_entry', 'row_id': 4},
+    ])
+    assert success and all(result['success'] for result in results)
+    assert [params for _, params in connection.statements] == [[['bolt', 5], ['nut', 7]], ['washer', 1, 3], [4]]
+    assert connection.commits == 1
+
+
+def test_apply_batch_reports_operations_that_matched_no_row(monkeypatch):
+    connection = RecordingConnection(missing=(8, 9))
+    use_recording_connection(monkeypatch, connection)
+    success, message, results = db.apply_batch('stock', [
+        {'action': 'edit_entry', 'row_id': 3, 'data': ['washer', 1]},
+        {'action': 'edit_entry', 'row_id': 9, 'data': ['gone', 1]},
+        {'action': 'delete_entry', 'row_id': 8},
+    ])
+    assert success and message == "Applied 1 operations, 2 not found" and connection.commits == 1
+    assert [(result['success'], result['message']) for result in results] == [(True, "Applied"), (False, "Not found"), (False, "Not found")]
+
+
+def test_apply_batch_rejects_invalid_operations_and_rolls_back_errors(monkeypatch):
+    connection = RecordingConnection(fail_on='DELETE')
+    use_recording_connection(monkeypatch, connection)
+    success, _, results = db.apply_batch('stock', [{'action': 'add_entry', 'data': ['bolt']}, {'action': 'edit_entry', 'data': ['a', 1]}])
+    assert not success
+    assert [result['message'] for result in results] == ["Data length does not match number of columns", "Row ID is required"]
+    assert connection.statements == []
+    success, _, results = db.apply_batch('stock', [{'action': 'add_entry', 'data': ['bolt', 1]}, {'action': 'delete_entry', 'row_id': 9}])
+    assert not success
+    assert connection.rollbacks == 1 and connection.commits == 0
+    assert all(result['message'] == 'Rolled back' for result in results)
+
+
+def test_import_sheet_maps_headers_and_loads_in_chunks(tmp_path, monkeypatch):
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path, {'Art': [['S.No.', 'Name of Items', 'Quantity']] + [[n, f'Item {n}', n] for n in range(1, 6)] + [[None, None, 'x'], [None, None, None]]})
+    monkeypatch.setattr(importer, 'get_column_names', lambda table, include_id=True: ['name_of_items', 'quantity', 'remarks'])
+    chunks = []
+    monkeypatch.setattr(importer, 'insert_rows', lambda table, columns, rows: chunks.append((columns, rows)) or (True, "ok"))
+    progress = []
+    stats = importer.import_sheet(path, 'Art', 'art_stock', chunk_size=2, progress=lambda s: progress.append(s['rows']))
+    assert stats['success'] and stats['rows'] == 6 and stats['chunks'] == 3
+    assert chunks[0] == (['name_of_items', 'quantity'], [['Item 1', 1], ['Item 2', 2]])
+    assert chunks[-1][1] == [['Item 5', 5], [None, 'x']]
+    assert progress == [2, 4, 6]
+
+
+def test_import_sheet_closes_the_sheet_when_no_header_matches(monkeypatch):
+    closed = []
+
+    def rows(excel_file, sheet_name):
+        try:
+            yield ['Colour', 'Size']
+            yield ['red', 1]
+        finally:
+            closed.append(sheet_name)
+
+    monkeypatch.setattr(importer, 'iter_sheet_rows', rows)
+    monkeypatch.setattr(importer, 'get_column_names', lambda table, include_id=True: ['name_of_items'])
+    with pytest.raises(ValueError):
+        importer.import_sheet('book.xlsx', 'Art', 'art_stock')
+    assert closed == ['Art']
+
+
+def test_concurrent_sales_never_oversell_one_item():
+    indexed = store.InventoryStore({'Main Store': [['S.No.', 'Item Name', 'Quantity'], [1, 'Bolt', 500]]})
+    outcomes = []
+    barrier = threading.Barrier(16)
+
+    def sell():
+        barrier.wait()
+        for _ in range(50):
+            outcomes.append(indexed.process_sale('Main_Store', 1, 1)[0])
+
+    def restock():
+        barrier.wait()
+        for _ in range(10):
+            indexed.process_restock('Main_Store', 1, 1)
+
+    threads = [threading.Thread(target=sell) for _ in range(12)] + [threading.Thread(target=restock) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sold = outcomes.count(True)
+    assert sold <= 540
+    assert indexed.find_item('Main_Store', 1)[2] == 500 + 40 - sold
+    assert indexed.find_item('Main_Store', 1)[2] >= 0
+
+
+def test_concurrent_legacy_sales_keep_counts_consistent():
+    data = {'Main Store': [['S.No.', 'Item Name', 'Quantity'], [1, 'Bolt', 200]]}
+    headers = data['Main Store'][0]
+    outcomes = []
+    threads = [threading.Thread(target=lambda: [outcomes.append(process_sale(data, 'Main_Store', 1, 1, headers)[0]) for _ in range(25)]) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outcomes.count(True) == 200
+    assert data['Main Store'][1][2] == 0
+
+
+class AdjustCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = 0
+        self.result = None
+
+    def execute(self, query, params):
+        if query.startswith('UPDATE'):
+            delta, row_id, _ = params
+            ok = row_id in self.rows and self.rows[row_id] + delta >= 0
+            if ok:
+                self.rows[row_id] += delta
+            self.rowcount = int(ok)
+        elif query.startswith('SELECT *'):
+            self.result = (params[0], 'Bolt', self.rows[params[0]]) if params[0] in self.rows else None
+        else:
+            self.result = (self.rows[params[0]],) if params[0] in self.rows else None
+
+    def fetchone(self):
+        return self.result
+
+    def fetchall(self):
+        return [self.result] if self.result else []
+
+
+def test_adjust_stock_uses_conditional_update(monkeypatch):
+    rows = {1: 3}
+    connection = RecordingConnection()
+    connection.cursor = lambda: AdjustCursor(rows)
+    monkeypatch.setattr(db, 'get_table_columns', lambda table: [('id', 'int'), ('item', 'varchar(50)'), ('stock', 'int')])
+    monkeypatch.setattr(db, 'get_db_connection', lambda: connection)
+    monkeypatch.setattr(db, 'close_db_connection', lambda conn: None)
+    assert db.adjust_stock('stock_table', 1, 'stock', -2) == (True, "Stock updated successfully")
+    assert db.adjust_stock('stock_table', 1, 'stock', -2) == (False, "Insufficient stock")
+    assert db.adjust_stock('stock_table', 7, 'stock', -1) == (False, "Item not found")
+    assert db.adjust_stock('stock_table', 1, 'item', 1) == (False, "Column item is not numeric")
+    assert rows == {1: 1}
+
+
+def test_response_cache_is_invalidated_by_version_bumps():
+    response_cache = cache.ResponseCache(max_entries=2)
+    built = []
+    key = cache.category_key('Cache Test')
+    version = cache.category_version('Cache Test')
+    assert response_cache.get_or_build('page', version, lambda: built.append(1) or 'v1') == 'v1'
+    assert response_cache.get_or_build('page', version, lambda: built.append(1) or 'v1') == 'v1'
+    cache.bump_version(key)
+    assert response_cache.get_or_build('page', cache.category_version('Cache Test'), lambda: built.append(1) or 'v2') == 'v2'
+    assert len(built) == 2
+    response_cache.put('a', 1, 'a')
+    response_cache.put('b', 1, 'b')
+    assert response_cache.get('page', cache.category_version('Cache Test')) is None
+
+
+def test_store_sales_bump_category_versions():
+    indexed = store.InventoryStore(make_inventory())
+    before = cache.category_version('Main Store')
+    indexed.process_sale('Main_Store', 1, 1)
+    assert cache.category_version('Main Store') != before
+
+
+def test_summarize_caps_large_datasets():
+    grid = make_inventory(10000)['Main Store']
+    text = str(logging_config.summarize(grid))
+    assert text.startswith('<10001 rows x 3 cols:')
+    assert len(text) <= logging_config.SUMMARY_CHARS
+    assert str(logging_config.summarize({'a': 1})) == '<1 keys: a>'
+
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    histogram = metrics.Histogram('test_latency_seconds', 'Test latency.', labels=('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, route='a"b')
+    lines = histogram.render()
+    metrics.REGISTRY.remove(histogram)
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{route="a\\"b"} 3' in lines
+
+
+def test_sqlite_shim_runs_db_helpers(sqlite_db):
+    assert db.get_tables() == [benchmark.TABLE_NAME]
+    assert db.get_column_names(benchmark.TABLE_NAME) == ['id', 'item_name', 'brand', 'quantity', 'rate']
+    headers, rows, total, next_cursor = db.get_table_page(benchmark.TABLE_NAME, limit=2, sort='item_name', descending=True)
+    assert total == 5 and [row[1] for row in rows] == ['Item 5', 'Item 4'] and next_cursor
+    assert db.add_table_entry(benchmark.TABLE_NAME, ['Item 6', 'Doms', 1, 2.5])[0]
+    assert db.adjust_stock(benchmark.TABLE_NAME, 6, 'quantity', -2) == (False, "Insufficient stock")
+    assert db.adjust_stock(benchmark.TABLE_NAME, 6, 'quantity', -1)[0]
+    assert db.get_table_data(benchmark.TABLE_NAME)[-1][:4] == [6, 'Item 6', 'Doms', 0]
+
+
+def test_benchmark_suite_runs_and_flags_regressions(tmp_path):
+    current = benchmark.run_suite(rows=20, sheets=2, iterations=2, loader_repeat=1, workdir=str(tmp_path))
+    assert current['meta']['rows'] == 20
+    assert {'loader.legacy', 'sale.store', 'db.page.keyset', 'route.sales_reform.sale', 'route.api_inventory.category.uncached'} <= set(current['results'])
+    slower = {'results': {name: dict(result, median_ms=result['median_ms'] * 2) for name, result in current['results'].items()}}
+    rows, regressions = benchmark.compare(current, slower, threshold=1.5)
+    assert len(rows) == len(current['results']) and set(regressions) == set(current['results'])
+    assert benchmark.compare(current, current)[1] == []
+
+
+def test_compact_sheet_reads_and_writes_like_the_list_grid():
+    grid = make_inventory(300)['Main Store']
+    grid[5][1] = ''
+    sheet = compact.CompactSheet(grid)
+    assert sheet == grid and sheet.to_lists() == grid and len(sheet) == len(grid)
+    assert sheet[0] is sheet.headers and list(sheet[-1]) == grid[-1] and sheet[1:3] == grid[1:3]
+    assert isinstance(sheet.columns[2], compact.NumericColumn) and isinstance(sheet.columns[1], compact.DictionaryColumn)
+    row = sheet[4]
+    row[2] = row[2] + 5
+    row[2] = 'n/a'  # does not fit the int array: the column is re-encoded
+    assert sheet[4][2] == 'n/a' and sheet[3][2] == grid[3][2]
+    assert sheet.nbytes() < compact.grid_nbytes(grid)
+
+
+def test_store_and_json_work_on_compact_sheets(monkeypatch):
+    monkeypatch.setenv('INVENTORY_LOAD_MODE', 'lazy')
+    import app
+    data = compact.compact_sheets(make_inventory(50))
+    inventory_store = store.InventoryStore(data)
+    assert inventory_store.process_sale('Main_Store', 9, 3) == (True, "Sale recorded successfully (Excel file not modified)")
+    assert data['Main Store'][9][2] == 0
+    headers, rows, total, _ = inventory.get_inventory_page(data, 'Main_Store', limit=2, sort='Quantity', descending=True)
+    assert total == 50 and [row[2] for row in rows] == [9, 9]
+    assert json.loads(app.app.json.dumps({'grid': data['Main Store'], 'rows': rows}))['grid'] == data['Main Store'].to_lists()
+
+
+def test_reports_value_stock_and_refresh_only_changed_categories():
+    data = make_inventory(20)
+    data['Main Store'][0].append('Rate')
+    for row in data['Main Store'][1:]:
+        row.append(2.5)
+    data['Empty'] = [['S.No.', 'Item Name', 'Quantity']]
+    inventory_store = store.InventoryStore(data, journal=store.StockJournal())
+    report = analytics.stock_value_report(inventory_store)
+    main = report['categories'][0]
+    assert (main['items'], main['units'], main['value'], main['price_column']) == (20, 90, 225.0, 'Rate')
+    low = analytics.low_stock_report(inventory_store, threshold=2, limit=10)['items']
+    assert [(item['item_id'], item['stock']) for item in low] == [(10, 0), (20, 0), (3, 1), (13, 1)]
+
+    misses = analytics._summaries.misses
+    inventory_store.process_sale('Main_Store', 3, 1)
+    inventory_store.process_restock('Main_Store', 7, 4)
+    inventory_store.process_sale('Main_Store', 7, 2)
+    assert analytics.stock_value_report(inventory_store)['totals']['units'] == 91
+    assert analytics._summaries.misses == misses + 1  # only the changed category was recomputed
+    movers = analytics.top_movers_report(inventory_store, limit=5)['items']
+    assert [(item['item_id'], item['sold'], item['restocked'], item['name']) for item in movers] == [('7', 2, 4, 'Item 7'), ('3', 1, 0, 'Item 3')]
+
+
+def test_table_reports_aggregate_in_sql(sqlite_db):
+    assert analytics.table_columns(benchmark.TABLE_NAME) == ('quantity', 'rate', 'item_name')
+    db.adjust_stock(benchmark.TABLE_NAME, 2, 'quantity', -benchmark.INITIAL_STOCK + 1)
+    summary = analytics.table_summary(benchmark.TABLE_NAME)
+    assert summary['items'] == 5 and summary['units'] == 4 * benchmark.INITIAL_STOCK + 1 and summary['value'] > 0
+    low = analytics.low_stock_report(None, [benchmark.TABLE_NAME], threshold=5)['items']
+    assert low == [{'source': 'table', 'category': benchmark.TABLE_NAME, 'item_id': 2, 'name': 'Item 2', 'stock': 1}]
+
+
+def test_search_index_ranks_exact_then_prefix_then_infix_matches():
+    index = search.SearchIndex([(1, 'Acrylic Colour 500 ml', 'a'), (2, 'Crayons', 'b'), (3, 'Colour pencils', 'c'), (14, 'Water colour', 'd')])
+    assert [index.docs[doc_no][0] for doc_no in sorted(index.search(['colour'])[search.EXACT])] == [14, 3, 1]  # shortest name first
+    assert index.search(['col', 'pen']) == {search.PREFIX * 2: {index.docs.index((3, 'Colour pencils', 'c'))}}
+    assert set(index.search(['rylic'])) == {search.INFIX}
+    assert index.search(['colour', 'crayons']) == {}
+    tiers = index.search(['1'])  # ids are indexed too: 1 exactly, 14 by prefix
+    assert {search.EXACT: [1], search.PREFIX: [14]} == {score: [index.docs[doc_no][0] for doc_no in docs] for score, docs in tiers.items()}
+
+    updated = index.updated([(2, None), (3, (3, 'Colour pens', 'c2')), (1, (1, 'Acrylic Colour 500 ml', 'a2')), (5, (5, 'Gel pen', 'e'))])
+    assert index.search(['crayons']) and not updated.search(['crayons']) and not updated.search(['pencils'])
+    assert 'crayons' not in updated.vocabulary and 'pencils' in index.vocabulary
+    tiers = updated.search(['pen'])
+    assert [updated.docs[doc_no][0] for score in (search.EXACT, search.PREFIX) for doc_no in updated.best(tiers[score], 5)] == [5, 3]
+    ranked = updated.best(updated.search(['colour'])[search.EXACT], 5)  # appended docs are ranked by name length too
+    assert [updated.docs[doc_no][0] for doc_no in ranked] == [3, 14, 1] and updated.docs[ranked[2]][2] == 'a2'
+    assert set(updated.search(['pens'])) == {search.EXACT} and set(updated.search(['olour', 'ens'])) == {search.INFIX * 2}
+
+
+@pytest.mark.parametrize('sqlite_db', [3], indirect=True)
+def test_search_covers_categories_and_tables_with_live_stock(sqlite_db, monkeypatch):
+    inventory_store = store.InventoryStore(make_inventory(30))
+    try:
+        results = search.search(inventory_store, [benchmark.TABLE_NAME], 'item 2')
+        assert [(result['source'], result['item_id']) for result in results[:2]] == [('excel', 2), ('table', 2)]
+        assert results[0]['stock'] == 4 and len(results) == 11 + 1
+        inventory_store.process_sale('Main_Store', 2, 3)
+        db.add_table_entry(benchmark.TABLE_NAME, ['Item 2b', 'Doms', 5, 1.0])
+        db.update_table_entry(benchmark.TABLE_NAME, 1, ['Item 1', 'Apsara', 2, 1.0])
+        db.delete_table_entry(benchmark.TABLE_NAME, 2)
+        # Writes reach the index through the change feed, not by re-reading the table
+        monkeypatch.setattr(search, 'iter_table_rows', lambda table_name: pytest.fail("table re-read"))
+        results = search.search(inventory_store, [benchmark.TABLE_NAME], 'item 2', limit=50)
+        assert results[0]['stock'] == 1 and ('table', 4) in [(result['source'], result['item_id']) for result in results]
+        assert ('table', 2) not in [(result['source'], result['item_id']) for result in results]
+        assert [result['stock'] for result in search.search(inventory_store, [benchmark.TABLE_NAME], 'item 1') if result['source'] == 'table'] == [2]
+    finally:
+        search.invalidate_search()
+
+
+def test_write_behind_flush_saves_coalesced_deltas_without_double_counting(tmp_path, monkeypatch):
+    import persister
+    monkeypatch.setattr(excel_handler, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 5], [2, 'Nut', 7]]})
+    journal_path = str(tmp_path / 'journal.jsonl')
+    live = store.InventoryStore.from_excel(journal=store.StockJournal(journal_path), excel_file=path)
+    live.process_sale('Main_Store', 1, 2)
+    live.process_restock('Main_Store', 1, 4)
+    live.process_sale('Main_Store', 2, 3)
+    live.process_restock('Main_Store', 2, 3)
+    assert persister.coalesce(live.journal.entries()) == {('Main Store', '1'): 2}
+
+    writer = persister.WorkbookPersister(live, interval=60)
+    assert writer.flush() == 4
+    assert live.journal.entries() == [] and writer.pending() == 0
+    assert excel_handler.read_journal_seq(path) == 4
+    assert excel_handler.load_excel_data(path, use_cache=False)['Main Store'][1:] == [[1, 'Bolt', 7], [2, 'Nut', 7]]
+    assert not live.refresh_if_changed()
+    assert not os.path.exists(f"{path}.{os.getpid()}.tmp")
+
+    # A sale after the flush stays journaled; a restart replays only that one
+    live.process_sale('Main_Store', 1, 1)
+    restarted = store.InventoryStore.from_excel(journal=store.StockJournal(journal_path), excel_file=path)
+    assert restarted.find_item('Main_Store', 1)[2] == 6
+    assert writer.stop() == 1
+    assert store.InventoryStore.from_excel(journal=store.StockJournal(journal_path), excel_file=path).find_item('Main_Store', 1)[2] == 6
+
+
+def test_write_behind_flush_keeps_formulas_and_their_cached_values(tmp_path, monkeypatch):
+    import persister
+    import zipfile
+    import openpyxl
+    monkeypatch.setattr(excel_handler, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path, {'Main Store': [['S.No.', 'Item', 'Stock'], [1, 'Bolt', 5], [2, 'Nut', None],
+                                         [3, 'Kit', '=C2+1'], ['=A4+1', 'Washer', 2], ['', 'Total', '=SUM(C2:C4)']]})
+    # openpyxl saves formulas without a cached value; give them one like Excel would
+    with zipfile.ZipFile(path) as archive:
+        parts = {info.filename: archive.read(info) for info in archive.infolist()}
+    sheet = parts['xl/worksheets/sheet1.xml']
+    sheet = sheet.replace(b'<f>C2+1</f><v />', b'<f>C2+1</f><v>6</v>').replace(b'<f>A4+1</f><v />', b'<f>A4+1</f><v>4</v>').replace(b'<f>SUM(C2:C4)</f><v />', b'<f>SUM(C2:C4)</f><v>11</v>')
+    parts['xl/worksheets/sheet1.xml'] = sheet
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in parts.items():
+            archive.writestr(name, data)
+
+    live = store.InventoryStore.from_excel(journal=store.StockJournal(str(tmp_path / 'journal.jsonl')), excel_file=path)
+    live.process_sale('Main_Store', 1, 2)
+    live.process_restock('Main_Store', 2, 4)
+    live.process_restock('Main_Store', 3, 1)
+    live.process_restock('Main_Store', 4, 1)
+    assert persister.WorkbookPersister(live, interval=60).flush() == 4
+    assert excel_handler.read_journal_seq(path) == 4
+    cells = {row[0].value: row for row in openpyxl.load_workbook(path)['Main Store'].iter_rows(min_row=2)}
+    assert [cells[1][2].value, cells[2][2].value, cells[3][2].value] == [3, 4, '=C2+1']
+    assert cells['=A4+1'][2].value == 3  # found by the S.No. formula's cached value
+    assert cells[None][2].value == '=SUM(C2:C4)'
+    values = excel_handler.load_excel_data(path, use_cache=False)['Main Store']
+    assert values[3][2] == 6 and values[5][2] == 11  # cached values survive (Excel recalculates on open)
+    with zipfile.ZipFile(path) as archive:
+        assert b'fullCalcOnLoad="1"' in archive.read('xl/workbook.xml')
+        untouched = [name for name in parts if name.startswith(('xl/styles', 'xl/theme', 'docProps/core'))]
+        assert untouched and all(archive.read(name) == parts[name] for name in untouched)
+
+def call_asgi(asgi_app, method, path, body=b'', headers=()):
+    import asyncio
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    query_string = path.partition('?')[2].encode()
+    scope = {'type': 'http', 'method': method, 'path': path.partition('?')[0], 'query_string': query_string,
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    coroutine = asgi_app(scope, receive, send)
+    return coroutine, sent
+
+
+def test_async_app_serves_stock_counter_concurrently_over_sqlite(sqlite_db, monkeypatch):
+    import asyncio
+    monkeypatch.setenv('INVENTORY_LOAD_MODE', 'lazy')
+    import async_app
+    import async_db
+    form = [('Content-Type', 'application/x-www-form-urlencoded')]
+
+    async def scenario():
+        async_db.configure_pool(connector=sqlite_shim.connect, config={'database': sqlite_db}, size=2, timeout=5)
+        calls = [call_asgi(async_app.app, 'POST', '/stock_counter', f'table=bench_stock&action=sale&row_id=1&quantity={n}'.encode(), form)
+                 for n in range(1, 11)]
+        calls.append(call_asgi(async_app.app, 'POST', '/stock_counter', b'table=bench_stock&item_name=Pen&brand=Doms&quantity=3&rate=1.5', form))
+        calls.append(call_asgi(async_app.app, 'POST', '/stock_counter/batch',
+                               json.dumps({'table': 'bench_stock', 'operations': [{'action': 'delete_entry', 'row_id': 2},
+                                                                              {'action': 'delete_entry', 'row_id': 99}]}).encode(),
+                               [('Content-Type', 'application/json')]))
+        await asyncio.gather(*(coroutine for coroutine, _ in calls))
+        page, page_sent = call_asgi(async_app.app, 'GET', '/api/inventory/bench_stock?limit=10&sort=id')
+        ready, ready_sent = call_asgi(async_app.app, 'GET', '/ready')  # not an async route: served by Flask
+        await asyncio.gather(page, ready)
+        stats = async_db.get_pool_stats()
+        await async_db.get_pool().close()
+        return [json.loads(sent[1]['body']) for _, sent in calls], page_sent, ready_sent, stats
+
+    try:
+        replies, page_sent, ready_sent, stats = asyncio.run(scenario())
+    finally:
+        async_db.configure_pool()
+    assert all(reply['success'] for reply in replies)
+    assert [result['message'] for result in replies[-1]['results']] == ["Applied", "Not found"]
+    assert stats['open'] <= 2 and stats['waits'] > 0
+    assert page_sent[0]['status'] == 200
+    page = json.loads(page_sent[1]['body'])
+    assert page['total'] == 5 and [row[0] for row in page['rows']] == [1, 3, 4, 5, 6]
+    assert page['rows'][0][3] == benchmark.INITIAL_STOCK - 55 and page['rows'][-1][1:4] == ['Pen', 'Doms', 3]
+    assert ready_sent[0]['status'] in (200, 503) and b'status' in b''.join(message.get('body', b'') for message in ready_sent[1:])
+
+
+def test_async_app_ends_a_started_response_when_flask_fails_mid_stream(monkeypatch):
+    import asyncio
+    import async_app
+
+    def failing_export(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/csv')])
+        yield b'id,item\n'
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(async_app, 'flask_app', failing_export)
+    coroutine, sent = call_asgi(async_app.app, 'GET', '/export/bench_stock')
+    asyncio.run(coroutine)
+    assert [message['type'] for message in sent] == ['http.response.start', 'http.response.body', 'http.response.body']
+    assert sent[0]['status'] == 200 and sent[-1] == {'type': 'http.response.body', 'body': b''}
+
+
+def test_async_db_returns_failures_for_aiomysql_errors(monkeypatch):
+    import asyncio
+    import async_db
+
+    class MySQLError(Exception):  # stands in for pymysql.err.MySQLError, which aiomysql raises
+        pass
+
+    class Cursor:
+        rowcount = 0
+
+        async def execute(self, query, params=None):
+            if not query.startswith('SHOW'):
+                raise MySQLError(1366, "Incorrect integer value")
+            self.rows = [('id', 'int'), ('item_name', 'varchar(50)'), ('quantity', 'int')]
+
+        async def executemany(self, query, params):
+            raise MySQLError(1366, "Incorrect integer value")
+
+        async def fetchall(self):
+            return self.rows
+
+    class Connection:
+        rollbacks = 0
+
+        async def cursor(self):
+            return Cursor()
+
+        async def rollback(self):
+            Connection.rollbacks += 1
+
+        def get_transaction_status(self):
+            return False
+
+        def close(self):
+            pass
+
+    async def connect(**config):
+        return Connection()
+
+    monkeypatch.setattr(async_db, 'DB_ERRORS', (async_db.Error, MySQLError))
+
+    async def scenario():
+        async_db.configure_pool(connector=connect, config={})
+        return (await async_db.add_table_entry('stock', ['Pen', 'x']),
+                await async_db.adjust_stock('stock', 1, 'quantity', -1),
+                await async_db.apply_batch('stock', [{'action': 'delete_entry', 'row_id': 1}]))
+
+    try:
+        added, adjusted, batch = asyncio.run(scenario())
+    finally:
+        async_db.configure_pool()
+    assert added == (False, "Error adding entry: (1366, 'Incorrect integer value')")
+    assert adjusted[0] is False and batch[0] is False and batch[2][0]['message'] == "Rolled back"
+    assert Connection.rollbacks == 2
+
+@pytest.mark.parametrize('sqlite_db', [3], indirect=True)
+def test_change_feed_returns_rows_changed_since_a_version(sqlite_db, monkeypatch):
+    monkeypatch.setenv('INVENTORY_LOAD_MODE', 'lazy')
+    import app
+    import changes
+    client = app.app.test_client()
+    response = client.get('/api/inventory/bench_stock?limit=10')
+    since = int(response.headers['X-Change-Version'])
+    assert response.headers['X-Change-Feed'] == changes.FEED_ID
+    assert db.add_table_entry('bench_stock', ['Pen', 'Doms', 4, 1.5])[0]
+    assert db.adjust_stock('bench_stock', 4, 'quantity', -1)[0]
+    assert db.update_table_entry('bench_stock', 2, ['Ink', 'Camlin', 7, 3])[0]
+    assert db.delete_table_entry('bench_stock', 1)[0]
+    feed = client.get(f'/api/changes/bench_stock?since={since}').get_json()
+    assert not feed['reset'] and feed['version'] == since + 4
+    assert [(change['op'], change['id']) for change in feed['changes']] == [('insert', 4), ('upsert', 4), ('upsert', 2), ('delete', 1)]
+    assert feed['changes'][0]['row'] == [4, 'Pen', 'Doms', 4, 1.5]  # from the INSERT itself, not read back
+    assert feed['changes'][1]['row'][:4] == [4, 'Pen', 'Doms', 3]
+    assert db.update_table_entry('bench_stock', 99, ['Gone', 'Doms', 1, 1])[0]  # matches no row, nothing to report
+    assert client.get(f"/api/changes/bench_stock?since={feed['version']}").get_json()['changes'] == []
+
+    assert db.apply_batch('bench_stock', [{'action': 'edit_entry', 'row_id': 3, 'data': ['Nib', 'Doms', 1, 2]},
+                                          {'action': 'delete_entry', 'row_id': 4}])[0]
+    batch = changes.changes_since(cache.table_key('bench_stock'), feed['version'])[1]
+    assert [(op, row_id, row and row[1]) for _, op, row_id, row in batch] == [('upsert', 3, 'Nib'), ('delete', 4, None)]
+
+    # Writers commit and record under the table's commit lock, so feed order is commit order
+    version = cache.get_version(cache.table_key('bench_stock'))
+    lock = changes.commit_lock(cache.table_key('bench_stock'))
+    with lock:
+        writer = threading.Thread(target=db.delete_table_entry, args=('bench_stock', 2))
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive() and cache.get_version(cache.table_key('bench_stock')) == version
+    writer.join()
+    assert changes.changes_since(cache.table_key('bench_stock'), version)[1] == [(version + 1, 'delete', 2, None)]
+    assert db.delete_all_entries('bench_stock')[0]
+    assert client.get(f"/api/changes/bench_stock?since={feed['version']}").get_json()['reset']
+    assert client.get('/api/changes/bench_stock?since=x').status_code == 400
+
+    inventory_store = store.InventoryStore(make_inventory())
+    key = cache.category_key('Main Store')
+    since = cache.get_version(key)
+    inventory_store.process_sale('Main_Store', 3, 1)
+    assert changes.changes_since(key, since)[1] == [(since + 1, 'upsert', 3, [3, 'Item 3', 0])]
+    inventory_store.replace(make_inventory())
+    assert changes.changes_since(key, since)[1] is None